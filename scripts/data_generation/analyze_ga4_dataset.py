@@ -2,143 +2,388 @@
 """
 GA4 Dataset Analysis Script
 Provides summary statistics and data quality checks for the generated GA4 events dataset.
+
+The whole file is read in one streaming pass rather than loaded or sampled:
+it is split into row-aligned byte ranges (or one range per compressed file
+or daily partition) that worker processes reduce to mergeable statistics.
+Counts, sums and category breakdowns are exact; distinct users and sessions
+come from HyperLogLog and value quantiles from t-digests (see ga4_sketches).
+
+Usage:
+    python analyze_ga4_dataset.py
+    python analyze_ga4_dataset.py --input seeds/ga4/events.csv --workers 8
 """
 
-import pandas as pd
+import argparse
+import io
 import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
 import numpy as np
+import pandas as pd
+
+from ga4_index import EventIndex, csv_row_starts
+from ga4_sketches import HyperLogLog, TDigest
+from ga4_writers import partition_files
+
+SEEDS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'seeds'))
+
+COLUMNS = ['event_date', 'event_timestamp', 'event_name', 'event_value_in_usd', 'user_id', 'user_pseudo_id',
+           'device', 'geo', 'traffic_source', 'event_params', 'items']
+# Field broken down for each JSON column; invalid JSON is reported for QUALITY_COLUMNS
+JSON_FIELDS = {'device': 'category', 'traffic_source': 'medium', 'geo': 'city'}
+QUALITY_COLUMNS = ['device', 'traffic_source']
+
+# Only session_start carries session_id; ga_session_id is drawn per page_view, so it would overcount
+SESSION_ID_PATTERN = r'"key": "session_id", "value": \{"string_value": "(?P<match>\d+)"'
+VALUE_PATTERN = r'"key": "value", "value": \{"(?:double|float|int)_value": (?P<match>-?[\d.eE+-]+)'
+# Allowed relative gap between the distinct-session estimate and session_start events
+SESSION_TOLERANCE = 0.02
+
+# Uncompressed files are split into ranges of about this size
+SPLIT_BYTES = 32 << 20
+
+
+def string_hashes(values: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def extract(values: pd.Series, pattern: str) -> pd.Series:
+    """The pattern's match group in each value, NaN where it does not match"""
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        return values.str.extract(pattern, expand=False)
+    # Arrow's regex kernel avoids a Python call per row
+    matches = pc.extract_regex(pa.array(values), pattern)
+    found = pc.if_else(matches.is_valid(), pc.struct_field(matches, 'match'), None)
+    return pd.Series(found.to_pandas(), index=values.index)
+
+
+class DatasetStats:
+    """Mergeable summary of a slice of the events dataset"""
+
+    def __init__(self):
+        self.rows = 0
+        self.event_names = Counter()
+        self.min_date = None
+        self.max_date = None
+        self.users = HyperLogLog()
+        self.sessions = HyperLogLog()
+        self.registered_events = 0
+        self.registered_users = HyperLogLog()
+        self.json_fields = {column: Counter() for column in JSON_FIELDS}
+        self.invalid_json = Counter()
+        self.order_values = TDigest()
+        self.event_values = TDigest()
+        self.param_values = TDigest()
+        self.item_events = 0
+        self.items = 0
+        self.missing_user_pseudo_id = 0
+        self.missing_event_timestamp = 0
+
+    def update(self, chunk: pd.DataFrame):
+        self.rows += len(chunk)
+        self.event_names.update(chunk['event_name'].value_counts().to_dict())
+
+        dates = chunk['event_date'][chunk['event_date'] != '']
+        if len(dates):
+            self.min_date = min(filter(None, [self.min_date, dates.min()]))
+            self.max_date = max(filter(None, [self.max_date, dates.max()]))
+
+        users = chunk['user_pseudo_id']
+        self.missing_user_pseudo_id += int((users == '').sum())
+        self.missing_event_timestamp += int((chunk['event_timestamp'] == '').sum())
+        self.users.add_hashes(string_hashes(users[users != '']))
+
+        session_ids = extract(chunk['event_params'], SESSION_ID_PATTERN)
+        has_session = session_ids.notna() & (users != '')
+        self.sessions.add_hashes(string_hashes(users[has_session] + ':' + session_ids[has_session]))
+
+        registered = chunk['user_id'][chunk['user_id'] != '']
+        self.registered_events += len(registered)
+        self.registered_users.add_hashes(string_hashes(registered))
+
+        # JSON columns repeat a small set of values, so each distinct string is decoded once
+        for column, field in JSON_FIELDS.items():
+            for raw, count in chunk[column][chunk[column] != ''].value_counts().items():
+                try:
+                    value = json.loads(raw)
+                except (json.JSONDecodeError, TypeError):
+                    self.invalid_json[column] += count
+                    continue
+                self.json_fields[column][value.get(field, 'unknown') if isinstance(value, dict) else 'unknown'] += count
+
+        event_values = pd.to_numeric(chunk['event_value_in_usd'], errors='coerce')
+        self.event_values.add(event_values.to_numpy())
+        self.order_values.add(event_values[chunk['event_name'] == 'purchase'].to_numpy())
+        self.param_values.add(pd.to_numeric(extract(chunk['event_params'], VALUE_PATTERN), errors='coerce').to_numpy())
+
+        items = chunk['items'][~chunk['items'].isin(['', '[]'])]
+        self.item_events += len(items)
+        self.items += int(items.str.count('"item_id"').sum())
+
+    def merge(self, other: 'DatasetStats'):
+        self.rows += other.rows
+        self.event_names.update(other.event_names)
+        self.min_date = min(filter(None, [self.min_date, other.min_date]), default=None)
+        self.max_date = max(filter(None, [self.max_date, other.max_date]), default=None)
+        self.users.merge(other.users)
+        self.sessions.merge(other.sessions)
+        self.registered_events += other.registered_events
+        self.registered_users.merge(other.registered_users)
+        for column, counts in other.json_fields.items():
+            self.json_fields[column].update(counts)
+        self.invalid_json.update(other.invalid_json)
+        self.order_values.merge(other.order_values)
+        self.event_values.merge(other.event_values)
+        self.param_values.merge(other.param_values)
+        self.item_events += other.item_events
+        self.items += other.items
+        self.missing_user_pseudo_id += other.missing_user_pseudo_id
+        self.missing_event_timestamp += other.missing_event_timestamp
+
+
+Task = Tuple[str, Optional[int], Optional[int]]
+
+
+def input_tasks(input_path: str, split_bytes: int = SPLIT_BYTES) -> List[Task]:
+    """
+    Units of work as (file, start, end) byte ranges.
+
+    A directory of daily partitions gives one task per file, as does a
+    compressed file (start and end None: read it whole). An uncompressed CSV
+    is cut at record starts (from its row index when fresh) into ranges of
+    about split_bytes.
+    """
+    if os.path.isdir(input_path):
+        files = partition_files(input_path, formats=['csv'])
+        if not files:
+            raise FileNotFoundError(f"No events_YYYYMMDD CSV files in {input_path}")
+        return [(file, None, None) for file in files]
+    if not input_path.endswith('.csv'):
+        if input_path.endswith(('.csv.gz', '.csv.zst')):
+            return [(input_path, None, None)]
+        raise ValueError(f"Unsupported events file {input_path} (expected CSV)")
+
+    size = os.path.getsize(input_path)
+    if not size:
+        return []
+    # A fresh row index already holds every record start; otherwise scan for them
+    index = EventIndex.open_if_fresh(input_path)
+    if index is not None:
+        with index:
+            rows = np.sort(index.offsets.astype(np.int64))
+    else:
+        rows = csv_row_starts(np.memmap(input_path, dtype=np.uint8, mode='r'))[1:]
+    if not len(rows):
+        return []
+    cuts = rows[np.minimum(np.searchsorted(rows, np.arange(rows[0], size, split_bytes)), len(rows) - 1)]
+    bounds = np.unique(np.append(cuts, size))
+    return [(input_path, int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def read_task(task: Task, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """The analyzed columns of one task's events, in chunks"""
+    path, start, end = task
+    source = path
+    if start is not None:
+        with open(path, 'rb') as f:
+            header = f.readline()
+            f.seek(start)
+            source = io.BytesIO(header + f.read(end - start))
+    with pd.read_csv(source, usecols=COLUMNS, dtype=str, keep_default_na=False, chunksize=chunk_rows) as reader:
+        yield from reader
 
-def analyze_ga4_dataset():
+
+def analyze_tasks(tasks: List[Task], chunk_rows: int = 20000) -> DatasetStats:
+    """
+    Reduce a batch of tasks to one DatasetStats.
+
+    Small files (daily partitions) are pooled until chunk_rows rows are
+    buffered, so per-chunk overhead is paid per chunk, not per file.
+    """
+    stats = DatasetStats()
+    pending, pending_rows = [], 0
+    for task in tasks:
+        for chunk in read_task(task, chunk_rows):
+            pending.append(chunk)
+            pending_rows += len(chunk)
+            if pending_rows >= chunk_rows:
+                stats.update(pd.concat(pending, ignore_index=True))
+                pending, pending_rows = [], 0
+    if pending:
+        stats.update(pd.concat(pending, ignore_index=True))
+    return stats
+
+
+def task_batches(tasks: List[Task], workers: int) -> List[List[Task]]:
+    """Byte ranges go one per batch; whole files are spread over a few batches per worker"""
+    ranges = [[task] for task in tasks if task[1] is not None]
+    files = [task for task in tasks if task[1] is None]
+    batch_count = min(len(files), workers * 4)
+    bounds = np.linspace(0, len(files), batch_count + 1).astype(int)
+    return ranges + [files[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def collect_stats(input_path: str, workers: int = 1, chunk_rows: int = 20000) -> DatasetStats:
+    """Summarize the full dataset, merging per-batch statistics as they complete"""
+    batches = task_batches(input_tasks(input_path), workers)
+    stats = DatasetStats()
+    if workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(analyze_tasks, batches, [chunk_rows] * len(batches)):
+                stats.merge(part)
+    else:
+        for batch in batches:
+            stats.merge(analyze_tasks(batch, chunk_rows))
+    return stats
+
+
+def input_size(input_path: str) -> int:
+    if os.path.isdir(input_path):
+        return sum(os.path.getsize(os.path.join(input_path, name)) for name in os.listdir(input_path))
+    return os.path.getsize(input_path)
+
+
+def print_distribution(counts: Counter, top: int = None):
+    total = sum(counts.values())
+    for name, count in counts.most_common(top):
+        print(f"  {name}: {count / total * 100:.1f}%")
+
+
+def analyze_ga4_dataset(input_path=f'{SEEDS_DIR}/ga4/events.csv', workers=1, chunk_rows=20000):
     """Analyze the generated GA4 events dataset"""
     print("GA4 Dataset Analysis")
     print("=" * 50)
-    
-    # Load the dataset
-    df = pd.read_csv('/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds/ga4/events.csv')
-    
+
+    stats = collect_stats(input_path, workers, chunk_rows)
+    if not stats.rows:
+        print(f"No events in {input_path}")
+        return stats
+
     print(f"Dataset Overview:")
-    print(f"  Total events: {len(df):,}")
-    print(f"  File size: 346 MB")
-    print(f"  Columns: {len(df.columns)}")
+    print(f"  Total events: {stats.rows:,}")
+    print(f"  File size: {input_size(input_path) / 1024 / 1024:.0f} MB")
+    print(f"  Columns analyzed: {len(COLUMNS)}")
     print()
-    
+
     # Event breakdown
     print("Event Type Distribution:")
-    event_counts = df['event_name'].value_counts()
-    for event_name, count in event_counts.items():
-        percentage = (count / len(df)) * 100
+    for event_name, count in stats.event_names.most_common():
+        percentage = (count / stats.rows) * 100
         print(f"  {event_name}: {count:,} ({percentage:.1f}%)")
     print()
-    
+
     # Date range analysis
-    df['event_date'] = pd.to_datetime(df['event_date'], format='%Y%m%d')
-    print("Date Range Analysis:")
-    print(f"  Start date: {df['event_date'].min().strftime('%Y-%m-%d')}")
-    print(f"  End date: {df['event_date'].max().strftime('%Y-%m-%d')}")
-    print(f"  Total days: {(df['event_date'].max() - df['event_date'].min()).days}")
-    print()
-    
-    # User analysis
+    if stats.min_date:
+        start_date = datetime.strptime(stats.min_date, '%Y%m%d')
+        end_date = datetime.strptime(stats.max_date, '%Y%m%d')
+        print("Date Range Analysis:")
+        print(f"  Start date: {start_date.strftime('%Y-%m-%d')}")
+        print(f"  End date: {end_date.strftime('%Y-%m-%d')}")
+        print(f"  Total days: {(end_date - start_date).days}")
+        print()
+
+    # User analysis (distinct counts are HyperLogLog estimates, ~1% error)
     print("User Analysis:")
-    unique_pseudo_ids = df['user_pseudo_id'].nunique()
-    print(f"  Unique user_pseudo_ids: {unique_pseudo_ids:,}")
-    
-    registered_users = df[df['user_id'].notna()]
-    print(f"  Events from registered users: {len(registered_users):,} ({len(registered_users)/len(df)*100:.1f}%)")
-    print(f"  Unique registered users: {registered_users['user_id'].nunique()}")
+    print(f"  Unique user_pseudo_ids: ~{stats.users.estimate():,.0f}")
+    print(f"  Events from registered users: {stats.registered_events:,} "
+          f"({stats.registered_events / stats.rows * 100:.1f}%)")
+    print(f"  Unique registered users: ~{stats.registered_users.estimate():,.0f}")
     print()
-    
+
     # Session analysis
-    session_starts = df[df['event_name'] == 'session_start']
+    session_starts = stats.event_names.get('session_start', 0)
+    purchases = stats.event_names.get('purchase', 0)
     print("Session Analysis:")
-    print(f"  Total sessions: {len(session_starts):,}")
-    print(f"  Sessions with purchases: {df['event_name'].value_counts().get('purchase', 0):,}")
-    conversion_rate = (df['event_name'].value_counts().get('purchase', 0) / len(session_starts)) * 100
-    print(f"  Conversion rate: {conversion_rate:.2f}%")
+    print(f"  Total sessions: {session_starts:,}")
+    print(f"  Distinct sessions (user, session_id): ~{stats.sessions.estimate():,.0f}")
+    print(f"  Sessions with purchases: {purchases:,}")
+    if session_starts:
+        print(f"  Conversion rate: {purchases / session_starts * 100:.2f}%")
     print()
-    
-    # Device analysis
+
     print("Device Analysis:")
-    sample_device_info = df[df['device'].notna()].sample(1000)['device'].apply(json.loads)
-    device_categories = [device.get('category', 'unknown') for device in sample_device_info]
-    device_dist = pd.Series(device_categories).value_counts()
-    for category, count in device_dist.items():
-        percentage = (count / len(device_categories)) * 100
-        print(f"  {category}: {percentage:.1f}%")
+    print_distribution(stats.json_fields['device'])
     print()
-    
-    # Traffic source analysis
+
     print("Traffic Source Analysis:")
-    sample_traffic = df[df['traffic_source'].notna()].sample(1000)['traffic_source'].apply(json.loads)
-    traffic_mediums = [traffic.get('medium', 'unknown') for traffic in sample_traffic]
-    traffic_dist = pd.Series(traffic_mediums).value_counts()
-    for medium, count in traffic_dist.items():
-        percentage = (count / len(traffic_mediums)) * 100
-        print(f"  {medium}: {percentage:.1f}%")
+    print_distribution(stats.json_fields['traffic_source'])
     print()
-    
+
     # Revenue analysis
-    purchase_events = df[df['event_name'] == 'purchase']
-    if len(purchase_events) > 0:
-        revenue_values = purchase_events['event_value_in_usd'].dropna().astype(float)
+    if purchases:
+        orders = stats.order_values
         print("Revenue Analysis:")
-        print(f"  Total transactions: {len(purchase_events):,}")
-        print(f"  Total revenue: £{revenue_values.sum():,.2f}")
-        print(f"  Average order value: £{revenue_values.mean():.2f}")
-        print(f"  Median order value: £{revenue_values.median():.2f}")
+        print(f"  Total transactions: {purchases:,}")
+        print(f"  Total revenue: £{orders.total:,.2f}")
+        print(f"  Average order value: £{orders.mean():.2f}")
+        print(f"  Median order value: £{orders.quantile(0.5):.2f}")
         print()
-    
-    # Geographic analysis
+
+    # Value distributions (t-digest quantiles)
+    print("Value Distribution:")
+    for name, digest in [('event_value_in_usd', stats.event_values), ('value param', stats.param_values)]:
+        if digest.count:
+            print(f"  {name}: {digest.count:,} events, min {digest.min:.2f}, "
+                  f"p50 {digest.quantile(0.5):.2f}, p90 {digest.quantile(0.9):.2f}, "
+                  f"p99 {digest.quantile(0.99):.2f}, max {digest.max:.2f}")
+    print()
+
     print("Geographic Analysis:")
-    sample_geo = df[df['geo'].notna()].sample(1000)['geo'].apply(json.loads)
-    geo_cities = [geo.get('city', 'unknown') for geo in sample_geo]
-    geo_dist = pd.Series(geo_cities).value_counts().head(5)
-    for city, count in geo_dist.items():
-        percentage = (count / len(geo_cities)) * 100
-        print(f"  {city}: {percentage:.1f}%")
+    print_distribution(stats.json_fields['geo'], top=5)
     print()
-    
+
     # Ecommerce items analysis
-    ecommerce_events = df[df['items'] != '[]']
-    if len(ecommerce_events) > 0:
+    if stats.item_events:
         print("Ecommerce Analysis:")
-        print(f"  Events with items: {len(ecommerce_events):,}")
-        
-        # Sample items analysis
-        sample_items = ecommerce_events.sample(min(100, len(ecommerce_events)))['items'].apply(json.loads)
-        total_items = sum(len(items) for items in sample_items)
-        print(f"  Average items per event: {total_items / len(sample_items):.1f}")
+        print(f"  Events with items: {stats.item_events:,}")
+        print(f"  Average items per event: {stats.items / stats.item_events:.1f}")
         print()
-    
+
     # Data quality checks
     print("Data Quality Checks:")
-    print(f"  Events with missing user_pseudo_id: {df['user_pseudo_id'].isna().sum()}")
-    print(f"  Events with missing event_timestamp: {df['event_timestamp'].isna().sum()}")
-    print(f"  Events with invalid JSON in device field: {count_invalid_json(df, 'device')}")
-    print(f"  Events with invalid JSON in traffic_source field: {count_invalid_json(df, 'traffic_source')}")
+    print(f"  Events with missing user_pseudo_id: {stats.missing_user_pseudo_id}")
+    print(f"  Events with missing event_timestamp: {stats.missing_event_timestamp}")
+    for column in QUALITY_COLUMNS:
+        print(f"  Events with invalid JSON in {column} field: {stats.invalid_json[column]}")
+    if session_starts:
+        drift = stats.sessions.estimate() / session_starts - 1
+        status = "✓" if abs(drift) <= SESSION_TOLERANCE else "✗"
+        print(f"  {status} Distinct sessions vs session_start events: {drift:+.1%}")
     print()
-    
+
     print("✅ Dataset analysis complete!")
     print("\nNext steps:")
     print("1. Run: dbt seed --select ga4.events")
     print("2. Create GA4 staging models in dbt")
     print("3. Build marts joining Shopify and GA4 data")
+    return stats
+
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description="Summarize a generated GA4 events dataset in one streaming pass")
+    parser.add_argument('--input', default=f'{SEEDS_DIR}/ga4/events.csv',
+                        help="Events CSV (optionally .gz/.zst) or a directory of daily partitions")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes reducing file ranges in parallel (default: CPU count)")
+    parser.add_argument('--chunk-rows', type=int, default=20000, help="Rows parsed at a time per worker")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.chunk_rows < 1:
+        parser.error("--chunk-rows must be at least 1")
+
+    analyze_ga4_dataset(args.input, args.workers, args.chunk_rows)
 
-def count_invalid_json(df, column):
-    """Count rows with invalid JSON in a column"""
-    invalid_count = 0
-    sample_size = min(1000, len(df))
-    sample_df = df.sample(sample_size)
-    
-    for value in sample_df[column].dropna():
-        try:
-            json.loads(value)
-        except (json.JSONDecodeError, TypeError):
-            invalid_count += 1
-    
-    # Scale up the count
-    return int(invalid_count * (len(df) / sample_size))
 
 if __name__ == "__main__":
-    analyze_ga4_dataset()
\ No newline at end of file
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the data generation scripts.
+
+Runs the generation pipeline against synthetic inputs at several scale
+factors (1.0 is roughly the size of the shipped seeds):
+
+    generate_orders -> generate_order_lines_final -> GA4EventsGenerator -> create_ga4_sample
+
+Each stage reads the previous stage's output and runs in a fresh process so
+its peak RSS is measured on its own. Wall time, rows/sec, peak RSS and output
+bytes are written to a JSON results file. With a stored baseline, any run
+whose throughput drops or whose peak RSS grows by more than --threshold fails
+the suite (exit code 1).
+
+Usage:
+    python benchmark_data_generation.py --scales 0.1 0.5 1.0
+    python benchmark_data_generation.py --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+STAGES = ['generate_orders', 'generate_order_lines', 'ga4_events', 'ga4_sample']
+
+# Synthetic catalog: titles carry the keywords generate_order_lines_final uses for popularity tiers
+SYNTHETIC_PRODUCTS = [
+    ('Radiant Glow Foundation', 'Makeup'), ('Velvet Matte Lipstick', 'Makeup'),
+    ('Volume Boost Mascara', 'Makeup'), ('Crystal Lip Gloss', 'Makeup'),
+    ('Silk Eyeshadow Palette', 'Makeup'), ('Precision Eyeliner', 'Makeup'),
+    ('Hydrating Face Serum', 'Skincare'), ('Daily Moisturiser', 'Skincare'),
+    ('Overnight Repair Cream', 'Skincare'), ('Gentle Cleanser', 'Skincare'),
+    ('Blossom Fragrance', 'Fragrance'), ('Blending Brush Set', 'Tools'),
+]
+SYNTHETIC_VARIANTS = ['Light', 'Medium', 'Deep']
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def write_synthetic_catalog(input_dir: str):
+    """Write product, product_variant and customer CSVs for the synthetic store"""
+    from generate_orders import CUSTOMER_EMAILS
+
+    rng = np.random.default_rng(42)
+    products, variants = [], []
+    for product_id, (title, product_type) in enumerate(SYNTHETIC_PRODUCTS, start=1):
+        products.append({
+            'id': product_id, 'title': title, 'handle': title.lower().replace(' ', '-'),
+            'product_type': product_type, 'vendor': 'Belle & Glow',
+        })
+        price = round(float(rng.uniform(8, 60)), 2)
+        for name in SYNTHETIC_VARIANTS:
+            variants.append({
+                'id': len(variants) + 1, 'product_id': product_id, 'title': name,
+                'sku': f"BG-{product_id:03d}-{name.upper()}", 'price': price,
+            })
+    customers = pd.DataFrame({
+        'id': list(CUSTOMER_EMAILS),
+        'email': list(CUSTOMER_EMAILS.values()),
+        'total_spent': rng.uniform(50, 800, len(CUSTOMER_EMAILS)).round(2),
+        'created_at': '2022-07-19 09:00:00',
+    })
+    pd.DataFrame(products).to_csv(os.path.join(input_dir, 'product.csv'), index=False)
+    pd.DataFrame(variants).to_csv(os.path.join(input_dir, 'product_variant.csv'), index=False)
+    customers.to_csv(os.path.join(input_dir, 'customer.csv'), index=False)
+
+
+def run_generate_orders(work_dir: str, scale: float) -> int:
+    import generate_orders
+
+    random.seed(42)
+    orders = generate_orders.generate_orders(scale)
+    generate_orders.save_orders_csv(orders, os.path.join(work_dir, 'shopify', 'order.csv'))
+    return len(orders)
+
+
+def run_generate_order_lines(work_dir: str, scale: float) -> int:
+    import generate_order_lines_final
+
+    shopify_dir = os.path.join(work_dir, 'shopify')
+    random.seed(42)
+    _, line_items = generate_order_lines_final.generate_order_lines(
+        os.path.join(shopify_dir, 'order.csv'),
+        os.path.join(shopify_dir, 'product_variant.csv'),
+        os.path.join(shopify_dir, 'product.csv'),
+        os.path.join(shopify_dir, 'order_line.csv'),
+    )
+    return len(line_items)
+
+
+def run_ga4_events(work_dir: str, scale: float) -> int:
+    from generate_ga4_events import GA4EventsGenerator
+
+    # work_dir is laid out like the dbt seeds directory, so the real loader runs
+    generator = GA4EventsGenerator(seeds_dir=work_dir)
+    generator.write_dataset(os.path.join(work_dir, 'events.csv'))
+    with open(os.path.join(work_dir, 'events.csv'), encoding='utf-8') as f:
+        return sum(1 for _ in f) - 1
+
+
+def run_ga4_sample(work_dir: str, scale: float) -> int:
+    from create_ga4_sample import create_ga4_sample
+
+    create_ga4_sample(os.path.join(work_dir, 'events.csv'), os.path.join(work_dir, 'events_sample.csv'))
+    return len(pd.read_csv(os.path.join(work_dir, 'events_sample.csv'), usecols=['event_name']))
+
+
+STAGE_RUNNERS: Dict[str, Callable[[str, float], int]] = {
+    'generate_orders': run_generate_orders,
+    'generate_order_lines': run_generate_order_lines,
+    'ga4_events': run_ga4_events,
+    'ga4_sample': run_ga4_sample,
+}
+STAGE_OUTPUTS = {
+    'generate_orders': os.path.join('shopify', 'order.csv'),
+    'generate_order_lines': os.path.join('shopify', 'order_line.csv'),
+    'ga4_events': 'events.csv',
+    'ga4_sample': 'events_sample.csv',
+}
+
+
+def run_stage(stage: str, work_dir: str, scale: float) -> Dict[str, Any]:
+    """Run one stage (in a worker process) and measure it"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        start = time.perf_counter()
+        rows = STAGE_RUNNERS[stage](work_dir, scale)
+        wall = time.perf_counter() - start
+    return {
+        'stage': stage,
+        'scale': scale,
+        'rows': rows,
+        'wall_seconds': round(wall, 3),
+        'rows_per_second': round(rows / wall, 1) if wall else None,
+        'peak_rss_bytes': peak_rss_bytes(),
+        'output_bytes': os.path.getsize(os.path.join(work_dir, STAGE_OUTPUTS[stage])),
+    }
+
+
+def run_suite(scales: List[float], stages: List[str]) -> List[Dict[str, Any]]:
+    """Run the pipeline at every scale, one fresh process per stage"""
+    results = []
+    spawn = get_context('spawn')
+    for scale in scales:
+        with tempfile.TemporaryDirectory(prefix='ga4_bench_') as work_dir:
+            os.makedirs(os.path.join(work_dir, 'shopify'))
+            write_synthetic_catalog(os.path.join(work_dir, 'shopify'))
+            for stage in STAGES:
+                # Later stages need earlier outputs, so skipped stages still run, unrecorded
+                with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                    result = pool.submit(run_stage, stage, work_dir, scale).result()
+                if stage in stages:
+                    results.append(result)
+                    print(f"  {stage} @ {scale}x: {result['rows']:,} rows in {result['wall_seconds']:.2f}s "
+                          f"({result['rows_per_second']:,.0f} rows/s, peak RSS {result['peak_rss_bytes'] / 2**20:.0f} MB, "
+                          f"output {result['output_bytes'] / 2**20:.1f} MB)")
+    return results
+
+
+def find_regressions(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+                     threshold: float) -> List[str]:
+    """Compare results to the baseline runs with the same stage and scale"""
+    reference = {(r['stage'], r['scale']): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = reference.get((result['stage'], result['scale']))
+        if base is None:
+            continue
+        name = f"{result['stage']} @ {result['scale']}x"
+        if result['rows_per_second'] < base['rows_per_second'] * (1 - threshold):
+            regressions.append(f"{name}: {result['rows_per_second']:,.0f} rows/s vs baseline "
+                               f"{base['rows_per_second']:,.0f}")
+        if result['peak_rss_bytes'] > base['peak_rss_bytes'] * (1 + threshold):
+            regressions.append(f"{name}: peak RSS {result['peak_rss_bytes'] / 2**20:.0f} MB vs baseline "
+                               f"{base['peak_rss_bytes'] / 2**20:.0f} MB")
+    return regressions
+
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description="Benchmark the data generation scripts")
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.1, 0.5, 1.0],
+                        help="Scale factors relative to the shipped seed data (default: 0.1 0.5 1.0)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES,
+                        help="Stages to record (default: all)")
+    parser.add_argument('--output', default=os.path.join(BENCHMARK_DIR, 'results.json'),
+                        help="Results JSON file")
+    parser.add_argument('--baseline', default=os.path.join(BENCHMARK_DIR, 'baseline.json'),
+                        help="Baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed fractional regression in rows/sec or peak RSS (default: 0.25)")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Store this run as the new baseline instead of comparing")
+    args = parser.parse_args()
+
+    print("Data Generation Benchmarks")
+    print("=" * 50)
+    results = run_suite(args.scales, args.stages)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to: {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = find_regressions(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n✗ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\n✓ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
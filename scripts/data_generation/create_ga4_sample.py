@@ -1,170 +1,475 @@
 #!/usr/bin/env python3
 """
-GA4 Sample Dataset Creator v3
+GA4 Sample Dataset Creator v4
 Creates a representative sample of approximately 10,000 GA4 events while maintaining
 critical business relationships.
+
+The events file is never loaded whole; it is read twice in chunks:
+1. Scan: only event_name and user_pseudo_id are read, and each user's event
+   counts per event type are accumulated in a compact array keyed by a
+   64-bit hash of user_pseudo_id. The sample is then chosen from these counts.
+2. Copy: the file is streamed again with every column and only the selected
+   rows are kept, verbatim, then sorted by event_timestamp and written out.
+
+Memory depends on the number of users (about 8 bytes plus 4 per event type
+each), the chunk sizes and the sample, not on the file size, so multi-GB
+event files can be sampled.
+
+Users are picked by their seeded hash rather than by np.random, so the
+sample depends only on the seed and the file's contents.
+
+Hash mode (--mode hash) instead keeps every event of each user_pseudo_id
+(i.e. session) whose salted hash falls below fraction * 2^64, in a single
+pass. Whether a row is kept depends on nothing but its user and the salt,
+so:
+- daily partition files are sampled independently, in parallel
+- --append samples only days after the last one already in the output, and
+  the result is identical to resampling everything
+- every event type keeps, in expectation, its share of the full dataset
 """
 
-import pandas as pd
-import json
+import argparse
+import hashlib
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
 import numpy as np
-from datetime import datetime
+import pandas as pd
 
-def create_ga4_sample():
-    """Create a representative sample of the GA4 events dataset"""
-    print("Creating GA4 Sample Dataset (Smart Sampling)")
-    print("=" * 60)
-    
-    # Load the full dataset
-    print("Loading full dataset...")
-    df = pd.read_csv('/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds/ga4/events.csv')
-    print(f"Original dataset: {len(df):,} events")
-    
-    # Strategy: Sample purchase sessions + representative non-purchase sessions
-    target_total = 10000
-    
-    # Step 1: Select a subset of purchase sessions (not all)
-    print(f"\n1. Selecting subset of purchase sessions...")
-    purchase_events = df[df['event_name'] == 'purchase'].copy()
-    all_purchase_sessions = purchase_events['user_pseudo_id'].unique()
-    
-    # Calculate how many purchase sessions we can include
-    # Assumption: Each purchase session has ~15 events on average
+from ga4_index import EventIndex
+from ga4_writers import partition_date, partition_files
+
+SEEDS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'seeds'))
+
+
+def salt_key(salt) -> str:
+    """16-character hash key derived from any salt (seed)"""
+    return hashlib.blake2b(str(salt).encode(), digest_size=8).hexdigest()
+
+
+def user_hashes(users: pd.Series, salt) -> np.ndarray:
+    """Salted 64-bit hash of each user_pseudo_id; also the user's sampling priority"""
+    return pd.util.hash_array(users.to_numpy(dtype=object), hash_key=salt_key(salt))
+
+
+def contains(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Membership of values in a sorted array"""
+    if not len(sorted_values):
+        return np.zeros(len(values), dtype=bool)
+    found = np.searchsorted(sorted_values, values).clip(max=len(sorted_values) - 1)
+    return sorted_values[found] == values
+
+
+class EventTypeCounts:
+    """
+    Per-user event counts by event type, keyed by sorted user hash.
+
+    Each chunk is reduced to per-user counts and buffered; buffered chunks are
+    folded into the table once they hold merge_rows users, so the table is
+    rebuilt every ~100k users rather than for every chunk.
+    """
+
+    def __init__(self, merge_rows: int = 100_000):
+        self.names: Dict[str, int] = {}
+        self.users = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty((0, 0), dtype=np.int32)
+        self.merge_rows = merge_rows
+        self.pending_users: List[np.ndarray] = []
+        self.pending_counts: List[np.ndarray] = []
+        self.pending_rows = 0
+
+    def add(self, hashes: np.ndarray, event_names: pd.Series):
+        """Count one chunk's events"""
+        if not len(event_names):
+            return
+        for name in event_names.unique():
+            self.names.setdefault(name, len(self.names))
+        codes = event_names.map(self.names).to_numpy(dtype=np.int64)
+        n_types = len(self.names)
+
+        chunk_users, user_index = np.unique(hashes, return_inverse=True)
+        chunk_counts = np.bincount(user_index * n_types + codes, minlength=len(chunk_users) * n_types)
+        self.pending_users.append(chunk_users)
+        self.pending_counts.append(chunk_counts.reshape(-1, n_types).astype(np.int32))
+        self.pending_rows += len(chunk_users)
+        if self.pending_rows >= self.merge_rows:
+            self.merge()
+
+    def merge(self):
+        """Fold the buffered chunk counts into the table"""
+        if not self.pending_users:
+            return
+        n_types = len(self.names)
+        blocks = [self.counts] + self.pending_counts
+        counts = np.concatenate([np.pad(b, ((0, 0), (0, n_types - b.shape[1]))) for b in blocks])
+        users = np.concatenate([self.users] + self.pending_users)
+        order = np.argsort(users, kind='stable')
+        users = users[order]
+        starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+        self.users = users[starts]
+        self.counts = np.add.reduceat(counts[order], starts, axis=0) if len(users) else counts
+        self.pending_users, self.pending_counts, self.pending_rows = [], [], 0
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.names:
+            return np.zeros(len(self.users), dtype=np.int32)
+        return self.counts[:, self.names[name]]
+
+
+def scan_events(input_path: str, seed: int, chunk_rows: int) -> EventTypeCounts:
+    """
+    Pass 1: per-user event type counts from the event_name and user_pseudo_id columns.
+
+    event_timestamp isn't read: events files are written in timestamp order,
+    so the first event of a type in file order (what pass 2 keeps) is the
+    earliest one, and selection needs only the counts.
+    """
+    counts = EventTypeCounts()
+    with pd.read_csv(input_path, usecols=['event_name', 'user_pseudo_id'], dtype=object,
+                     keep_default_na=False, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            counts.add(user_hashes(chunk['user_pseudo_id'], seed), chunk['event_name'])
+    counts.merge()
+    return counts
+
+
+def select_sample(counts: EventTypeCounts, target_total: int) -> Dict[str, object]:
+    """
+    Choose the sample from the scan's per-user counts.
+
+    A subset of purchasing users is kept whole; the remaining budget is split
+    across event types in proportion to their share of the non-purchasing
+    users' events. Each type takes one event (the first) from each of its
+    allocation's worth of non-purchasing users, or, with fewer users than
+    that, a hash-based share of its events.
+    """
+    purchasers = counts.column('purchase') > 0
+    purchase_users = counts.users[purchasers]
+
+    # Step 1: lowest-priority purchasing users (users are sorted by their seeded hash)
     avg_events_per_purchase_session = 15
     max_purchase_sessions = target_total // (avg_events_per_purchase_session * 2)  # Keep some budget for non-purchase
-    
-    selected_purchase_sessions = min(max_purchase_sessions, len(all_purchase_sessions))
-    sampled_purchase_sessions = np.random.choice(all_purchase_sessions, 
-                                               size=selected_purchase_sessions, 
-                                               replace=False)
-    
-    print(f"Selected {selected_purchase_sessions:,} purchase sessions from {len(all_purchase_sessions):,} total")
-    
-    # Step 2: Get all events from selected purchase sessions
-    print(f"2. Getting events from selected purchase sessions...")
-    purchase_session_events = df[df['user_pseudo_id'].isin(sampled_purchase_sessions)].copy()
-    print(f"Purchase session events: {len(purchase_session_events):,}")
-    
-    remaining_budget = target_total - len(purchase_session_events)
-    print(f"Remaining budget: {remaining_budget:,} events")
-    
-    # Step 3: Sample from non-purchase sessions
-    print(f"3. Sampling from non-purchase sessions...")
-    non_purchase_events = df[~df['user_pseudo_id'].isin(all_purchase_sessions)].copy()
-    
-    if remaining_budget > 0 and len(non_purchase_events) > 0:
-        # Sample proportionally by event type
-        non_purchase_event_counts = non_purchase_events['event_name'].value_counts()
-        
-        sampled_non_purchase = []
-        allocated_budget = 0
-        
-        for event_type, count in non_purchase_event_counts.items():
-            if allocated_budget >= remaining_budget:
-                break
-                
-            # Calculate proportional allocation
-            proportion = count / len(non_purchase_events)
-            allocated = max(1, int(remaining_budget * proportion))  # At least 1 of each type
-            allocated = min(allocated, remaining_budget - allocated_budget)
-            
-            if allocated > 0:
-                event_df = non_purchase_events[non_purchase_events['event_name'] == event_type]
-                
-                # Sample with user diversity
-                if allocated < len(event_df):
-                    unique_users = event_df['user_pseudo_id'].unique()
-                    if len(unique_users) >= allocated:
-                        # Sample different users
-                        sample_users = np.random.choice(unique_users, size=allocated, replace=False)
-                        # Get one event per selected user for this event type
-                        sampled = event_df.groupby('user_pseudo_id').first().loc[sample_users].reset_index()
-                    else:
-                        # Random sample if not enough users
-                        sampled = event_df.sample(n=allocated, random_state=42)
-                else:
-                    sampled = event_df
-                
-                sampled_non_purchase.append(sampled)
-                allocated_budget += len(sampled)
-                print(f"  {event_type}: {len(sampled):,} events")
-        
-        # Combine sampled non-purchase events
-        if sampled_non_purchase:
-            non_purchase_sample = pd.concat(sampled_non_purchase, ignore_index=True)
+    sampled_purchase_users = purchase_users[:max_purchase_sessions]
+    purchase_session_events = int(counts.counts[purchasers][:max_purchase_sessions].sum())
+    remaining_budget = target_total - purchase_session_events
+
+    # Step 2: allocate the remaining budget across event types
+    non_purchase_counts = counts.counts[~purchasers]
+    non_purchase_users = counts.users[~purchasers]
+    type_totals = non_purchase_counts.sum(axis=0)
+    total_non_purchase = int(type_totals.sum())
+    first_event_users: Dict[str, np.ndarray] = {}
+    all_event_types: List[str] = []
+    row_fractions: Dict[str, float] = {}
+    allocations: Dict[str, int] = {}
+
+    allocated_budget = 0
+    names = list(counts.names)
+    for code in np.argsort(-type_totals, kind='stable'):
+        count = int(type_totals[code])
+        if remaining_budget <= 0 or allocated_budget >= remaining_budget or count == 0:
+            break
+        proportion = count / total_non_purchase
+        allocated = max(1, int(remaining_budget * proportion))  # At least 1 of each type
+        allocated = min(allocated, remaining_budget - allocated_budget)
+
+        event_type = names[code]
+        if allocated < count:
+            candidates = non_purchase_users[non_purchase_counts[:, code] > 0]
+            if len(candidates) >= allocated:
+                # Sample different users, one event each; the priority is salted with the
+                # event type so each type draws its own users
+                priority = pd.util.hash_array(candidates ^ np.uint64(code + 1))
+                first_event_users[event_type] = np.sort(candidates[np.argsort(priority)[:allocated]])
+            else:
+                # Not enough users: keep each event with probability allocated / count
+                row_fractions[event_type] = allocated / count
         else:
-            non_purchase_sample = pd.DataFrame()
-    else:
-        non_purchase_sample = pd.DataFrame()
-    
-    # Step 4: Combine all events
-    print(f"\n4. Combining final sample...")
-    components = [purchase_session_events]
-    if len(non_purchase_sample) > 0:
-        components.append(non_purchase_sample)
-    
-    final_sample = pd.concat(components, ignore_index=True)
-    
-    # Sort by timestamp to maintain chronological order
-    final_sample = final_sample.sort_values('event_timestamp').reset_index(drop=True)
-    
+            all_event_types.append(event_type)
+        allocations[event_type] = allocated
+        allocated_budget += allocated
+
+    return {
+        'total_events': int(counts.counts.sum()),
+        'purchase_sessions': len(purchase_users),
+        'sampled_purchase_users': sampled_purchase_users,
+        'purchase_session_events': purchase_session_events,
+        'remaining_budget': remaining_budget,
+        'purchase_users': purchase_users,
+        'first_event_users': first_event_users,
+        'all_event_types': all_event_types,
+        'row_fractions': row_fractions,
+        'allocations': allocations,
+    }
+
+
+def copy_selected_rows(input_path: str, selection: Dict[str, object], seed: int, chunk_rows: int) -> pd.DataFrame:
+    """Pass 2: stream every column and keep the selected rows, unchanged"""
+    seen_first = {event_type: np.empty(0, dtype=np.uint64) for event_type in selection['first_event_users']}
+    selected = []
+    row_offset = 0
+    with pd.read_csv(input_path, dtype=object, keep_default_na=False, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            hashes = user_hashes(chunk['user_pseudo_id'], seed)
+            names = chunk['event_name'].to_numpy(dtype=object)
+            non_purchaser = ~contains(selection['purchase_users'], hashes)
+
+            keep = contains(selection['sampled_purchase_users'], hashes)
+            keep |= non_purchaser & np.isin(names, selection['all_event_types'])
+            for event_type, users in selection['first_event_users'].items():
+                # First event of this type for each selected user, in file order
+                rows = np.flatnonzero((names == event_type) & contains(users, hashes))
+                rows = rows[~np.isin(hashes[rows], seen_first[event_type])]
+                first_users, first_rows = np.unique(hashes[rows], return_index=True)
+                keep[rows[first_rows]] = True
+                seen_first[event_type] = np.union1d(seen_first[event_type], first_users)
+            for event_type, fraction in selection['row_fractions'].items():
+                rows = np.flatnonzero(non_purchaser & (names == event_type))
+                # Numeric arrays are hashed without the key, so the seed is mixed into the row number
+                row_keys = (np.uint64(row_offset) + rows.astype(np.uint64)) ^ np.uint64(int(salt_key(seed), 16))
+                priority = pd.util.hash_array(row_keys)
+                keep[rows[priority < np.uint64(fraction * 2.0 ** 64)]] = True
+
+            if keep.any():
+                selected.append(chunk[keep])
+            row_offset += len(chunk)
+
+    if not selected:
+        # Header only, so an empty sample is still a loadable seed
+        return pd.read_csv(input_path, dtype=object, nrows=0)
+    sample = pd.concat(selected, ignore_index=True)
+    order = np.argsort(sample['event_timestamp'].astype('int64').to_numpy(), kind='stable')
+    return sample.iloc[order].reset_index(drop=True)
+
+
+def create_ga4_sample(input_path=f'{SEEDS_DIR}/ga4/events.csv', output_path=f'{SEEDS_DIR}/ga4/events_sample.csv',
+                      target_total: int = 10000, seed: int = 42, scan_rows: int = 5000, copy_rows: int = 2000):
+    """Create a representative sample of the GA4 events dataset"""
+    print("Creating GA4 Sample Dataset (Smart Sampling)")
+    print("=" * 60)
+
+    # Pass 1: scan the event types of every user
+    print("Scanning full dataset (event_name, user_pseudo_id)...")
+    counts = scan_events(input_path, seed, scan_rows)
+    print(f"Original dataset: {int(counts.counts.sum()):,} events, {len(counts.users):,} users")
+
+    selection = select_sample(counts, target_total)
+    del counts
+    print(f"\n1. Selected {len(selection['sampled_purchase_users']):,} purchase sessions "
+          f"from {selection['purchase_sessions']:,} total")
+    print(f"2. Purchase session events: {selection['purchase_session_events']:,}")
+    print(f"Remaining budget: {selection['remaining_budget']:,} events")
+    print(f"3. Allocated non-purchase events by type:")
+    for event_type, allocated in selection['allocations'].items():
+        print(f"  {event_type}: {allocated:,} events")
+
+    # Pass 2: copy out the selected rows
+    print(f"\n4. Copying selected events...")
+    final_sample = copy_selected_rows(input_path, selection, seed, copy_rows)
     print(f"Final sample: {len(final_sample):,} events")
-    
+    if final_sample.empty:
+        print("⚠ Warning: no events selected (no qualifying users, or --target-events too low); "
+              "writing a header-only sample")
+        final_sample.to_csv(output_path, index=False)
+        print(f"✓ Sample saved to: {output_path}")
+        return
+
     # Step 5: Verify sample quality
     print(f"\n5. Sample Quality Verification:")
     sample_event_counts = final_sample['event_name'].value_counts()
     for event_name, count in sample_event_counts.items():
         percentage = (count / len(final_sample)) * 100
         print(f"  {event_name}: {count:,} ({percentage:.1f}%)")
-    
+
     # Key validations
     purchase_count = sample_event_counts.get('purchase', 0)
     print(f"\n✓ Purchase events in sample: {purchase_count:,}")
-    print(f"✓ Purchase sessions sampled: {selected_purchase_sessions:,} of {len(all_purchase_sessions):,}")
-    
+    print(f"✓ Purchase sessions sampled: {len(selection['sampled_purchase_users']):,} "
+          f"of {selection['purchase_sessions']:,}")
+
     unique_users = final_sample['user_pseudo_id'].nunique()
-    registered_users = final_sample[final_sample['user_id'].notna()]
+    registered_users = final_sample[final_sample['user_id'] != '']
     print(f"✓ Unique users in sample: {unique_users:,}")
     print(f"✓ Events from registered users: {len(registered_users):,} ({len(registered_users)/len(final_sample)*100:.1f}%)")
-    
+
     # Check conversion funnel integrity for sampled purchases
-    funnel_events = ['session_start', 'page_view', 'view_item', 'add_to_cart', 
+    funnel_events = ['session_start', 'page_view', 'view_item', 'add_to_cart',
                     'begin_checkout', 'add_payment_info', 'add_shipping_info', 'purchase']
     print(f"✓ Event funnel in sample:")
     for event in funnel_events:
         count = sample_event_counts.get(event, 0)
         if count > 0:
             print(f"    {event}: {count:,}")
-    
+
     # Check date range
-    final_sample['event_date_parsed'] = pd.to_datetime(final_sample['event_date'], format='%Y%m%d')
-    date_range = (final_sample['event_date_parsed'].max() - final_sample['event_date_parsed'].min()).days
-    start_date = final_sample['event_date_parsed'].min().strftime('%Y-%m-%d')
-    end_date = final_sample['event_date_parsed'].max().strftime('%Y-%m-%d')
-    print(f"✓ Date range: {start_date} to {end_date} ({date_range} days)")
-    
+    event_dates = pd.to_datetime(final_sample['event_date'], format='%Y%m%d')
+    date_range = (event_dates.max() - event_dates.min()).days
+    print(f"✓ Date range: {event_dates.min():%Y-%m-%d} to {event_dates.max():%Y-%m-%d} ({date_range} days)")
+
     # Step 6: Save the sample
     print(f"\n6. Saving sample dataset...")
-    output_path = '/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds/ga4/events_sample.csv'
-    final_sample.drop('event_date_parsed', axis=1).to_csv(output_path, index=False)
-    
+    final_sample.to_csv(output_path, index=False)
+
     # Check file size
-    import os
     file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+    input_size_mb = os.path.getsize(input_path) / (1024 * 1024)
     print(f"✓ Sample saved to: {output_path}")
     print(f"✓ File size: {file_size_mb:.1f} MB")
-    
+
     print(f"\n✅ GA4 sample dataset created successfully!")
-    print(f"Original: 209,112 events (346 MB)")
+    print(f"Original: {selection['total_events']:,} events ({input_size_mb:.0f} MB)")
     print(f"Sample: {len(final_sample):,} events ({file_size_mb:.1f} MB)")
-    print(f"Event reduction: {(1 - len(final_sample)/209112)*100:.1f}%")
-    print(f"Size reduction: {(1 - file_size_mb/346)*100:.1f}%")
-    
+    print(f"Event reduction: {(1 - len(final_sample)/selection['total_events'])*100:.1f}%")
+    print(f"Size reduction: {(1 - file_size_mb/input_size_mb)*100:.1f}%")
+
     # Estimate dbt seed time improvement
-    time_improvement = (346 - file_size_mb) / 346 * 100
+    time_improvement = (input_size_mb - file_size_mb) / input_size_mb * 100
     print(f"Estimated dbt seed time improvement: {time_improvement:.1f}%")
 
+
+def sample_chunks(input_path: str, fraction: float, salt, after_date: Optional[str] = None,
+                  chunk_rows: int = 2000) -> Iterator[Tuple[pd.DataFrame, Counter]]:
+    """
+    Hash-sample an events file chunk by chunk: every row whose user hashes below the threshold.
+
+    Yields each chunk's sampled rows (unchanged, in file order) and its event
+    counts per type, for rows dated after after_date only.
+    """
+    threshold = np.uint64(min(int(fraction * 2 ** 64), 2 ** 64 - 1))
+    index = EventIndex.open_if_fresh(input_path) if after_date is not None else None
+    if index is not None:
+        # Seek straight to the new days instead of parsing the whole file
+        with index:
+            chunks = index.iter_read(start=int(after_date) + 1, chunk_rows=chunk_rows)
+            yield from sample_frames(chunks, fraction, salt, threshold)
+        return
+    with pd.read_csv(input_path, dtype=object, keep_default_na=False, chunksize=chunk_rows) as reader:
+        yield from sample_frames(reader, fraction, salt, threshold, after_date)
+
+
+def sample_frames(chunks: Iterable[pd.DataFrame], fraction: float, salt, threshold: np.uint64,
+                  after_date: Optional[str] = None) -> Iterator[Tuple[pd.DataFrame, Counter]]:
+    """Sampled rows and event counts per type of each chunk"""
+    for chunk in chunks:
+        if after_date is not None:
+            chunk = chunk[chunk['event_date'] > after_date]
+        keep = user_hashes(chunk['user_pseudo_id'], salt) < threshold if fraction < 1 else slice(None)
+        yield chunk[keep], Counter(chunk['event_name'].value_counts().to_dict())
+
+
+def sample_shard(input_path: str, **options) -> List[Tuple[pd.DataFrame, Counter]]:
+    """Hash-sample a whole daily file in a worker process"""
+    rows, totals = [], Counter()
+    for chunk_rows, chunk_totals in sample_chunks(input_path, **options):
+        rows.append(chunk_rows)
+        totals.update(chunk_totals)
+    return [(pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(), totals)]
+
+
+def last_sampled_date(output_path: str) -> Optional[str]:
+    """Latest event_date in an existing sample file"""
+    last = None
+    with pd.read_csv(output_path, usecols=['event_date'], dtype=object, chunksize=100_000) as reader:
+        for chunk in reader:
+            if len(chunk):
+                last = max(filter(None, [last, chunk['event_date'].max()]))
+    return last
+
+
+def create_hash_sample(input_path=f'{SEEDS_DIR}/ga4/events.csv', output_path=f'{SEEDS_DIR}/ga4/events_sample.csv',
+                       fraction: float = 0.05, salt='42', workers: int = 1, append: bool = False,
+                       chunk_rows: int = 2000):
+    """
+    Sample whole sessions by a salted hash of user_pseudo_id.
+
+    input_path is an events CSV (optionally .gz/.zst) or a directory of daily
+    events_YYYYMMDD files, which are sampled in parallel across workers
+    processes and written in date order. With append, rows dated after the
+    output's last event_date are appended to it.
+    """
+    print(f"Creating GA4 Sample Dataset (hash sampling, {fraction:.2%} of sessions, salt {salt!r})")
+    print("=" * 60)
+
+    if os.path.isdir(input_path):
+        files = partition_files(input_path, formats=['csv'])
+        if not files:
+            raise FileNotFoundError(f"No events_YYYYMMDD files in {input_path}")
+    else:
+        files = [input_path]
+
+    after_date = None
+    if append and os.path.exists(output_path):
+        after_date = last_sampled_date(output_path)
+        print(f"Appending events after {after_date} to {output_path}")
+        if after_date is not None:
+            # Whole days up to the last sampled one are already in the sample
+            files = [path for path in files if (partition_date(path) or '99999999') > after_date]
+
+    sampled = Counter()
+    totals = Counter()
+    write_header = not (append and os.path.exists(output_path))
+
+    def write(results: Iterable[Tuple[pd.DataFrame, Counter]], out):
+        nonlocal write_header
+        for rows, shard_totals in results:
+            totals.update(shard_totals)
+            if len(rows):
+                rows.to_csv(out, header=write_header, index=False)
+                write_header = False
+                sampled.update(rows['event_name'].value_counts().to_dict())
+
+    options = dict(fraction=fraction, salt=salt, after_date=after_date, chunk_rows=chunk_rows)
+    with open(output_path, 'w' if write_header else 'a', newline='', encoding='utf-8') as out:
+        if workers > 1 and len(files) > 1:
+            print(f"Using {workers} worker processes")
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for results in pool.map(partial(sample_shard, **options), files):
+                    write(results, out)
+        else:
+            for path in files:
+                write(sample_chunks(path, **options), out)
+
+    n_total, n_sampled = sum(totals.values()), sum(sampled.values())
+    print(f"Files sampled: {len(files):,}")
+    print(f"Events scanned: {n_total:,}")
+    print(f"Events sampled: {n_sampled:,}")
+    print(f"\nEvent type proportions (sample vs full):")
+    for event_name, count in totals.most_common():
+        print(f"  {event_name}: {sampled[event_name]:,} "
+              f"({sampled[event_name] / max(n_sampled, 1) * 100:.1f}% vs {count / n_total * 100:.1f}%)")
+    print(f"\n✅ Sample saved to: {output_path}")
+
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description="Create a representative sample of the GA4 events dataset")
+    parser.add_argument('--input', default=f'{SEEDS_DIR}/ga4/events.csv',
+                        help="Events CSV, or (hash mode) a directory of daily events_YYYYMMDD files")
+    parser.add_argument('--output', default=f'{SEEDS_DIR}/ga4/events_sample.csv', help="Sample CSV to write")
+    parser.add_argument('--mode', choices=['stratified', 'hash'], default='stratified',
+                        help="stratified: ~--target-events with purchase sessions oversampled (default); "
+                             "hash: every session whose salted hash falls below --fraction")
+    parser.add_argument('--target-events', type=int, default=10000, help="Stratified sample size (default: 10000)")
+    parser.add_argument('--fraction', type=float, default=0.05,
+                        help="Hash mode: share of sessions to keep (default: 0.05)")
+    parser.add_argument('--salt', default='42', help="Salt (seed) of the user hash (default: 42)")
+    parser.add_argument('--workers', type=int, default=1, help="Hash mode: processes sampling daily files")
+    parser.add_argument('--append', action='store_true',
+                        help="Hash mode: append days after the last one already in --output")
+    args = parser.parse_args()
+
+    if args.mode == 'hash':
+        if not 0 < args.fraction <= 1:
+            parser.error("--fraction must be in (0, 1]")
+        create_hash_sample(args.input, args.output, args.fraction, args.salt, args.workers, args.append)
+    else:
+        if args.append or args.workers != 1:
+            parser.error("--append and --workers apply to --mode hash")
+        create_ga4_sample(args.input, args.output, target_total=args.target_events, seed=args.salt)
+
+
 if __name__ == "__main__":
-    # Set random seed for reproducibility
-    np.random.seed(42)
-    create_ga4_sample()
\ No newline at end of file
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Product catalog for the GA4 events generator.
+
+product.csv and product_variant.csv are loaded once into contiguous arrays
+addressed by catalog position, with an id -> position lookup and each
+product's list price (its first variant's price). Sessions then work with
+positions only.
+
+sample_excluding() draws "k products other than these" for a whole batch of
+sessions at once. Each session costs O(k + excluded) work, never O(catalog),
+so browsing stays cheap on catalogs with 100k+ SKUs.
+"""
+
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from ga4_random import KeyedRandom
+
+
+class ProductCatalog:
+    """Products as arrays indexed by catalog position"""
+
+    def __init__(self, products: pd.DataFrame, variants: pd.DataFrame):
+        self.ids = products['id'].to_numpy()
+        self.titles = products['title'].tolist()
+        self.handles = products['handle'].tolist()
+        self.types = products['product_type'].tolist()
+
+        # id -> position through a sorted copy of the ids, so lookups are vectorized
+        self.id_order = np.argsort(self.ids, kind='stable')
+        self.sorted_ids = self.ids[self.id_order]
+
+        # First variant price per product (NaN when a product has no variants)
+        first_variant_price = variants.groupby('product_id', sort=False)['price'].first()
+        self.prices = first_variant_price.reindex(self.ids).to_numpy(dtype=float)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions(self, product_ids) -> np.ndarray:
+        """Catalog position of each product id (-1 for ids not in the catalog)"""
+        product_ids = np.asarray(product_ids)
+        if not len(self):
+            return np.full(len(product_ids), -1, dtype=np.int64)
+        found = np.searchsorted(self.sorted_ids, product_ids).clip(max=len(self) - 1)
+        return np.where(self.sorted_ids[found] == product_ids, self.id_order[found], -1)
+
+    def sample_excluding(self, random: KeyedRandom, stream: str, keys: np.ndarray, k: np.ndarray,
+                         excluded: np.ndarray, n_excluded: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Draw k[i] distinct positions for each key, none of them excluded for that key.
+
+        excluded holds each key's excluded positions in turn (n_excluded[i]
+        each, distinct and ascending within a key). Returns each key's sampled
+        positions in turn and the count per key (k, capped at the products left).
+
+        Floyd's algorithm picks k distinct ranks among the catalog's remaining
+        products, then each rank is shifted past the excluded positions below
+        it, so the candidate list is never built.
+        """
+        n = len(keys)
+        available = len(self) - n_excluded
+        k = np.minimum(k, available)
+        max_k = int(k.max()) if n else 0
+
+        chosen = np.full((n, max_k), -1, dtype=np.int64)
+        for step in range(max_k):
+            j = available - k + step
+            t = random.integers(stream, keys, 0, j + 1, counter=step)
+            taken = (chosen[:, :step] == t[:, None]).any(axis=1)
+            chosen[:, step] = np.where(taken, j, t)
+        in_sample = np.arange(max_k) < k[:, None]
+        ranks = chosen[in_sample]
+        owner = np.repeat(np.arange(n), k)
+
+        # Shift each rank past its key's excluded positions, in ascending order
+        max_excluded = int(n_excluded.max()) if n else 0
+        excluded_first = np.cumsum(n_excluded) - n_excluded
+        for column in range(max_excluded):
+            has = n_excluded[owner] > column
+            skip = excluded[excluded_first[owner[has]] + column]
+            ranks[has] += skip <= ranks[has]
+        return ranks, k
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Pre-serialized JSON fragments for the GA4 events generator.
+
+Most JSON columns come from a handful of fixed variants (devices, locations,
+traffic sources) or have a fixed shape with one or two changing values (event
+params, mobile device ids). Fragments are serialized once with json.dumps and
+then reused as strings, or spliced with str.format for the changing values.
+"""
+
+import json
+import re
+from typing import Any, Callable, Dict, Hashable
+
+_SLOT = re.compile(r'"@@(\w+)@@"')
+
+
+def slot(name: str) -> str:
+    """Placeholder for a dynamic value inside a template object"""
+    return f'@@{name}@@'
+
+
+class JsonTemplate:
+    """
+    JSON text with slots for values that change per row.
+
+    The template object is serialized once; each slot(name) string in it is
+    replaced by the raw JSON text passed to render(), in slot order.
+    """
+
+    def __init__(self, obj: Any):
+        text = json.dumps(obj)
+        parts = _SLOT.split(text)
+        self.slots = parts[1::2]
+        literals = [p.replace('{', '{{').replace('}', '}}') for p in parts[0::2]]
+        self.format = '{}'.join(literals)
+
+    def render(self, *values: str) -> str:
+        """Fill the slots with already JSON-encoded values"""
+        return self.format.format(*values)
+
+
+class JsonFragmentCache:
+    """Intern serialized JSON fragments and templates by key"""
+
+    def __init__(self):
+        self.fragments: Dict[Hashable, str] = {}
+        self.templates: Dict[Hashable, JsonTemplate] = {}
+
+    def intern(self, key: Hashable, build: Callable[[], Any]) -> str:
+        """Return the JSON text for key, serializing build() on first use"""
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            fragment = self.fragments[key] = json.dumps(build())
+        return fragment
+
+    def template(self, key: Hashable, build: Callable[[], Any]) -> JsonTemplate:
+        """Return the template for key, building it on first use"""
+        template = self.templates.get(key)
+        if template is None:
+            template = self.templates[key] = JsonTemplate(build())
+        return template
+
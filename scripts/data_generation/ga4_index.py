@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Byte-offset row index for GA4 events files (uncompressed CSV or NDJSON).
+
+build_index() scans an events file once and records where every row starts,
+grouped by (event_date, event_name, user_pseudo_id hash bucket), in a
+sidecar file next to it (events.csv -> events.csv.idx). EventIndex memory-maps
+both the sidecar and the events file, picks the groups matching a date range,
+event names and/or users, and parses only those rows' bytes, so a read costs
+time proportional to the rows returned rather than to the file.
+
+Sidecar layout: an 8-byte magic, the length of a JSON header, the JSON header
+(source size/mtime, format, CSV header line, event names, bucket count and
+the dtype/shape/offset of each array), then the raw arrays, 64-byte aligned:
+- offsets, lengths: byte range of each row, sorted by group then file order
+- group_date, group_name, group_bucket: key of each group
+- group_start, group_count: the group's slice of offsets/lengths
+
+Usage:
+    python ga4_index.py build seeds/ga4/events.csv
+    python ga4_index.py query seeds/ga4/events.csv --start 2024-03-01 --end 2024-03-07 --event purchase
+"""
+
+import argparse
+import io
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+MAGIC = b'GA4IDX1\n'
+DEFAULT_BUCKETS = 256
+ALIGNMENT = 64
+SCAN_BLOCK = 64 << 20
+
+
+def index_path(source_path: str) -> str:
+    return source_path + '.idx'
+
+
+def source_format(path: str) -> str:
+    if path.endswith(('.gz', '.zst')):
+        raise ValueError(f"Cannot index compressed file {path}: byte offsets need an uncompressed file")
+    if path.endswith('.ndjson'):
+        return 'ndjson'
+    if path.endswith('.csv'):
+        return 'csv'
+    raise ValueError(f"Unsupported events file {path} (expected .csv or .ndjson)")
+
+
+def user_buckets(user_pseudo_ids, buckets: int) -> np.ndarray:
+    """Hash bucket of each user_pseudo_id"""
+    hashes = pd.util.hash_array(np.asarray(user_pseudo_ids, dtype=object))
+    return (hashes % np.uint64(buckets)).astype(np.uint16)
+
+
+def normalize_date(value: str) -> int:
+    """YYYYMMDD or YYYY-MM-DD as an int YYYYMMDD"""
+    return int(str(value).replace('-', ''))
+
+
+def csv_row_starts(data: np.ndarray) -> np.ndarray:
+    """
+    Start offset of every CSV record, header included.
+
+    A newline ends a record only outside quotes, i.e. after an even number of
+    quote characters ("" escapes count twice), so quoted newlines are skipped.
+    """
+    starts = [np.zeros(1, dtype=np.int64)]
+    quotes_before = 0
+    for base in range(0, len(data), SCAN_BLOCK):
+        block = data[base:base + SCAN_BLOCK]
+        newlines = np.flatnonzero(block == ord('\n'))
+        quotes = np.flatnonzero(block == ord('"'))
+        outside = (quotes_before + np.searchsorted(quotes, newlines)) % 2 == 0
+        starts.append(newlines[outside].astype(np.int64) + base + 1)
+        quotes_before += len(quotes)
+    starts = np.concatenate(starts)
+    return starts[starts < len(data)]
+
+
+def ndjson_row_starts(data: np.ndarray) -> np.ndarray:
+    """Start offset of every NDJSON line (JSON strings cannot contain raw newlines)"""
+    starts = [np.zeros(1, dtype=np.int64)]
+    for base in range(0, len(data), SCAN_BLOCK):
+        block = data[base:base + SCAN_BLOCK]
+        starts.append(np.flatnonzero(block == ord('\n')).astype(np.int64) + base + 1)
+    starts = np.concatenate(starts)
+    return starts[starts < len(data)]
+
+
+def csv_key_columns(path: str, chunk_rows: int = 200_000) -> Iterator[pd.DataFrame]:
+    """event_date, event_name and user_pseudo_id of every CSV row, in chunks"""
+    with pd.read_csv(path, usecols=['event_date', 'event_name', 'user_pseudo_id'], dtype=object,
+                     keep_default_na=False, chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+def ndjson_key_columns(data, starts: np.ndarray) -> Iterator[pd.DataFrame]:
+    """
+    event_date, event_name and user_pseudo_id of every NDJSON line, in chunks
+    of lines spanning about SCAN_BLOCK bytes; each key's first occurrence in a
+    line is taken (the generator writes them before any nested record).
+    """
+    patterns = {key: re.compile(rb'"' + key.encode() + rb'"\s*:\s*"((?:[^"\\]|\\.)*)"')
+                for key in ('event_date', 'event_name', 'user_pseudo_id')}
+    ends = np.r_[starts[1:], len(data)]
+    first_row = 0
+    while first_row < len(starts):
+        last_row = max(int(np.searchsorted(ends, starts[first_row] + SCAN_BLOCK, side='right')), first_row + 1)
+        base = int(starts[first_row])
+        block = data[base:int(ends[last_row - 1])]
+        block_starts = starts[first_row:last_row] - base
+        columns = {}
+        for key, pattern in patterns.items():
+            positions, values = [], []
+            for match in pattern.finditer(block):
+                positions.append(match.start())
+                values.append(match.group(1))
+            rows = np.searchsorted(block_starts, np.array(positions, dtype=np.int64), side='right') - 1
+            rows, first = np.unique(rows, return_index=True)
+            if len(rows) != len(block_starts):
+                raise ValueError(f"{len(block_starts) - len(rows)} NDJSON lines have no {key}")
+            columns[key] = [json.loads(b'"' + values[i] + b'"') for i in first]
+        yield pd.DataFrame(columns)
+        first_row = last_row
+
+
+def build_index(source_path: str, buckets: int = DEFAULT_BUCKETS) -> str:
+    """Scan an events file and write its row index sidecar; returns the sidecar path"""
+    file_format = source_format(source_path)
+    stat = os.stat(source_path)
+    names: Dict[str, int] = {}
+    dates, codes, user_bucket = [], [], []
+    with open(source_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = np.frombuffer(mm, dtype=np.uint8)
+        if file_format == 'csv':
+            starts = csv_row_starts(data)
+            header = bytes(mm[:starts[1] if len(starts) > 1 else len(mm)])
+            starts = starts[1:]
+            key_chunks = csv_key_columns(source_path)
+        else:
+            starts = ndjson_row_starts(data)
+            header = b''
+            key_chunks = ndjson_key_columns(mm, starts)
+        del data
+        # Keys are kept as compact codes only: YYYYMMDD ints, event name codes and user buckets
+        for keys in key_chunks:
+            for name in keys['event_name'].unique():
+                names.setdefault(name, len(names))
+            dates.append(keys['event_date'].astype(np.int64).to_numpy().astype(np.int32))
+            codes.append(keys['event_name'].map(names).to_numpy(dtype=np.uint16))
+            user_bucket.append(user_buckets(keys['user_pseudo_id'], buckets))
+    date = np.concatenate(dates) if dates else np.empty(0, dtype=np.int32)
+    name = np.concatenate(codes) if codes else np.empty(0, dtype=np.uint16)
+    bucket = np.concatenate(user_bucket) if user_bucket else np.empty(0, dtype=np.uint16)
+    if len(date) != len(starts):
+        raise ValueError(f"Found {len(starts)} row starts but parsed {len(date)} rows in {source_path}")
+    lengths = np.diff(np.r_[starts, stat.st_size])
+
+    order = np.lexsort((np.arange(len(starts)), bucket, name, date))
+    date, name, bucket = date[order], name[order], bucket[order]
+    first = np.flatnonzero(np.r_[True, (date[1:] != date[:-1]) | (name[1:] != name[:-1])
+                                 | (bucket[1:] != bucket[:-1])]) if len(order) else np.empty(0, dtype=np.int64)
+
+    arrays = {
+        'offsets': starts[order].astype(np.uint64),
+        'lengths': lengths[order].astype(np.uint32),
+        'group_date': date[first],
+        'group_name': name[first],
+        'group_bucket': bucket[first],
+        'group_start': first.astype(np.uint64),
+        'group_count': np.diff(np.r_[first, len(order)]).astype(np.uint64),
+    }
+    header_json = {
+        'format': file_format,
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'rows': int(len(starts)),
+        'buckets': buckets,
+        'csv_header': header.decode('utf-8'),
+        'event_names': list(names),
+        'arrays': {},
+    }
+    # Array offsets depend on the JSON length, so lay out against a generous upper bound first
+    layout_start = ALIGNMENT * (1 + (len(MAGIC) + 8 + len(json.dumps(header_json)) + 200 * len(arrays)) // ALIGNMENT)
+    position = layout_start
+    for key, array in arrays.items():
+        header_json['arrays'][key] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': position}
+        position += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    encoded = json.dumps(header_json).encode('utf-8')
+
+    path = index_path(source_path)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(encoded)) + encoded)
+        for key, array in arrays.items():
+            f.write(b'\0' * (header_json['arrays'][key]['offset'] - f.tell()))
+            f.write(array.tobytes())
+    os.replace(path + '.tmp', path)
+    return path
+
+
+class EventIndex:
+    """
+    Memory-mapped reader of an indexed events file.
+
+    Raises ValueError if the events file changed since the index was built.
+    """
+
+    def __init__(self, source_path: str):
+        self.source_path = source_path
+        with open(index_path(source_path), 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{index_path(source_path)} is not a GA4 events index")
+            (length,) = struct.unpack('<Q', f.read(8))
+            self.meta = json.loads(f.read(length))
+        stat = os.stat(source_path)
+        if (stat.st_size, stat.st_mtime_ns) != (self.meta['source_size'], self.meta['source_mtime_ns']):
+            raise ValueError(f"Index of {source_path} is stale; rebuild it with: python ga4_index.py build {source_path}")
+
+        for key, spec in self.meta['arrays'].items():
+            array = (np.memmap(index_path(source_path), dtype=np.dtype(spec['dtype']), mode='r',
+                               offset=spec['offset'], shape=tuple(spec['shape']))
+                     if spec['shape'][0] else np.empty(0, dtype=np.dtype(spec['dtype'])))
+            setattr(self, key, array)
+        self.event_names: List[str] = self.meta['event_names']
+        self.file = open(source_path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b''
+
+    @classmethod
+    def open_if_fresh(cls, source_path: str) -> Optional['EventIndex']:
+        """The file's index, or None if it has none or it is stale"""
+        if not os.path.exists(index_path(source_path)):
+            return None
+        try:
+            return cls(source_path)
+        except ValueError:
+            return None
+
+    def groups(self, start=None, end=None, event_names: Iterable[str] = None,
+               user_pseudo_ids: Iterable[str] = None) -> np.ndarray:
+        """Indices of the groups matching a date range (inclusive), event names and users"""
+        match = np.ones(len(self.group_date), dtype=bool)
+        if start is not None:
+            match &= self.group_date >= normalize_date(start)
+        if end is not None:
+            match &= self.group_date <= normalize_date(end)
+        if event_names is not None:
+            codes = [self.event_names.index(name) for name in event_names if name in self.event_names]
+            match &= np.isin(self.group_name, codes)
+        if user_pseudo_ids is not None:
+            match &= np.isin(self.group_bucket, user_buckets(list(user_pseudo_ids), self.meta['buckets']))
+        return np.flatnonzero(match)
+
+    def count(self, start=None, end=None, event_names: Iterable[str] = None) -> int:
+        """Rows matching a date range and event names, from the index alone"""
+        return int(self.group_count[self.groups(start, end, event_names)].sum())
+
+    def row_ranges(self, groups: np.ndarray) -> np.ndarray:
+        """(offset, length) of the groups' rows in file order"""
+        first = self.group_start[groups].astype(np.int64)
+        count = self.group_count[groups].astype(np.int64)
+        rows = np.repeat(first - np.cumsum(count) + count, count) + np.arange(int(count.sum()))
+        offsets = self.offsets[rows]
+        order = np.argsort(offsets, kind='stable')
+        return np.column_stack([offsets[order], self.lengths[rows][order]]).astype(np.int64)
+
+    def parse(self, ranges: np.ndarray) -> pd.DataFrame:
+        # Adjacent rows are read as one slice
+        ends = ranges[:, 0] + ranges[:, 1]
+        breaks = np.flatnonzero(ranges[1:, 0] != ends[:-1]) + 1
+        slices = [self.data[ranges[a, 0]:ends[b - 1]] for a, b in zip(np.r_[0, breaks], np.r_[breaks, len(ranges)])]
+        if self.meta['format'] == 'csv':
+            text = self.meta['csv_header'].encode('utf-8') + b''.join(slices)
+            return pd.read_csv(io.BytesIO(text), dtype=object, keep_default_na=False)
+        return pd.read_json(io.BytesIO(b''.join(slices)), lines=True, dtype=False)
+
+    def iter_read(self, start=None, end=None, event_names: Iterable[str] = None,
+                  user_pseudo_ids: Iterable[str] = None, chunk_rows: int = 50000) -> Iterator[pd.DataFrame]:
+        """Matching rows in file order, chunk_rows at a time, parsed like the source file"""
+        ranges = self.row_ranges(self.groups(start, end, event_names, user_pseudo_ids))
+        users = set(user_pseudo_ids) if user_pseudo_ids is not None else None
+        for first in range(0, len(ranges), chunk_rows):
+            chunk = self.parse(ranges[first:first + chunk_rows])
+            if users is not None:
+                # Buckets hold other users too
+                chunk = chunk[chunk['user_pseudo_id'].isin(users)].reset_index(drop=True)
+            yield chunk
+
+    def read(self, start=None, end=None, event_names: Iterable[str] = None,
+             user_pseudo_ids: Iterable[str] = None) -> pd.DataFrame:
+        """Matching rows in file order"""
+        chunks = list(self.iter_read(start, end, event_names, user_pseudo_ids))
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description="Build or query a byte-offset row index of a GA4 events file")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="Index an events file (writes <file>.idx)")
+    build.add_argument('events', help="Uncompressed events CSV or NDJSON file")
+    build.add_argument('--buckets', type=int, default=DEFAULT_BUCKETS, help="user_pseudo_id hash buckets")
+    query = commands.add_parser('query', help="Print matching rows as CSV, read through the index")
+    query.add_argument('events')
+    query.add_argument('--start', help="First event_date (YYYYMMDD or YYYY-MM-DD)")
+    query.add_argument('--end', help="Last event_date")
+    query.add_argument('--event', nargs='+', dest='event_names', help="Event names")
+    query.add_argument('--user', nargs='+', dest='users', help="user_pseudo_id values")
+    query.add_argument('--count', action='store_true', help="Only print the number of matching rows")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if not 1 <= args.buckets <= 65536:
+            parser.error("--buckets must be between 1 and 65536")
+        path = build_index(args.events, args.buckets)
+        print(f"Index written to {path}")
+        return
+    with EventIndex(args.events) as index:
+        if args.count and not args.users:
+            print(index.count(args.start, args.end, args.event_names))
+            return
+        rows = 0
+        for i, chunk in enumerate(index.iter_read(args.start, args.end, args.event_names, args.users)):
+            rows += len(chunk)
+            if not args.count:
+                chunk.to_csv(sys.stdout, header=i == 0, index=False)
+        if args.count:
+            print(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Markov-chain journeys for the GA4 events generator's non-converting sessions.
+
+A journey is a walk over page states loaded from YAML (see ga4_journeys.yaml).
+Each state emits a fixed list of events, each with its own dwell-time range,
+and has transition probabilities to the other states and to 'exit'. States
+with page: product open a new product page; events in other states refer to
+the last product viewed.
+
+simulate() walks a whole batch of sessions together, one vectorized step at
+a time, drawing each session's next state from its keyed random stream with
+the step number as the counter.
+"""
+
+from typing import Any, Dict, Sequence
+
+import numpy as np
+import yaml
+
+from ga4_random import KeyedRandom
+
+EXIT = 'exit'
+JOURNEY_EVENTS = {'page_view', 'view_item', 'add_to_cart'}
+
+
+class JourneyModel:
+    """Transition and event tables compiled from a journey config"""
+
+    def __init__(self, config: Dict[str, Any], event_names: Sequence[str]):
+        states = config['states']
+        self.state_names = list(states)
+        if config['start'] not in states:
+            raise ValueError(f"Start state {config['start']!r} is not defined")
+        self.start = self.state_names.index(config['start'])
+        self.max_steps = int(config.get('max_steps', 20))
+        self.session_start = list(event_names).index('session_start')
+
+        # Transition matrix over the states plus an absorbing exit state (last)
+        targets = self.state_names + [EXIT]
+        n_states = len(self.state_names)
+        transitions = np.zeros((n_states + 1, n_states + 1))
+        transitions[n_states, n_states] = 1.0
+        for i, name in enumerate(self.state_names):
+            for target, p in states[name].get('next', {EXIT: 1.0}).items():
+                if target not in targets:
+                    raise ValueError(f"State {name!r} has a transition to unknown state {target!r}")
+                if p < 0:
+                    raise ValueError(f"State {name!r} has a negative transition probability to {target!r}")
+                transitions[i, targets.index(target)] = p
+            if transitions[i].sum() <= 0:
+                raise ValueError(f"State {name!r} has no transitions")
+        self.cumulative = np.cumsum(transitions / transitions.sum(axis=1, keepdims=True), axis=1)
+        self.cumulative[:, -1] = 1.0
+
+        # Events of every state, flattened; product_page marks states that open a new product
+        self.product_page = np.zeros(n_states + 1, dtype=bool)
+        self.n_events = np.zeros(n_states + 1, dtype=np.int64)
+        codes, uses_product, dwell_min, dwell_max = [], [], [], []
+        for i, name in enumerate(self.state_names):
+            state = states[name]
+            self.product_page[i] = state.get('page') == 'product'
+            for event in state.get('events', []):
+                if event['event'] not in JOURNEY_EVENTS:
+                    raise ValueError(f"State {name!r} emits unsupported event {event['event']!r}")
+                lo, hi = event.get('dwell', [0, 0])
+                codes.append(list(event_names).index(event['event']))
+                uses_product.append(event['event'] != 'page_view' or self.product_page[i])
+                dwell_min.append(lo)
+                dwell_max.append(hi)
+            self.n_events[i] = len(state.get('events', []))
+        self.event_first = np.cumsum(self.n_events) - self.n_events
+        self.event_codes = np.array(codes, dtype=np.int8)
+        self.event_uses_product = np.array(uses_product, dtype=bool)
+        self.event_dwell_min = np.array(dwell_min, dtype=np.int64)
+        self.event_dwell_max = np.array(dwell_max, dtype=np.int64)
+        # A state whose events need a product when none has been viewed yet opens one
+        self.needs_product = np.zeros(n_states + 1, dtype=bool)
+        np.logical_or.at(self.needs_product, np.repeat(np.arange(n_states), self.n_events[:n_states]),
+                         self.event_uses_product)
+
+    @classmethod
+    def from_yaml(cls, path: str, event_names: Sequence[str]) -> 'JourneyModel':
+        with open(path) as f:
+            return cls(yaml.safe_load(f), event_names)
+
+    def simulate(self, random: KeyedRandom, keys: np.ndarray, n_products: int) -> Dict[str, np.ndarray]:
+        """
+        Walk one journey per key and lay out its events.
+
+        Returns per-event arrays, grouped by session in key order: 'sess'
+        (index into keys), 'code' (event name code, session_start first),
+        'product_ref' (catalog position, -1 for none) and 'dwell_min' /
+        'dwell_max' (seconds before the event).
+        """
+        n = len(keys)
+        exit_state = len(self.state_names)
+        state = np.full(n, self.start)
+        product = np.full(n, -1, dtype=np.int64)
+        path_state = np.full((n, self.max_steps), exit_state)
+        path_product = np.full((n, self.max_steps), -1, dtype=np.int64)
+
+        for step in range(self.max_steps):
+            active = state != exit_state
+            if not active.any():
+                break
+            opens = active & (self.product_page[state] | (self.needs_product[state] & (product < 0)))
+            draw = random.integers('journey_product', keys[opens], 0, n_products, counter=step)
+            product[opens] = draw
+            path_state[:, step] = state
+            path_product[:, step] = product
+            u = random.random('journey_step', keys, counter=step)
+            following = (u[:, None] >= self.cumulative[state]).sum(axis=1)
+            state = np.where(active, np.minimum(following, exit_state), exit_state)
+
+        # Expand each visited state into its events
+        visited = path_state != exit_state
+        visit_sess = np.nonzero(visited)[0]
+        visit_state = path_state[visited]
+        visit_product = path_product[visited]
+        per_visit = self.n_events[visit_state]
+        event_sess = np.repeat(visit_sess, per_visit)
+        event_index = (np.repeat(self.event_first[visit_state] - (np.cumsum(per_visit) - per_visit), per_visit)
+                       + np.arange(int(per_visit.sum())))
+        event_product = np.where(self.event_uses_product[event_index], np.repeat(visit_product, per_visit), -1)
+
+        # Every session opens with session_start
+        sess = np.concatenate([np.arange(n), event_sess])
+        order = np.argsort(sess, kind='stable')
+        return {
+            'sess': sess[order],
+            'code': np.concatenate([np.full(n, self.session_start, dtype=np.int8), self.event_codes[event_index]])[order],
+            'product_ref': np.concatenate([np.full(n, -1, dtype=np.int64), event_product])[order],
+            'dwell_min': np.concatenate([np.zeros(n, dtype=np.int64), self.event_dwell_min[event_index]])[order],
+            'dwell_max': np.concatenate([np.zeros(n, dtype=np.int64), self.event_dwell_max[event_index]])[order],
+        }
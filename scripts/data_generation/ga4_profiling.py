@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Per-stage instrumentation for the GA4 events generator.
+
+Stages are timed with wall and CPU clocks and counted each time they run.
+With trace_memory, tracemalloc also records the net bytes each stage leaves
+allocated. Stages can nest (an assemble step inside a session batch), so the
+stage times are not meant to add up to the total. Counters hold per-event-type
+and session totals. Reports from worker processes are merged
+into the parent's.
+"""
+
+import functools
+import json
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator
+
+
+class StageProfiler:
+    """Accumulate timings, call counts and counters by stage name"""
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'allocated_bytes': 0}
+        )
+        self.counters = Counter()
+        self.started = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as one call of a stage"""
+        wall, cpu = time.perf_counter(), time.process_time()
+        memory = tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+        try:
+            yield
+        finally:
+            stats = self.stages[name]
+            stats['calls'] += 1
+            stats['wall_seconds'] += time.perf_counter() - wall
+            stats['cpu_seconds'] += time.process_time() - cpu
+            if self.trace_memory:
+                stats['allocated_bytes'] += tracemalloc.get_traced_memory()[0] - memory
+
+    def iter_stage(self, name: str, iterable: Iterable) -> Iterator:
+        """Time each step of an iterator (e.g. a lazy merge) as one call of a stage"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] += int(n)
+
+    def merge(self, report: Dict[str, Any]):
+        """Add a report from another process (e.g. a shard worker)"""
+        for name, stats in report['stages'].items():
+            for key, value in stats.items():
+                self.stages[name][key] += value
+        self.counters.update(report['counters'])
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            'total_wall_seconds': round(time.perf_counter() - self.started, 3),
+            'stages': {
+                name: {key: round(value, 4) if isinstance(value, float) else value for key, value in stats.items()}
+                for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]['wall_seconds'])
+            },
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def write_report(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def print_summary(self):
+        report = self.report()
+        print(f"Stage timings (total {report['total_wall_seconds']:.2f}s wall):")
+        for name, stats in report['stages'].items():
+            line = (f"  {name:<28} {stats['calls']:>7} calls  {stats['wall_seconds']:>9.3f}s wall"
+                    f"  {stats['cpu_seconds']:>9.3f}s cpu")
+            if self.trace_memory:
+                line += f"  {stats['allocated_bytes'] / 2**20:>8.1f} MB"
+            print(line)
+
+
+def profiled(name: str):
+    """Decorator timing a method as a stage of self.profiler"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
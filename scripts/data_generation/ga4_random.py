@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Counter-based random streams for the GA4 events generator.
+
+Every random value is a hash of (seed, stream name, session key, counter),
+so a session's draws depend only on its own key and never on how many
+sessions were generated before it, in which order, or in which process.
+The hash is the SplitMix64 finalizer applied in a chain, vectorized over
+NumPy uint64 arrays so a whole batch of sessions (or events, with the event's
+position as the counter) is drawn in one call.
+
+Session keys:
+- converting sessions use converting_key(order id, occurrence): the order id,
+  with a flag and the occurrence index added for later rows reusing an id
+- non-converting sessions use non_converting_key(day, index within day)
+"""
+
+import hashlib
+from typing import Dict, Sequence
+
+import numpy as np
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+_NON_CONVERTING = np.uint64(1 << 63)
+_REPEATED_ORDER = np.uint64(1 << 62)
+_ORDER_ID_LIMIT = 1 << 40
+_OCCURRENCE_LIMIT = 1 << 22
+_INDEX_LIMIT = 1 << 24
+_DAY_LIMIT = 1 << 39
+
+
+def _mix(z: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer (wrapping uint64 arithmetic)"""
+    z = z + _GOLDEN
+    z = (z ^ (z >> np.uint64(30))) * _MIX_1
+    z = (z ^ (z >> np.uint64(27))) * _MIX_2
+    return z ^ (z >> np.uint64(31))
+
+
+def converting_key(order_id: np.ndarray, occurrence: np.ndarray) -> np.ndarray:
+    """
+    Key for the converting session of an order row.
+
+    order.csv can reuse an order id for a later order. The first row with an
+    id is keyed by the id alone; the occurrence-th repeat (1, 2, ...) gets a
+    flag bit and its occurrence above the id, so every row has its own session.
+    """
+    order_id = np.asarray(order_id, dtype=np.int64)
+    occurrence = np.asarray(occurrence, dtype=np.int64)
+    repeated = occurrence > 0
+    if order_id.size and (order_id.min() < 0 or order_id.max() >= 1 << 62
+                          or (repeated & (order_id >= _ORDER_ID_LIMIT)).any()):
+        raise ValueError("Order id out of range for a session key")
+    if occurrence.size and (occurrence.min() < 0 or occurrence.max() >= _OCCURRENCE_LIMIT):
+        raise ValueError(f"Order id occurrence out of range [0, {_OCCURRENCE_LIMIT})")
+    flags = np.where(repeated, _REPEATED_ORDER | (occurrence.astype(np.uint64) << np.uint64(40)), np.uint64(0))
+    return order_id.astype(np.uint64) | flags
+
+
+def non_converting_key(day: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """Key for the index-th non-converting session based on a day offset"""
+    day = np.asarray(day, dtype=np.int64)
+    index = np.asarray(index, dtype=np.int64)
+    # The index is packed into the low 24 bits; a larger one would alias the next day's keys
+    if index.size and (index.min() < 0 or index.max() >= _INDEX_LIMIT):
+        raise ValueError(f"Non-converting session index out of range [0, {_INDEX_LIMIT}): "
+                         f"{index.min() if index.min() < 0 else index.max()}")
+    if day.size and (day.min() < 0 or day.max() >= _DAY_LIMIT):
+        raise ValueError(f"Non-converting session day offset out of range [0, {_DAY_LIMIT})")
+    return _NON_CONVERTING | (day.astype(np.uint64) << np.uint64(24)) | index.astype(np.uint64)
+
+
+class KeyedRandom:
+    """Draw values as a pure function of (seed, stream, key, counter)"""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.streams: Dict[str, np.ndarray] = {}
+
+    def stream(self, name: str) -> np.ndarray:
+        """Per-stream starting state, derived from the seed and a stable hash of the name"""
+        state = self.streams.get(name)
+        if state is None:
+            digest = hashlib.blake2b(f"{self.seed}:{name}".encode(), digest_size=8).digest()
+            state = self.streams[name] = _mix(np.array([int.from_bytes(digest, 'little')], dtype=np.uint64))
+        return state
+
+    def bits(self, name: str, keys: np.ndarray, counter=0) -> np.ndarray:
+        """64 random bits per key (and per counter, broadcast against keys)"""
+        with np.errstate(over='ignore'):
+            z = _mix(self.stream(name) ^ np.asarray(keys).astype(np.uint64))
+            return _mix(z ^ np.asarray(counter).astype(np.uint64))
+
+    def random(self, name: str, keys: np.ndarray, counter=0) -> np.ndarray:
+        """Uniform floats in [0, 1)"""
+        return (self.bits(name, keys, counter) >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+    def integers(self, name: str, keys: np.ndarray, low, high, counter=0) -> np.ndarray:
+        """Integers in [low, high); low and high may be arrays"""
+        low = np.asarray(low, dtype=np.int64)
+        span = np.asarray(high, dtype=np.int64) - low
+        return low + (self.random(name, keys, counter) * span).astype(np.int64)
+
+    def uniform(self, name: str, keys: np.ndarray, low: float, high: float, counter=0) -> np.ndarray:
+        return low + self.random(name, keys, counter) * (high - low)
+
+    def choice(self, name: str, keys: np.ndarray, p: Sequence[float], counter=0) -> np.ndarray:
+        """Index drawn with probabilities p"""
+        cumulative = np.cumsum(p)
+        u = self.random(name, keys, counter) * cumulative[-1]
+        return np.minimum(np.searchsorted(cumulative, u, side='right'), len(cumulative) - 1)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Mergeable sketches for streaming statistics over GA4 events.
+
+Each sketch is built per chunk (or per worker) and merged afterwards;
+merging is associative, so results do not depend on how the file was split.
+
+- HyperLogLog: distinct counts from 64-bit hashes, ~0.8% standard error
+  at the default precision (2^14 one-byte registers)
+- TDigest: quantiles with error concentrated away from the tails, plus
+  exact count, sum, min and max
+
+Both work on NumPy arrays a chunk at a time rather than value by value.
+"""
+
+import math
+from typing import Iterable
+
+import numpy as np
+
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """Number of significant bits of each uint64"""
+    x = x.copy()
+    length = np.zeros(len(x), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = x >= (np.uint64(1) << np.uint64(shift))
+        length += big * shift
+        x[big] >>= np.uint64(shift)
+    return length + (x > 0)
+
+
+class HyperLogLog:
+    """Distinct count estimate from 64-bit hashes"""
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray):
+        """Add values by their uint64 hashes (e.g. pd.util.hash_array)"""
+        if not len(hashes):
+            return
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        # A guard bit below the remaining 64 - p bits caps the rank at 64 - p + 1
+        remaining = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        rank = (65 - _bit_length(remaining)).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: 'HyperLogLog'):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLogs of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction: linear counting over empty registers
+            estimate = m * math.log(m / zeros)
+        return float(estimate)
+
+
+class TDigest:
+    """
+    Quantile sketch (merging t-digest with the k1 scale function).
+
+    Values are folded into weighted centroids whose size shrinks towards both
+    tails, so about compression / 2 centroids keep extreme quantiles accurate.
+    """
+
+    def __init__(self, compression: float = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values: Iterable[float]):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.compress(values, np.ones(len(values)))
+
+    def merge(self, other: 'TDigest'):
+        if not other.count:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.compress(other.means, other.weights)
+
+    def compress(self, means: np.ndarray, weights: np.ndarray):
+        """Fold new centroids into the digest"""
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * q - 1)
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        self.weights = np.bincount(cluster, weights)
+        sums = np.bincount(cluster, weights * means)
+        keep = self.weights > 0
+        self.weights = self.weights[keep]
+        self.means = sums[keep] / self.weights
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return math.nan
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * self.count, np.r_[0, centers, self.count], np.r_[self.min, self.means, self.max]))
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else math.nan
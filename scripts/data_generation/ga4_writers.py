@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""
+Streaming output helpers for the GA4 events generator.
+
+Events arrive as batches of rows in generation order. The reorder buffer
+releases them in timestamp order once no later batch can produce an earlier
+event, and the writers flush each released chunk to disk straight away, so
+memory depends on the size of one generation window, not on the dataset size.
+
+Worker processes write each shard as a sorted run file instead of returning
+frames to the parent; merge_sorted_runs() then k-way merges the runs, holding
+one chunk per run in memory.
+
+BackgroundWriter moves encoding, compression and I/O onto a writer thread fed
+through a bounded queue, so they overlap with generating the next chunks.
+
+NdjsonEventWriter writes GA4 export records as newline-delimited JSON for
+BigQuery JSON load jobs; BlockCompressor gzip/zstd-compresses that stream in
+independent blocks on a thread pool.
+"""
+
+import gzip
+import io
+import json
+import os
+import pickle
+import queue
+import re
+import threading
+import numpy as np
+import pandas as pd
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# File suffix added by each CSV compression
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+class TimestampReorderBuffer:
+    """Hold event batches until a watermark guarantees their final order"""
+
+    def __init__(self, sort_column: str = 'event_timestamp'):
+        self.sort_column = sort_column
+        self.pending: List[pd.DataFrame] = []
+
+    def add(self, events: pd.DataFrame):
+        """Queue a batch of events in arrival order"""
+        if len(events):
+            self.pending.append(events)
+
+    def release(self, watermark: int) -> pd.DataFrame:
+        """Return, sorted, every queued event with a timestamp below the watermark"""
+        if not self.pending:
+            return pd.DataFrame()
+        events = pd.concat(self.pending, ignore_index=True)
+        events = events.sort_values(self.sort_column, kind='stable', ignore_index=True)
+        split = int(events[self.sort_column].searchsorted(watermark, side='left'))
+        self.pending = [events.iloc[split:].copy()] if split < len(events) else []
+        return events.iloc[:split]
+
+    def release_all(self) -> pd.DataFrame:
+        """Return every queued event, sorted"""
+        if not self.pending:
+            return pd.DataFrame()
+        events = pd.concat(self.pending, ignore_index=True)
+        self.pending = []
+        return events.sort_values(self.sort_column, kind='stable', ignore_index=True)
+
+
+class SortedRunWriter:
+    """
+    Append timestamp-ordered chunks to a run file of pickled DataFrames.
+
+    The first timestamp of every chunk is saved to a JSON sidecar
+    (<path>.index) so the merge can leave a run unread until it is needed.
+    """
+
+    def __init__(self, path: str, sort_column: str = 'event_timestamp'):
+        self.path = path
+        self.sort_column = sort_column
+        self.rows = 0
+        self.chunk_starts: List[int] = []
+        self.file = open(path, 'wb')
+
+    def write(self, events: pd.DataFrame):
+        if len(events):
+            pickle.dump(events, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+            self.rows += len(events)
+            self.chunk_starts.append(int(events[self.sort_column].iat[0]))
+
+    def close(self):
+        self.file.close()
+        with open(self.path + '.index', 'w') as f:
+            json.dump(self.chunk_starts, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_run(path: str) -> Iterator[pd.DataFrame]:
+    """Read back the chunks of a run file in order"""
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def merge_sorted_runs(paths: List[str], sort_column: str = 'event_timestamp') -> Iterator[pd.DataFrame]:
+    """
+    K-way merge of sorted run files into timestamp-ordered chunks.
+
+    Every loaded row below the smallest next-chunk start across runs is final,
+    so each round releases those rows and loads only the chunk that set the
+    bound. Runs that start later stay on disk. Ties keep run order, so the
+    result equals a stable sort of the runs concatenated.
+    """
+    runs = [iter_run(path) for path in paths]
+    pending_starts = []
+    for path in paths:
+        with open(path + '.index') as f:
+            pending_starts.append(deque(json.load(f)))
+    heads = [pd.DataFrame()] * len(runs)
+
+    while any(pending_starts) or any(len(head) for head in heads):
+        starts = [s[0] for s in pending_starts if s]
+        bound = min(starts) if starts else None
+
+        ready = []
+        for i, head in enumerate(heads):
+            if not len(head):
+                continue
+            split = len(head) if bound is None else int(head[sort_column].searchsorted(bound, side='left'))
+            if split:
+                ready.append(head.iloc[:split])
+                heads[i] = head.iloc[split:]
+        if ready:
+            merged = pd.concat(ready, ignore_index=True)
+            yield merged.sort_values(sort_column, kind='stable', ignore_index=True)
+
+        # Load the next chunk of each run that set the bound
+        for i, s in enumerate(pending_starts):
+            if s and s[0] == bound:
+                s.popleft()
+                chunk = next(runs[i])
+                heads[i] = pd.concat([heads[i], chunk], ignore_index=True) if len(heads[i]) else chunk
+
+
+class EventWriter:
+    """Base class for chunked event writers; tracks summary statistics"""
+
+    def __init__(self, output_path: str, chunk_rows: int = 50000):
+        self.output_path = output_path
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self.event_counts = Counter()
+        self.min_date = None
+        self.max_date = None
+
+    def write(self, events: pd.DataFrame):
+        """Write a chunk of already-ordered events"""
+        for start in range(0, len(events), self.chunk_rows):
+            chunk = events.iloc[start:start + self.chunk_rows]
+            self.write_chunk(chunk)
+            self.rows += len(chunk)
+        if len(events):
+            counts = events['event_name'].value_counts()
+            self.event_counts.update(counts[counts > 0].to_dict())
+            dates = events['event_date']
+            self.min_date = min(filter(None, [self.min_date, dates.min()]))
+            self.max_date = max(filter(None, [self.max_date, dates.max()]))
+
+    def write_chunk(self, chunk: pd.DataFrame):
+        raise NotImplementedError
+
+    def close(self):
+        """Flush and close the output"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_text_output(path: str, compression: str = None):
+    """Open a UTF-8 text file for writing, optionally gzip- or zstd-compressed"""
+    if compression is None:
+        return open(path, 'w', newline='', encoding='utf-8')
+    if compression == 'gzip':
+        return gzip.open(path, 'wt', compresslevel=6, newline='', encoding='utf-8')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd compression requires zstandard: pip install zstandard") from e
+        stream = zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'))
+        return io.TextIOWrapper(stream, newline='', encoding='utf-8')
+    raise ValueError(f"Unknown compression {compression!r}")
+
+
+class CsvEventWriter(EventWriter):
+    """Append event chunks to a single CSV file, writing the header once"""
+
+    def __init__(self, output_path: str, chunk_rows: int = 50000, compression: str = None):
+        super().__init__(output_path, chunk_rows)
+        self.file = open_text_output(output_path, compression)
+
+    def write_chunk(self, chunk: pd.DataFrame):
+        chunk.to_csv(self.file, header=self.rows == 0, index=False)
+
+    def close(self):
+        self.file.close()
+
+
+def ga4_export_schema():
+    """Arrow schema matching the BigQuery GA4 export, with nested records"""
+    import pyarrow as pa
+
+    param_value = pa.struct([
+        ('string_value', pa.string()),
+        ('int_value', pa.int64()),
+        ('float_value', pa.float64()),
+        ('double_value', pa.float64()),
+    ])
+    user_property_value = pa.struct([
+        ('string_value', pa.string()),
+        ('int_value', pa.int64()),
+        ('float_value', pa.float64()),
+        ('double_value', pa.float64()),
+        ('set_timestamp_micros', pa.int64()),
+    ])
+    item = pa.struct([
+        ('item_id', pa.string()),
+        ('item_name', pa.string()),
+        ('item_brand', pa.string()),
+        ('item_variant', pa.string()),
+        ('item_category', pa.string()),
+        ('price', pa.float64()),
+        ('quantity', pa.int64()),
+        ('currency', pa.string()),
+    ])
+    web_info = pa.struct([
+        ('browser', pa.string()),
+        ('browser_version', pa.string()),
+        ('hostname', pa.string()),
+    ])
+    device = pa.struct([
+        ('category', pa.string()),
+        ('mobile_brand_name', pa.string()),
+        ('mobile_model_name', pa.string()),
+        ('mobile_marketing_name', pa.string()),
+        ('mobile_os_hardware_model', pa.string()),
+        ('operating_system', pa.string()),
+        ('operating_system_version', pa.string()),
+        ('vendor_id', pa.string()),
+        ('advertising_id', pa.string()),
+        ('language', pa.string()),
+        ('is_limited_ad_tracking', pa.string()),
+        ('time_zone_offset_seconds', pa.int64()),
+        ('browser', pa.string()),
+        ('browser_version', pa.string()),
+        ('web_info', web_info),
+    ])
+
+    return pa.schema([
+        ('event_date', pa.string()),
+        ('event_timestamp', pa.int64()),
+        ('event_name', pa.string()),
+        ('event_params', pa.list_(pa.struct([('key', pa.string()), ('value', param_value)]))),
+        ('event_previous_timestamp', pa.int64()),
+        ('event_value_in_usd', pa.float64()),
+        ('event_bundle_sequence_id', pa.int64()),
+        ('event_server_timestamp_offset', pa.int64()),
+        ('user_id', pa.string()),
+        ('user_pseudo_id', pa.string()),
+        ('privacy_info', pa.struct([
+            ('analytics_storage', pa.string()),
+            ('ads_storage', pa.string()),
+            ('uses_transient_token', pa.string()),
+        ])),
+        ('user_properties', pa.list_(pa.struct([('key', pa.string()), ('value', user_property_value)]))),
+        ('user_first_touch_timestamp', pa.int64()),
+        ('user_ltv', pa.struct([('revenue', pa.float64()), ('currency', pa.string())])),
+        ('device', device),
+        ('geo', pa.struct([
+            ('continent', pa.string()),
+            ('country', pa.string()),
+            ('region', pa.string()),
+            ('city', pa.string()),
+        ])),
+        ('app_info', pa.struct([
+            ('id', pa.string()),
+            ('version', pa.string()),
+            ('install_store', pa.string()),
+        ])),
+        ('traffic_source', pa.struct([
+            ('source', pa.string()),
+            ('medium', pa.string()),
+            ('campaign', pa.string()),
+            ('term', pa.string()),
+            ('content', pa.string()),
+        ])),
+        ('stream_id', pa.string()),
+        ('platform', pa.string()),
+        ('ecommerce', pa.struct([
+            ('total_item_quantity', pa.int64()),
+            ('purchase_revenue', pa.float64()),
+            ('transaction_id', pa.string()),
+        ])),
+        ('items', pa.list_(item)),
+    ])
+
+
+def user_properties_to_records(properties: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert {'name': {'value': v}} into GA4 export key/value records"""
+    return [{'key': key, 'value': {'string_value': value['value']}} for key, value in properties.items()]
+
+
+class ParquetEventWriter(EventWriter):
+    """
+    Write events to Parquet with GA4 export nested types.
+
+    JSON columns are decoded into real structs and lists; each chunk becomes a
+    row group. Columns are dictionary-encoded and zstd-compressed.
+    """
+
+    NESTED_COLUMNS = ['privacy_info', 'user_ltv', 'device', 'geo', 'app_info', 'traffic_source', 'ecommerce']
+
+    def __init__(self, output_path: str, chunk_rows: int = 50000, compression_level: int = 6):
+        super().__init__(output_path, chunk_rows)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+        self.pa = pa
+        self.schema = ga4_export_schema()
+        self.writer = pq.ParquetWriter(
+            output_path, self.schema,
+            compression='zstd', compression_level=compression_level, use_dictionary=True
+        )
+
+    def write_chunk(self, chunk: pd.DataFrame):
+        pa = self.pa
+        columns = {}
+        for name in ['event_date', 'event_name', 'user_id', 'user_pseudo_id', 'stream_id', 'platform']:
+            columns[name] = chunk[name].tolist()
+        for name in ['event_timestamp', 'event_previous_timestamp', 'event_bundle_sequence_id',
+                     'event_server_timestamp_offset', 'user_first_touch_timestamp']:
+            columns[name] = chunk[name].to_numpy(dtype='int64')
+        columns['event_value_in_usd'] = pd.to_numeric(chunk['event_value_in_usd']).to_numpy(dtype=float)
+
+        # Session-level JSON repeats across a session's events, so decode each distinct string once
+        for name in self.NESTED_COLUMNS:
+            decoded = {}
+            columns[name] = [decoded[v] if v in decoded else decoded.setdefault(v, json.loads(v))
+                             for v in chunk[name].tolist()]
+        decoded = {}
+        columns['user_properties'] = [
+            decoded[v] if v in decoded else decoded.setdefault(v, user_properties_to_records(json.loads(v)))
+            for v in chunk['user_properties'].tolist()
+        ]
+        columns['event_params'] = [json.loads(v) for v in chunk['event_params'].tolist()]
+        columns['items'] = [json.loads(v) for v in chunk['items'].tolist()]
+
+        table = pa.Table.from_arrays(
+            [pa.array(columns[field.name], type=field.type, from_pandas=True) for field in self.schema],
+            schema=self.schema
+        )
+        self.writer.write_table(table)
+
+    def close(self):
+        self.writer.close()
+
+
+def block_compressor(compression: str):
+    """Function compressing one block into a complete gzip member or zstd frame"""
+    if compression == 'gzip':
+        # mtime=0 keeps output reproducible and takes zlib's one-shot path, which releases the GIL
+        return lambda block: gzip.compress(block, compresslevel=6, mtime=0)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstd compression requires zstandard: pip install zstandard") from e
+        # Compressor objects are not thread-safe, so each block gets its own
+        return lambda block: zstandard.ZstdCompressor(level=3).compress(block)
+    raise ValueError(f"Unknown compression {compression!r}")
+
+
+class BlockCompressor:
+    """
+    Compress a byte stream in fixed-size blocks on a thread pool.
+
+    Each block becomes an independent gzip member or zstd frame; concatenated,
+    they are one valid .gz / .zst file that gunzip, zstd and BigQuery read as a
+    single stream. Blocks are written in order, with at most two per thread
+    in flight.
+    """
+
+    def __init__(self, path: str, compression: str, threads: int = None, block_size: int = 4 << 20):
+        self.compress = block_compressor(compression)
+        self.block_size = block_size
+        threads = threads or os.cpu_count() or 1
+        self.max_in_flight = 2 * threads
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='ga4-compress')
+        self.in_flight = deque()
+        self.buffer: List[bytes] = []
+        self.buffered = 0
+        self.file = open(path, 'wb')
+
+    def write(self, data: bytes):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.block_size:
+            self.submit()
+
+    def submit(self):
+        block = b''.join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        self.in_flight.append(self.executor.submit(self.compress, block))
+        while len(self.in_flight) >= self.max_in_flight:
+            self.file.write(self.in_flight.popleft().result())
+
+    def close(self):
+        if self.buffered:
+            self.submit()
+        while self.in_flight:
+            self.file.write(self.in_flight.popleft().result())
+        self.executor.shutdown()
+        self.file.close()
+
+
+def json_fragments(values: pd.Series, encode=json.dumps) -> List[str]:
+    """Encoded JSON of each value, 'null' where missing; each distinct value is encoded once"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        encoded = np.array([encode(v) for v in values.cat.categories] + ['null'], dtype=object)
+        return encoded[values.cat.codes.to_numpy()].tolist()
+    cache = {}
+    return ['null' if v is None or v != v else cache[v] if v in cache else cache.setdefault(v, encode(v))
+            for v in values.tolist()]
+
+
+class NdjsonEventWriter(EventWriter):
+    """
+    Write events as newline-delimited JSON records of the BigQuery GA4 export.
+
+    Nested columns are written as real objects and arrays, not quoted
+    strings: the JSON the generator holds for them is spliced into each line
+    as-is (user_properties is rewritten into key/value records), so the files
+    load into a table with the GA4 export schema (ga4_export_schema) through a
+    JSON load job. Compressed output goes through a BlockCompressor.
+    """
+
+    JSON_COLUMNS = ['privacy_info', 'user_ltv', 'device', 'geo', 'app_info', 'traffic_source', 'ecommerce',
+                    'event_params', 'items']
+    INT_COLUMNS = ['event_timestamp', 'event_previous_timestamp', 'event_bundle_sequence_id',
+                   'event_server_timestamp_offset', 'user_first_touch_timestamp']
+
+    def __init__(self, output_path: str, chunk_rows: int = 50000, compression: str = None, threads: int = None):
+        super().__init__(output_path, chunk_rows)
+        self.file = BlockCompressor(output_path, compression, threads) if compression else open(output_path, 'wb')
+
+    def write_chunk(self, chunk: pd.DataFrame):
+        columns = []
+        for name in chunk.columns:
+            values = chunk[name]
+            if name in self.JSON_COLUMNS:
+                columns.append(json_fragments(values, encode=str))
+            elif name in self.INT_COLUMNS:
+                columns.append(values.to_numpy(dtype='int64').astype(str).tolist())
+            elif name == 'event_value_in_usd':
+                columns.append(json_fragments(pd.to_numeric(values)))
+            elif name == 'user_properties':
+                columns.append(json_fragments(
+                    values, encode=lambda v: json.dumps(user_properties_to_records(json.loads(v)))))
+            else:
+                columns.append(json_fragments(values))
+        line = '{' + ', '.join(f'"{name}": %s' for name in chunk.columns) + '}\n'
+        self.file.write(''.join([line % row for row in zip(*columns)]).encode('utf-8'))
+
+    def close(self):
+        self.file.close()
+
+
+# A finished daily partition file; the .tmp file of a day still being written never matches
+PARTITION_FILE = re.compile(r'events_(\d{8})\.(csv|ndjson|parquet)(\.gz|\.zst)?')
+
+
+def partition_date(path: str) -> Optional[str]:
+    """YYYYMMDD of a finished daily partition file (events_YYYYMMDD.csv[.gz]), None for any other file"""
+    match = PARTITION_FILE.fullmatch(os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def partition_files(directory: str, formats: Sequence[str] = ('csv', 'ndjson', 'parquet')) -> List[str]:
+    """Finished daily partition files of the given formats in a directory, in date order"""
+    matches = [PARTITION_FILE.fullmatch(name) for name in sorted(os.listdir(directory))]
+    return [os.path.join(directory, match.group(0)) for match in matches if match and match.group(2) in formats]
+
+
+class PartitionedEventWriter(EventWriter):
+    """
+    Write one events_YYYYMMDD file per event_date, like the GA4 BigQuery export.
+
+    Events arrive in timestamp order, so only the current day's file is open.
+    Each day is written to a temporary name and moved into place when it is
+    complete, so regenerating a day replaces its file atomically. With days
+    set, events for every other date are skipped and their files left alone.
+    """
+
+    def __init__(self, output_dir: str, chunk_rows: int = 50000, file_format: str = 'csv', days=None,
+                 compression: str = None):
+        super().__init__(output_dir, chunk_rows)
+        os.makedirs(output_dir, exist_ok=True)
+        self.file_format = file_format
+        self.compression = compression
+        self.days = set(days) if days else None
+        self.day = None
+        self.day_writer = None
+        self.written_days: List[str] = []
+
+    def partition_path(self, day: str) -> str:
+        suffix = COMPRESSION_SUFFIXES[self.compression] if self.compression else ''
+        return os.path.join(self.output_path, f'events_{day}.{self.file_format}{suffix}')
+
+    def write(self, events: pd.DataFrame):
+        if self.days is not None and len(events):
+            events = events[events['event_date'].isin(self.days)]
+        super().write(events)
+
+    def write_chunk(self, chunk: pd.DataFrame):
+        dates = chunk['event_date'].to_numpy()
+        boundaries = np.flatnonzero(dates[1:] != dates[:-1]) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(chunk)]):
+            day = dates[start]
+            if day != self.day:
+                self.finish_day()
+                self.day = day
+                options = {'compression': self.compression} if self.compression else {}
+                self.day_writer = WRITERS[self.file_format](self.partition_path(day) + '.tmp', self.chunk_rows, **options)
+            self.day_writer.write_chunk(chunk.iloc[start:end])
+            self.day_writer.rows += end - start
+
+    def finish_day(self):
+        """Close the current day's file and move it into place"""
+        if self.day_writer is not None:
+            self.day_writer.close()
+            os.replace(self.day_writer.output_path, self.partition_path(self.day))
+            self.written_days.append(self.day)
+            self.day_writer = None
+
+    def close(self):
+        self.finish_day()
+
+
+class BackgroundWriter:
+    """
+    Run an event writer on a dedicated thread, fed through a bounded queue.
+
+    write() hands the chunk over and returns straight away unless max_pending
+    chunks are already waiting, in which case it blocks until the writer
+    catches up, so a slow disk slows generation down instead of filling
+    memory. An error on the writer thread is raised by the next write() or by
+    close(). Summary statistics (rows, event_counts, ...) are read from the
+    wrapped writer.
+    """
+
+    def __init__(self, writer: EventWriter, max_pending: int = 4):
+        self.writer = writer
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='ga4-event-writer', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            events = self.pending.get()
+            if events is None:
+                return
+            # After an error keep draining the queue so write() never blocks forever
+            if self.error is None:
+                try:
+                    self.writer.write(events)
+                except BaseException as e:
+                    self.error = e
+
+    def write(self, events: pd.DataFrame):
+        if self.error is not None:
+            raise self.error
+        self.pending.put(events)
+
+    def close(self):
+        """Wait for queued chunks to be written, then close the wrapped writer"""
+        self.pending.put(None)
+        self.thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise self.error
+
+    def __getattr__(self, name: str):
+        return getattr(self.writer, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+WRITERS = {
+    'csv': CsvEventWriter,
+    'parquet': ParquetEventWriter,
+    'ndjson': NdjsonEventWriter,
+}
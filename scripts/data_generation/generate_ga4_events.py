@@ -2,44 +2,134 @@
 """
 GA4 Events Dataset Generator for Belle & Glow Cosmetics
 Generates realistic Google Analytics 4 events that correspond to Shopify order data.
+
+Sessions are generated in batches by a columnar engine: every session attribute
+(device, traffic source, geo, journey shape, dwell times) is drawn as a NumPy
+array for the whole batch, and event columns are assembled directly from those
+arrays rather than one event dict at a time.
+
+Generation is split into monthly shards with their own derived seeds; use
+--workers N to generate shards in parallel. Output is identical for any N.
+Events are streamed to disk in timestamp order one window of days at a time, so
+memory stays flat regardless of the number of orders. In --workers mode each
+shard becomes a sorted run on disk and the runs are k-way merged.
 """
 
 import pandas as pd
 import numpy as np
+import argparse
+import cProfile
 import json
-import random
-from datetime import datetime, timedelta
+import os
+import sys
+import tempfile
 import uuid
-from typing import Dict, List, Any
-import math
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from itertools import chain
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+from ga4_catalog import ProductCatalog
+from ga4_fragments import JsonFragmentCache, JsonTemplate, slot
+from ga4_journeys import JourneyModel
+from ga4_index import build_index
+from ga4_profiling import StageProfiler, profiled
+from ga4_random import KeyedRandom, converting_key, non_converting_key
+from ga4_writers import (COMPRESSION_SUFFIXES, WRITERS, BackgroundWriter, PartitionedEventWriter, SortedRunWriter,
+                         TimestampReorderBuffer, merge_sorted_runs)
+
+US_PER_SECOND = 1000000
+DAY_US = 86400 * US_PER_SECOND
+
+# No session's events start more than this long before midnight of its day
+# (non-converting sessions start up to 12 hours before their base date)
+SESSION_LOOKBACK_US = 13 * 3600 * US_PER_SECOND
+
+# Output column order (matches the GA4 BigQuery export field order)
+EVENT_COLUMNS = [
+    'event_date', 'event_timestamp', 'event_name', 'event_previous_timestamp',
+    'event_value_in_usd', 'event_bundle_sequence_id', 'event_server_timestamp_offset',
+    'user_id', 'user_pseudo_id', 'privacy_info', 'user_properties',
+    'user_first_touch_timestamp', 'user_ltv', 'device', 'geo', 'app_info',
+    'traffic_source', 'stream_id', 'platform', 'event_params', 'items', 'ecommerce'
+]
+
+# Event name codes used by the batch engine
+EVENT_NAMES = np.array([
+    'session_start', 'page_view', 'view_item', 'add_to_cart',
+    'begin_checkout', 'add_shipping_info', 'add_payment_info', 'purchase'
+], dtype=object)
+(SESSION_START, PAGE_VIEW, VIEW_ITEM, ADD_TO_CART,
+ BEGIN_CHECKOUT, ADD_SHIPPING_INFO, ADD_PAYMENT_INFO, PURCHASE) = range(len(EVENT_NAMES))
+
+# dbt seeds directory of this repository (override with --seeds-dir)
+SEEDS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'seeds'))
+# Generated data that dbt must not pick up as seeds (gitignored)
+DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data'))
+
+# Page-state chain for non-converting journeys (override with --journeys)
+JOURNEYS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ga4_journeys.yaml')
+
+# bq load options for appending a delta file to the loaded events table
+BQ_LOAD_OPTIONS = {
+    'csv': '--source_format=CSV --skip_leading_rows=1',
+    'ndjson': '--source_format=NEWLINE_DELIMITED_JSON',
+    'parquet': '--source_format=PARQUET',
+}
+
+HOME_PAGE_TITLE = "Belle & Glow - Premium Cosmetics"
+HOME_PAGE_LOCATION = "https://belleandglow.co.uk/"
+
 
 class GA4EventsGenerator:
-    def __init__(self):
-        self.set_random_seed()
-        
-        # Load Shopify data
+    def __init__(self, batch_size: int = 2000, seed: int = 42, trace_memory: bool = False,
+                 order_ids: List[int] = None, seeds_dir: str = SEEDS_DIR, scale: float = 1.0,
+                 start: str = None, end: str = None, journeys_path: str = JOURNEYS_PATH):
+        self.profiler = StageProfiler(trace_memory)
+        self.set_random_seed(seed)
+
+        # Load Shopify data (only the given orders and their line items, if set)
+        self.seeds_dir = seeds_dir
+        self.shopify_dir = os.path.join(seeds_dir, 'shopify')
+        self.order_ids = order_ids
         self.load_shopify_data()
-        
+
+        # Scale factor (synthesized orders) and date window (YYYY-MM-DD, inclusive)
+        self.scale = scale
+        if scale != 1:
+            self.orders = self.scale_orders(self.orders, scale)
+        self.start = pd.Timestamp(start) if start is not None else None
+        self.end = pd.Timestamp(end) if end is not None else None
+        # Events kept by a window run: event_timestamp in [window_us[0], window_us[1])
+        self.window_us = None
+        if start is not None or end is not None:
+            self.window_us = (
+                np.datetime64(self.start.normalize(), 'us').astype(np.int64) if start is not None else np.iinfo(np.int64).min,
+                np.datetime64(self.end.normalize() + pd.Timedelta(days=1), 'us').astype(np.int64)
+                if end is not None else np.iinfo(np.int64).max,
+            )
+
         # Initialize GA4 configuration
         self.stream_id = "2468013579"
         self.platform = "web"
-        
+        self.batch_size = batch_size
+
         # Traffic source distributions
         self.traffic_sources = {
             'organic': 0.40,
-            'direct': 0.25, 
+            'direct': 0.25,
             'social': 0.20,
             'email': 0.10,
             'paid': 0.05
         }
-        
+
         # Device distributions
         self.device_categories = {
             'mobile': 0.65,
             'desktop': 0.30,
             'tablet': 0.05
         }
-        
+
         # User journey patterns
         self.journey_patterns = {
             'converters': 0.30,
@@ -47,47 +137,328 @@ class GA4EventsGenerator:
             'browsers': 0.35,
             'bouncers': 0.15
         }
-        
+
+        # Markov-chain journeys for the non-converting sessions
+        self.journeys_path = journeys_path
+        self.journeys = JourneyModel.from_yaml(journeys_path, EVENT_NAMES)
+
         # UK Geographic data
         self.uk_locations = self.get_uk_locations()
-        
+
         # Mobile device data
         self.mobile_devices = self.get_mobile_devices()
-        
+
         # Page types for GA4
         self.page_types = [
-            'home', 'category', 'product', 'cart', 'checkout', 
+            'home', 'category', 'product', 'cart', 'checkout',
             'account', 'about', 'contact', 'blog'
         ]
-        
-        # Initialize storage
-        self.events = []
-        self.user_sessions = {}
-        
-    def set_random_seed(self):
-        """Set random seed for reproducibility"""
-        random.seed(42)
-        np.random.seed(42)
-        
+
+        # Columnar lookup tables used by the batch engine
+        self.build_lookup_tables()
+
+    def set_random_seed(self, seed: int = 42):
+        """Set random seed for reproducibility; every draw is keyed by (seed, session key)"""
+        self.seed = seed
+        self.random = KeyedRandom(seed)
+
+    def worker_options(self) -> Dict[str, Any]:
+        """Constructor arguments that recreate this generator in a worker process"""
+        return {
+            'batch_size': self.batch_size, 'seed': self.seed, 'trace_memory': self.profiler.trace_memory,
+            'seeds_dir': self.seeds_dir, 'scale': self.scale, 'start': self.start, 'end': self.end,
+            'journeys_path': self.journeys_path,
+        }
+
+    @profiled('load_shopify_data')
     def load_shopify_data(self):
         """Load Shopify CSV data"""
         try:
-            self.orders = pd.read_csv('/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds/shopify/order.csv')
-            self.customers = pd.read_csv('/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds/shopify/customer.csv') 
-            self.products = pd.read_csv('/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds/shopify/product.csv')
-            self.order_lines = pd.read_csv('/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds/shopify/order_line.csv')
-            self.product_variants = pd.read_csv('/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds/shopify/product_variant.csv')
-            
+            if self.order_ids is None:
+                self.orders = pd.read_csv(os.path.join(self.shopify_dir, 'order.csv'))
+                self.order_lines = pd.read_csv(os.path.join(self.shopify_dir, 'order_line.csv'))
+            else:
+                self.orders = read_csv_rows(os.path.join(self.shopify_dir, 'order.csv'), 'id', self.order_ids)
+                self.order_lines = read_csv_rows(os.path.join(self.shopify_dir, 'order_line.csv'), 'order_id', self.order_ids)
+            self.customers = pd.read_csv(os.path.join(self.shopify_dir, 'customer.csv'))
+            self.products = pd.read_csv(os.path.join(self.shopify_dir, 'product.csv'))
+            self.product_variants = pd.read_csv(os.path.join(self.shopify_dir, 'product_variant.csv'))
+
             # Convert datetime columns
             self.orders['created_at'] = pd.to_datetime(self.orders['created_at'])
+
+            # order.csv reuses some ids for later orders; number the rows sharing an id
+            # in file order so each one keys its own session (see converting_key)
+            self.orders['occurrence'] = self.orders.groupby('id').cumcount()
+            repeated = int((self.orders['occurrence'] > 0).sum())
+            if repeated:
+                print(f"Note: {repeated} orders reuse an earlier order id; each gets its own session")
             self.customers['created_at'] = pd.to_datetime(self.customers['created_at'])
-            
+
             print(f"Loaded {len(self.orders)} orders, {len(self.customers)} customers, {len(self.products)} products")
-            
+
         except Exception as e:
             print(f"Error loading Shopify data: {e}")
             raise
-            
+
+    @profiled('scale_orders')
+    def scale_orders(self, orders: pd.DataFrame, scale: float) -> pd.DataFrame:
+        """
+        Synthesize the orders of a scaled dataset.
+
+        Every order is copied int(scale) times, plus once more with probability
+        equal to the fractional part (keyed by order id). Copy r of an order gets
+        id + r * stride, a keyed time within two hours of the original on the
+        same day, and the original's line items (via source_order_id). Copy 0 is
+        the order itself, so its sessions match the unscaled dataset.
+        """
+        ids = orders['id'].to_numpy()
+        occurrence = orders['occurrence'].to_numpy()
+        copies = int(scale) + (self.random.random('scale_copies', converting_key(ids, occurrence)) < scale - int(scale))
+        positions = np.repeat(np.arange(len(orders)), copies)
+        copy_index = np.arange(len(positions)) - np.repeat(np.cumsum(copies) - copies, copies)
+        stride = 10 ** len(str(int(ids.max())))
+
+        scaled = orders.iloc[positions].reset_index(drop=True)
+        scaled['source_order_id'] = ids[positions]
+        scaled['id'] = ids[positions] + copy_index * stride
+
+        copy = copy_index > 0
+        created_us = scaled['created_at'].to_numpy(dtype='datetime64[us]').astype(np.int64)
+        day_start = created_us[copy] // DAY_US * DAY_US
+        copy_keys = converting_key(scaled['id'].to_numpy()[copy], scaled['occurrence'].to_numpy()[copy])
+        shift = self.random.integers('scale_time', copy_keys, -7200, 7201)
+        created_us[copy] = np.clip(created_us[copy] + shift * US_PER_SECOND, day_start, day_start + DAY_US - US_PER_SECOND)
+        scaled['created_at'] = pd.to_datetime(created_us.astype('datetime64[us]'))
+
+        print(f"Scaled {len(orders)} orders to {len(scaled)} (scale {scale:g})")
+        return scaled
+
+    @profiled('build_lookup_tables')
+    def build_lookup_tables(self):
+        """Build the array lookups the batch engine indexes into"""
+        # Products: contiguous arrays addressed by catalog position
+        self.catalog = ProductCatalog(self.products, self.product_variants)
+
+        # Customers
+        self.customer_emails = self.customers['email'].tolist()
+        self.customer_ltv = dict(zip(self.customers['id'].astype(int), self.customers['total_spent'].astype(float)))
+
+        # Device and traffic-source option lists (indexed by drawn codes)
+        self.desktop_browsers = ['Chrome', 'Safari', 'Firefox', 'Edge']
+        self.desktop_operating_systems = ['macOS', 'Windows']
+        self.organic_sources = ['google', 'bing', 'yahoo']
+        self.organic_terms = ['makeup', 'skincare', 'cosmetics', 'beauty', 'foundation', 'lipstick']
+        self.social_platforms = ['facebook', 'instagram', 'tiktok', 'pinterest']
+        self.email_campaigns = ['newsletter', 'promo', 'welcome', 'cart_abandonment']
+        self.paid_terms = ['buy makeup', 'cosmetics online', 'skincare products']
+        self.shipping_tiers = ['standard', 'express', 'next_day']
+        self.payment_types = ['credit_card', 'debit_card', 'paypal', 'apple_pay']
+
+        # Number of options for the two pre-drawn choices of each traffic source type
+        self.traffic_choice_counts = {
+            'organic': (len(self.organic_sources), len(self.organic_terms)),
+            'direct': (1, 1),
+            'social': (len(self.social_platforms), 1),
+            'email': (len(self.email_campaigns), 1),
+            'paid': (1, len(self.paid_terms)),
+        }
+
+        # Order lines indexed by order id
+        self.build_order_line_index()
+
+        # Serialized JSON fragments and templates, built once per distinct variant
+        self.fragments = JsonFragmentCache()
+        self.privacy_info_json = self.fragments.intern('privacy_info', self.generate_privacy_info)
+        self.app_info_json = self.fragments.intern(
+            'app_info', lambda: {'id': 'belleandglow.co.uk', 'version': '1.0.0', 'install_store': None}
+        )
+        self.build_event_param_templates()
+        self.build_event_categories()
+
+        # event_date keys for a contiguous range of days (see event_dates)
+        self.day_keys = np.empty(0, dtype=object)
+        self.day_keys_first = 0
+
+    def build_event_param_templates(self):
+        """
+        Serialize the event_params and items JSON shapes once.
+
+        Home and product page views, view_item and the funnel events each have
+        a fixed set of params; only numbers and ids are spliced in per event.
+        Per-product templates are built on first use (see page_view_template),
+        so a large catalog costs nothing for products no session views.
+        """
+        fragments = self.fragments
+        currency = {'key': 'currency', 'value': {'string_value': 'GBP'}}
+        value = {'key': 'value', 'value': {'double_value': slot('value')}}
+        coupon = {'key': 'coupon', 'value': {'string_value': ''}}
+
+        # Serialized traffic sources whose page views carry a Google referrer
+        self.google_traffic_sources = set()
+        for source_type, (count_a, count_b) in self.traffic_choice_counts.items():
+            for a in range(count_a):
+                for b in range(count_b):
+                    source = self.generate_traffic_source(source_type, a, b)
+                    if source['source'] == 'google':
+                        self.google_traffic_sources.add(
+                            fragments.intern(('traffic_source', source_type, a, b), lambda: source)
+                        )
+
+        self.session_start_templates = [
+            JsonTemplate([
+                {'key': 'session_id', 'value': {'string_value': slot('session_id')}},
+                {'key': 'engaged_session_event', 'value': {'int_value': engaged}}
+            ])
+            for engaged in (0, 1)
+        ]
+
+        self.value_params = [currency, value]
+        self.add_to_cart_template = JsonTemplate([currency, value])
+        self.begin_checkout_template = JsonTemplate([currency, value, coupon])
+        self.add_shipping_info_templates = [
+            JsonTemplate([currency, value, {'key': 'shipping_tier', 'value': {'string_value': tier}}, coupon])
+            for tier in self.shipping_tiers
+        ]
+        self.add_payment_info_templates = [
+            JsonTemplate([currency, value, {'key': 'payment_type', 'value': {'string_value': payment}}, coupon])
+            for payment in self.payment_types
+        ]
+        self.purchase_template = JsonTemplate([
+            currency,
+            value,
+            {'key': 'transaction_id', 'value': {'string_value': slot('transaction_id')}},
+            {'key': 'tax', 'value': {'double_value': slot('tax')}},
+            {'key': 'shipping', 'value': {'double_value': 0.0}},
+            coupon
+        ])
+
+    def page_view_template(self, from_google: bool, product_pos: int) -> JsonTemplate:
+        """page_view params for a product page, or the home page for product_pos -1"""
+        def build():
+            if product_pos < 0:
+                page_title, page_location = HOME_PAGE_TITLE, HOME_PAGE_LOCATION
+            else:
+                page_title = f"{self.catalog.titles[product_pos]} - Belle & Glow"
+                page_location = f"https://belleandglow.co.uk/products/{self.catalog.handles[product_pos]}"
+            return [
+                {'key': 'page_title', 'value': {'string_value': page_title}},
+                {'key': 'page_location', 'value': {'string_value': page_location}},
+                {'key': 'page_referrer', 'value': {'string_value': 'https://www.google.com/' if from_google else ''}},
+                {'key': 'ga_session_id', 'value': {'int_value': slot('ga_session_id')}},
+                {'key': 'ga_session_number', 'value': {'int_value': slot('ga_session_number')}},
+                {'key': 'engaged_session_event', 'value': {'int_value': 1}}
+            ]
+        return self.fragments.template(('page_view', from_google, product_pos), build)
+
+    def view_item_template(self, product_pos: int) -> JsonTemplate:
+        """view_item params, which depend on the product's type"""
+        product_type = self.catalog.types[product_pos]
+        return self.fragments.template(('view_item', product_type), lambda: self.value_params + [
+            {'key': 'item_list_id', 'value': {'string_value': product_type.lower()}},
+            {'key': 'item_list_name', 'value': {'string_value': product_type}}
+        ])
+
+    def view_item_items_template(self, product_pos: int) -> JsonTemplate:
+        """view_item items[] with the product's price as a slot"""
+        return self.fragments.template(('view_item_items', product_pos),
+                                       lambda: [json.loads(self.item_json(product_pos, slot('price'), 1))])
+
+    def build_event_categories(self):
+        """
+        Categorical dtypes for the event columns drawn from a fixed set of values.
+
+        Events carry one- or two-byte codes for these columns instead of object
+        pointers. Every batch shares the same dtypes, so concatenating, sorting
+        and pickling batches keeps the codes; writers materialize the values.
+        """
+        fragments = self.fragments
+
+        # Traffic sources: one category per (source type, choice a, choice b)
+        traffic = []
+        offsets = []
+        for source_type in self.traffic_sources:
+            offsets.append(len(traffic))
+            count_a, count_b = self.traffic_choice_counts[source_type]
+            traffic += [fragments.intern(('traffic_source', source_type, a, b),
+                                         lambda: self.generate_traffic_source(source_type, a, b))
+                        for a in range(count_a) for b in range(count_b)]
+        self.traffic_code_offsets = np.array(offsets)
+        self.traffic_choice_table = np.array([self.traffic_choice_counts[t] for t in self.traffic_sources])
+        self.google_traffic_codes = np.array([t in self.google_traffic_sources for t in traffic], dtype=bool)
+
+        # User LTV: customers with the same lifetime value share a category
+        ltv = {cid: fragments.intern(('user_ltv', cid), lambda: self.generate_user_ltv(cid))
+               for cid in [None] + list(self.customer_ltv)}
+        ltv_categories = list(dict.fromkeys(ltv.values()))
+        ltv_position = {fragment: i for i, fragment in enumerate(ltv_categories)}
+        self.user_ltv_codes = {cid: ltv_position[fragment] for cid, fragment in ltv.items()}
+
+        geo = [fragments.intern(('geo', g), lambda: self.uk_locations[g]) for g in range(len(self.uk_locations))]
+
+        self.event_categories = {
+            name: pd.CategoricalDtype(categories)
+            for name, categories in [
+                ('event_name', EVENT_NAMES),
+                ('privacy_info', [self.privacy_info_json]),
+                ('user_ltv', ltv_categories),
+                ('geo', geo),
+                ('app_info', [self.app_info_json]),
+                ('traffic_source', traffic),
+                ('stream_id', [self.stream_id]),
+                ('platform', [self.platform]),
+                ('ecommerce', ['{}']),
+            ]
+        }
+
+    def categorical(self, column: str, codes: np.ndarray) -> pd.Categorical:
+        """Event column from category codes"""
+        return pd.Categorical.from_codes(codes, dtype=self.event_categories[column])
+
+    def event_dates(self, event_ts: np.ndarray) -> np.ndarray:
+        """
+        event_date (YYYYMMDD) of each microsecond timestamp.
+
+        Dates come from a table of day keys indexed by day number. The table
+        is widened whenever a batch falls outside it, so each date is
+        formatted once per run instead of once per event.
+        """
+        days = event_ts // DAY_US
+        if not len(days):
+            return self.day_keys[:0]
+        first, last = int(days.min()), int(days.max())
+        table_end = self.day_keys_first + len(self.day_keys)
+        if first < self.day_keys_first or last >= table_end:
+            if len(self.day_keys):
+                first, last = min(first, self.day_keys_first), max(last, table_end - 1)
+            self.day_keys_first = first
+            self.day_keys = pd.date_range(pd.Timestamp(first, unit='D'), periods=last - first + 1) \
+                .strftime('%Y%m%d').to_numpy(dtype=object)
+        return self.day_keys[days - self.day_keys_first]
+
+    def build_order_line_index(self):
+        """
+        Index order_line.csv by order id once at load time.
+
+        Lines are sorted by order id into contiguous arrays, so an order's lines
+        are the slice found by two binary searches. Each line's items[] entry is
+        serialized here once and reused by every event that carries it.
+        """
+        lines = self.order_lines.sort_values('order_id', kind='stable')
+        product_pos = self.catalog.positions(lines['product_id'].to_numpy())
+        price = lines['price'].to_numpy(dtype=float)
+        quantity = lines['quantity'].to_numpy(dtype=np.int64)
+        self.order_line_index = {
+            'order_id': lines['order_id'].to_numpy(),
+            'product_pos': product_pos,
+            'price': price,
+            'quantity': quantity,
+            'item_json': [
+                self.item_json(p, pr, q, name)
+                for p, pr, q, name in zip(product_pos.tolist(), price.tolist(), quantity.tolist(), lines['name'].tolist())
+            ],
+        }
+
     def get_uk_locations(self) -> List[Dict]:
         """Return UK geographic locations"""
         return [
@@ -103,7 +474,7 @@ class GA4EventsGenerator:
             {'continent': 'Europe', 'country': 'United Kingdom', 'region': 'Wales', 'city': 'Cardiff'},
             {'continent': 'Europe', 'country': 'United Kingdom', 'region': 'Northern Ireland', 'city': 'Belfast'},
         ]
-        
+
     def get_mobile_devices(self) -> List[Dict]:
         """Return mobile device configurations"""
         return [
@@ -115,46 +486,39 @@ class GA4EventsGenerator:
             {'mobile_brand_name': 'Google', 'mobile_model_name': 'Pixel 6'},
             {'mobile_brand_name': 'OnePlus', 'mobile_model_name': 'OnePlus 9'},
         ]
-        
-    def generate_user_pseudo_id(self) -> str:
-        """Generate GA4 user pseudo ID"""
-        return f"{random.randint(1000000000, 9999999999)}.{random.randint(1000000000, 9999999999)}"
-        
-    def generate_event_timestamp(self, base_time: datetime) -> int:
-        """Convert datetime to GA4 timestamp (microseconds since epoch)"""
-        return int(base_time.timestamp() * 1000000)
-        
-    def generate_device_info(self, category: str) -> Dict:
-        """Generate device information"""
+
+    def generate_device_info(self, category: str, mobile_idx: int = 0, browser_idx: int = 0,
+                             os_idx: int = 0, vendor_id: str = None, advertising_id: str = None) -> Dict:
+        """Generate device information from pre-drawn option codes"""
         if category == 'mobile':
-            device = random.choice(self.mobile_devices)
+            device = self.mobile_devices[mobile_idx]
+            is_apple = device['mobile_brand_name'] == 'Apple'
             return {
                 'category': 'mobile',
                 'mobile_brand_name': device['mobile_brand_name'],
                 'mobile_model_name': device['mobile_model_name'],
                 'mobile_marketing_name': device['mobile_model_name'],
                 'mobile_os_hardware_model': device['mobile_model_name'],
-                'operating_system': 'iOS' if device['mobile_brand_name'] == 'Apple' else 'Android',
-                'operating_system_version': '15.0' if device['mobile_brand_name'] == 'Apple' else '12.0',
-                'vendor_id': str(uuid.uuid4())[:8],
-                'advertising_id': str(uuid.uuid4()),
+                'operating_system': 'iOS' if is_apple else 'Android',
+                'operating_system_version': '15.0' if is_apple else '12.0',
+                'vendor_id': vendor_id,
+                'advertising_id': advertising_id,
                 'language': 'en-gb',
                 'is_limited_ad_tracking': 'false',
                 'time_zone_offset_seconds': 0,
-                'browser': 'Safari' if device['mobile_brand_name'] == 'Apple' else 'Chrome',
-                'browser_version': '15.0' if device['mobile_brand_name'] == 'Apple' else '96.0',
+                'browser': 'Safari' if is_apple else 'Chrome',
+                'browser_version': '15.0' if is_apple else '96.0',
                 'web_info': {
-                    'browser': 'Safari' if device['mobile_brand_name'] == 'Apple' else 'Chrome',
-                    'browser_version': '15.0' if device['mobile_brand_name'] == 'Apple' else '96.0',
+                    'browser': 'Safari' if is_apple else 'Chrome',
+                    'browser_version': '15.0' if is_apple else '96.0',
                     'hostname': 'belleandglow.co.uk'
                 }
             }
         elif category == 'desktop':
-            browsers = ['Chrome', 'Safari', 'Firefox', 'Edge']
-            browser = random.choice(browsers)
+            browser = self.desktop_browsers[browser_idx]
             return {
                 'category': 'desktop',
-                'operating_system': 'Windows' if browser == 'Edge' else random.choice(['macOS', 'Windows']),
+                'operating_system': 'Windows' if browser == 'Edge' else self.desktop_operating_systems[os_idx],
                 'operating_system_version': '10.15.7' if browser == 'Safari' else '10.0.19042',
                 'language': 'en-gb',
                 'time_zone_offset_seconds': 0,
@@ -183,17 +547,15 @@ class GA4EventsGenerator:
                     'hostname': 'belleandglow.co.uk'
                 }
             }
-            
-    def generate_traffic_source(self, source_type: str) -> Dict:
-        """Generate traffic source information"""
+
+    def generate_traffic_source(self, source_type: str, choice_a: int = 0, choice_b: int = 0) -> Dict:
+        """Generate traffic source information from pre-drawn option indices"""
         if source_type == 'organic':
-            sources = ['google', 'bing', 'yahoo']
-            source = random.choice(sources)
             return {
-                'source': source,
+                'source': self.organic_sources[choice_a],
                 'medium': 'organic',
                 'campaign': '(not set)',
-                'term': random.choice(['makeup', 'skincare', 'cosmetics', 'beauty', 'foundation', 'lipstick'])
+                'term': self.organic_terms[choice_b]
             }
         elif source_type == 'direct':
             return {
@@ -203,8 +565,7 @@ class GA4EventsGenerator:
                 'term': '(not set)'
             }
         elif source_type == 'social':
-            platforms = ['facebook', 'instagram', 'tiktok', 'pinterest']
-            platform = random.choice(platforms)
+            platform = self.social_platforms[choice_a]
             return {
                 'source': platform,
                 'medium': 'social',
@@ -212,8 +573,7 @@ class GA4EventsGenerator:
                 'content': 'post'
             }
         elif source_type == 'email':
-            campaigns = ['newsletter', 'promo', 'welcome', 'cart_abandonment']
-            campaign = random.choice(campaigns)
+            campaign = self.email_campaigns[choice_a]
             return {
                 'source': 'email',
                 'medium': 'email',
@@ -225,10 +585,10 @@ class GA4EventsGenerator:
                 'source': 'google',
                 'medium': 'cpc',
                 'campaign': 'beauty_products',
-                'term': random.choice(['buy makeup', 'cosmetics online', 'skincare products']),
+                'term': self.paid_terms[choice_b],
                 'content': 'ad_group_1'
             }
-            
+
     def generate_privacy_info(self) -> Dict:
         """Generate privacy information"""
         return {
@@ -236,773 +596,1077 @@ class GA4EventsGenerator:
             'ads_storage': 'denied',
             'uses_transient_token': 'false'
         }
-        
-    def generate_user_properties(self, customer_email: str = None) -> Dict:
+
+    def generate_user_properties(self, first_open_time: int, customer_email: str = None) -> Dict:
         """Generate user properties"""
         props = {
-            'first_open_time': {'value': str(random.randint(1640995200, 1658361600))}  # 2022 range
+            'first_open_time': {'value': str(first_open_time)}
         }
-        
+
         if customer_email:
             props['customer_email'] = {'value': customer_email}
             props['customer_status'] = {'value': 'registered'}
         else:
             props['customer_status'] = {'value': 'guest'}
-            
+
         return props
-        
-    def generate_user_ltv(self, customer_id: str = None) -> Dict:
+
+    def generate_user_ltv(self, customer_id: int = None) -> Dict:
         """Generate user lifetime value"""
-        if customer_id:
-            customer_data = self.customers[self.customers['id'] == int(customer_id)]
-            if not customer_data.empty:
-                total_spent = float(customer_data.iloc[0]['total_spent'])
-                return {
-                    'revenue': total_spent,
-                    'currency': 'GBP'
-                }
-        
+        revenue = self.customer_ltv.get(customer_id, 0.0) if customer_id is not None else 0.0
         return {
-            'revenue': 0.0,
+            'revenue': revenue,
             'currency': 'GBP'
         }
-        
-    def generate_session_for_order(self, order_row: pd.Series) -> List[Dict]:
-        """Generate a complete GA4 session that leads to a purchase"""
-        session_events = []
-        session_start_time = order_row['created_at'] - timedelta(minutes=random.randint(5, 45))
-        
-        # Get customer info
-        customer_email = order_row['email'] if pd.notna(order_row['email']) else None
-        customer_id = str(order_row['customer_id']) if pd.notna(order_row['customer_id']) else None
-        
-        # Generate user identifiers
-        user_pseudo_id = self.generate_user_pseudo_id()
-        user_id = customer_email if customer_email else None
-        
-        # Generate session characteristics
-        device_category = np.random.choice(
-            list(self.device_categories.keys()),
-            p=list(self.device_categories.values())
-        )
-        traffic_source_type = np.random.choice(
-            list(self.traffic_sources.keys()),
-            p=list(self.traffic_sources.values())
-        )
-        
-        device_info = self.generate_device_info(device_category)
-        traffic_source = self.generate_traffic_source(traffic_source_type)
-        geo_info = random.choice(self.uk_locations)
-        privacy_info = self.generate_privacy_info()
-        user_properties = self.generate_user_properties(customer_email)
-        user_ltv = self.generate_user_ltv(customer_id)
-        
-        # Session start event
-        session_start_timestamp = self.generate_event_timestamp(session_start_time)
-        session_events.append(self.create_event(
-            event_name='session_start',
-            event_timestamp=session_start_timestamp,
-            user_id=user_id,
-            user_pseudo_id=user_pseudo_id,
-            device_info=device_info,
-            geo_info=geo_info,
-            traffic_source=traffic_source,
-            privacy_info=privacy_info,
-            user_properties=user_properties,
-            user_ltv=user_ltv,
-            event_params=[
-                {'key': 'session_id', 'value': {'string_value': str(random.randint(1000000000, 9999999999))}},
-                {'key': 'engaged_session_event', 'value': {'int_value': 1}}
-            ]
-        ))
-        
-        current_time = session_start_time
-        
-        # Home page view
-        current_time += timedelta(seconds=random.randint(1, 3))
-        session_events.append(self.create_page_view_event(
-            current_time, user_id, user_pseudo_id, device_info, geo_info, 
-            traffic_source, privacy_info, user_properties, user_ltv,
-            page_title="Belle & Glow - Premium Cosmetics",
-            page_location="https://belleandglow.co.uk/"
-        ))
-        
-        # Browse products (2-5 product views)
-        order_line_items = self.order_lines[self.order_lines['order_id'] == order_row['id']]
-        products_in_order = order_line_items['product_id'].unique()
-        
-        # View some products (including ones that will be purchased)
-        products_to_view = list(products_in_order) + random.sample(
-            [p for p in self.products['id'].tolist() if p not in products_in_order], 
-            random.randint(1, 3)
-        )
-        random.shuffle(products_to_view)
-        
-        for product_id in products_to_view[:random.randint(2, 5)]:
-            current_time += timedelta(seconds=random.randint(10, 60))
-            product_info = self.products[self.products['id'] == product_id].iloc[0]
-            
-            # Product page view
-            session_events.append(self.create_page_view_event(
-                current_time, user_id, user_pseudo_id, device_info, geo_info,
-                traffic_source, privacy_info, user_properties, user_ltv,
-                page_title=f"{product_info['title']} - Belle & Glow",
-                page_location=f"https://belleandglow.co.uk/products/{product_info['handle']}"
-            ))
-            
-            # View item event
-            current_time += timedelta(seconds=random.randint(2, 10))
-            session_events.append(self.create_view_item_event(
-                current_time, user_id, user_pseudo_id, device_info, geo_info,
-                traffic_source, privacy_info, user_properties, user_ltv,
-                product_info
-            ))
-        
-        # Add items to cart
-        current_time += timedelta(seconds=random.randint(5, 30))
-        for _, line_item in order_line_items.iterrows():
-            product_info = self.products[self.products['id'] == line_item['product_id']].iloc[0]
-            session_events.append(self.create_add_to_cart_event(
-                current_time, user_id, user_pseudo_id, device_info, geo_info,
-                traffic_source, privacy_info, user_properties, user_ltv,
-                line_item, product_info
+
+    @profiled('draw_session_attributes')
+    def draw_session_attributes(self, keys: np.ndarray, user_ids: List[str], customer_ids: List[int]) -> Dict[str, Any]:
+        """Draw per-session attributes for a batch of sessions (one key each) as arrays"""
+        random = self.random
+        n = len(keys)
+
+        device_codes = random.choice('device_category', keys, list(self.device_categories.values()))
+        mobile_idx = random.integers('mobile_device', keys, 0, len(self.mobile_devices))
+        browser_idx = random.integers('desktop_browser', keys, 0, len(self.desktop_browsers))
+        os_idx = random.integers('desktop_os', keys, 0, len(self.desktop_operating_systems))
+        id_bytes = random.bits('device_ids', keys[:, None], np.arange(4)).view(np.uint8).reshape(n, 32)
+
+        traffic_codes = random.choice('traffic_source', keys, list(self.traffic_sources.values()))
+        traffic_u = random.random('traffic_choice', keys[:, None], np.arange(2))
+        geo_idx = random.integers('geo', keys, 0, len(self.uk_locations))
+
+        pseudo_a = random.integers('user_pseudo_id', keys, 1000000000, 10000000000, counter=0)
+        pseudo_b = random.integers('user_pseudo_id', keys, 1000000000, 10000000000, counter=1)
+        first_open = random.integers('first_open_time', keys, 1640995200, 1658361601)  # 2022 range
+        session_ids = random.integers('session_id', keys, 1000000000, 10000000000)
+
+        device_names = list(self.device_categories.keys())
+        fragments = self.fragments
+
+        devices = []
+        for category, m, b, o, ids in zip(device_codes.tolist(), mobile_idx.tolist(), browser_idx.tolist(),
+                                          os_idx.tolist(), id_bytes):
+            category = device_names[category]
+            if category == 'mobile':
+                # Only the device ids change between mobile sessions on the same model
+                template = fragments.template(('device', category, m), lambda: self.generate_device_info(
+                    category, m, vendor_id=slot('vendor_id'), advertising_id=slot('advertising_id')
+                ))
+                vendor_id = str(uuid.UUID(bytes=ids[:16].tobytes(), version=4))[:8]
+                advertising_id = str(uuid.UUID(bytes=ids[16:].tobytes(), version=4))
+                devices.append(template.render(f'"{vendor_id}"', f'"{advertising_id}"'))
+            elif category == 'desktop':
+                devices.append(fragments.intern(('device', category, b, o),
+                                                lambda: self.generate_device_info(category, browser_idx=b, os_idx=o)))
+            else:
+                devices.append(fragments.intern(('device', category), lambda: self.generate_device_info(category)))
+
+        # Traffic source category: offset of the source type plus the two choices
+        choice_counts = self.traffic_choice_table[traffic_codes]
+        choice_a = (traffic_u[:, 0] * choice_counts[:, 0]).astype(np.int64)
+        choice_b = (traffic_u[:, 1] * choice_counts[:, 1]).astype(np.int64)
+        traffic = self.traffic_code_offsets[traffic_codes] + choice_a * choice_counts[:, 1] + choice_b
+
+        user_properties = []
+        for fo, email in zip(first_open.tolist(), user_ids):
+            template = fragments.template(('user_properties', email), lambda: self.generate_user_properties(
+                slot('first_open_time'), email
             ))
-            current_time += timedelta(seconds=random.randint(1, 5))
-        
-        # Begin checkout
-        current_time += timedelta(seconds=random.randint(10, 120))
-        session_events.append(self.create_begin_checkout_event(
-            current_time, user_id, user_pseudo_id, device_info, geo_info,
-            traffic_source, privacy_info, user_properties, user_ltv,
-            order_row, order_line_items
-        ))
-        
-        # Add shipping info
-        current_time += timedelta(seconds=random.randint(30, 180))
-        session_events.append(self.create_add_shipping_info_event(
-            current_time, user_id, user_pseudo_id, device_info, geo_info,
-            traffic_source, privacy_info, user_properties, user_ltv,
-            order_row, order_line_items
-        ))
-        
-        # Add payment info
-        current_time += timedelta(seconds=random.randint(30, 120))
-        session_events.append(self.create_add_payment_info_event(
-            current_time, user_id, user_pseudo_id, device_info, geo_info,
-            traffic_source, privacy_info, user_properties, user_ltv,
-            order_row, order_line_items
-        ))
-        
-        # Purchase event (use original order time)
-        purchase_time = order_row['created_at']
-        session_events.append(self.create_purchase_event(
-            purchase_time, user_id, user_pseudo_id, device_info, geo_info,
-            traffic_source, privacy_info, user_properties, user_ltv,
-            order_row, order_line_items
-        ))
-        
-        return session_events
-        
-    def create_event(self, event_name: str, event_timestamp: int, user_id: str, 
-                    user_pseudo_id: str, device_info: Dict, geo_info: Dict,
-                    traffic_source: Dict, privacy_info: Dict, user_properties: Dict,
-                    user_ltv: Dict, event_params: List[Dict] = None, 
-                    items: List[Dict] = None, event_value: float = None) -> Dict:
-        """Create a GA4 event with all required fields"""
-        
-        event_date = datetime.fromtimestamp(event_timestamp / 1000000).strftime('%Y%m%d')
-        
-        event = {
-            'event_date': event_date,
-            'event_timestamp': str(event_timestamp),
-            'event_name': event_name,
-            'event_previous_timestamp': str(event_timestamp - random.randint(1000000, 10000000)),
-            'event_value_in_usd': str(event_value) if event_value else None,
-            'event_bundle_sequence_id': str(random.randint(1, 1000)),
-            'event_server_timestamp_offset': str(random.randint(-1000000, 1000000)),
-            'user_id': user_id,
-            'user_pseudo_id': user_pseudo_id,
-            'privacy_info': json.dumps(privacy_info),
-            'user_properties': json.dumps(user_properties),
-            'user_first_touch_timestamp': str(event_timestamp - random.randint(86400000000, 31536000000000)),  # 1 day to 1 year ago
-            'user_ltv': json.dumps(user_ltv),
-            'device': json.dumps(device_info),
-            'geo': json.dumps(geo_info),
-            'app_info': json.dumps({'id': 'belleandglow.co.uk', 'version': '1.0.0', 'install_store': None}),
-            'traffic_source': json.dumps(traffic_source),
-            'stream_id': self.stream_id,
-            'platform': self.platform,
-            'event_params': json.dumps(event_params) if event_params else json.dumps([]),
-            'items': json.dumps(items) if items else json.dumps([]),
-            'ecommerce': json.dumps({}) if items else json.dumps({})
+            user_properties.append(template.render(f'"{fo}"'))
+
+        # traffic_source, geo and user_ltv are category codes (see build_event_categories)
+        no_ltv = self.user_ltv_codes[None]
+        return {
+            'user_id': user_ids,
+            'user_pseudo_id': [f"{a}.{b}" for a, b in zip(pseudo_a.tolist(), pseudo_b.tolist())],
+            'device': devices,
+            'traffic_source': traffic,
+            'is_google': self.google_traffic_codes[traffic],
+            'geo': geo_idx,
+            'user_properties': user_properties,
+            'user_ltv': np.array([self.user_ltv_codes.get(cid, no_ltv) for cid in customer_ids], dtype=np.int64),
+            'session_id': session_ids,
+            'key': keys,
         }
-        
-        return event
-        
-    def create_page_view_event(self, timestamp: datetime, user_id: str, user_pseudo_id: str,
-                              device_info: Dict, geo_info: Dict, traffic_source: Dict,
-                              privacy_info: Dict, user_properties: Dict, user_ltv: Dict,
-                              page_title: str, page_location: str) -> Dict:
-        """Create a page_view event"""
-        event_timestamp = self.generate_event_timestamp(timestamp)
-        
-        event_params = [
-            {'key': 'page_title', 'value': {'string_value': page_title}},
-            {'key': 'page_location', 'value': {'string_value': page_location}},
-            {'key': 'page_referrer', 'value': {'string_value': 'https://www.google.com/' if traffic_source.get('source') == 'google' else ''}},
-            {'key': 'ga_session_id', 'value': {'int_value': random.randint(1000000000, 9999999999)}},
-            {'key': 'ga_session_number', 'value': {'int_value': random.randint(1, 10)}},
-            {'key': 'engaged_session_event', 'value': {'int_value': 1}}
-        ]
-        
-        return self.create_event(
-            event_name='page_view',
-            event_timestamp=event_timestamp,
-            user_id=user_id,
-            user_pseudo_id=user_pseudo_id,
-            device_info=device_info,
-            geo_info=geo_info,
-            traffic_source=traffic_source,
-            privacy_info=privacy_info,
-            user_properties=user_properties,
-            user_ltv=user_ltv,
-            event_params=event_params
-        )
-        
-    def create_view_item_event(self, timestamp: datetime, user_id: str, user_pseudo_id: str,
-                              device_info: Dict, geo_info: Dict, traffic_source: Dict,
-                              privacy_info: Dict, user_properties: Dict, user_ltv: Dict,
-                              product_info: pd.Series) -> Dict:
-        """Create a view_item event"""
-        event_timestamp = self.generate_event_timestamp(timestamp)
-        
-        # Get product variant info
-        variant_info = self.product_variants[self.product_variants['product_id'] == product_info['id']]
-        if not variant_info.empty:
-            variant = variant_info.iloc[0]
-            price = float(variant['price'])
-        else:
-            price = random.uniform(10, 50)  # Fallback price
-            
-        items = [{
-            'item_id': str(product_info['id']),
-            'item_name': product_info['title'],
-            'item_category': product_info['product_type'],
-            'item_brand': 'Belle & Glow',
-            'price': price,
-            'currency': 'GBP',
-            'quantity': 1
-        }]
-        
-        event_params = [
-            {'key': 'currency', 'value': {'string_value': 'GBP'}},
-            {'key': 'value', 'value': {'double_value': price}},
-            {'key': 'item_list_id', 'value': {'string_value': product_info['product_type'].lower()}},
-            {'key': 'item_list_name', 'value': {'string_value': product_info['product_type']}}
-        ]
-        
-        return self.create_event(
-            event_name='view_item',
-            event_timestamp=event_timestamp,
-            user_id=user_id,
-            user_pseudo_id=user_pseudo_id,
-            device_info=device_info,
-            geo_info=geo_info,
-            traffic_source=traffic_source,
-            privacy_info=privacy_info,
-            user_properties=user_properties,
-            user_ltv=user_ltv,
-            event_params=event_params,
-            items=items,
-            event_value=price
-        )
-        
-    def create_add_to_cart_event(self, timestamp: datetime, user_id: str, user_pseudo_id: str,
-                                device_info: Dict, geo_info: Dict, traffic_source: Dict,
-                                privacy_info: Dict, user_properties: Dict, user_ltv: Dict,
-                                line_item: pd.Series, product_info: pd.Series) -> Dict:
-        """Create an add_to_cart event"""
-        event_timestamp = self.generate_event_timestamp(timestamp)
-        
-        price = float(line_item['price'])
-        quantity = int(line_item['quantity'])
-        value = price * quantity
-        
-        items = [{
-            'item_id': str(product_info['id']),
-            'item_name': product_info['title'],
-            'item_category': product_info['product_type'],
-            'item_variant': line_item['name'],
+
+    def item_json(self, product_pos: int, price: float, quantity: int, variant: str = None) -> str:
+        """Serialize one GA4 items[] entry"""
+        item = {
+            'item_id': str(self.catalog.ids[product_pos]),
+            'item_name': self.catalog.titles[product_pos],
+            'item_category': self.catalog.types[product_pos],
+        }
+        if variant is not None:
+            item['item_variant'] = variant
+        item.update({
             'item_brand': 'Belle & Glow',
             'price': price,
             'currency': 'GBP',
             'quantity': quantity
-        }]
-        
-        event_params = [
-            {'key': 'currency', 'value': {'string_value': 'GBP'}},
-            {'key': 'value', 'value': {'double_value': value}}
-        ]
-        
-        return self.create_event(
-            event_name='add_to_cart',
-            event_timestamp=event_timestamp,
-            user_id=user_id,
-            user_pseudo_id=user_pseudo_id,
-            device_info=device_info,
-            geo_info=geo_info,
-            traffic_source=traffic_source,
-            privacy_info=privacy_info,
-            user_properties=user_properties,
-            user_ltv=user_ltv,
-            event_params=event_params,
-            items=items,
-            event_value=value
-        )
-        
-    def create_begin_checkout_event(self, timestamp: datetime, user_id: str, user_pseudo_id: str,
-                                   device_info: Dict, geo_info: Dict, traffic_source: Dict,
-                                   privacy_info: Dict, user_properties: Dict, user_ltv: Dict,
-                                   order_row: pd.Series, order_line_items: pd.DataFrame) -> Dict:
-        """Create a begin_checkout event"""
-        event_timestamp = self.generate_event_timestamp(timestamp)
-        
-        items = []
-        total_value = 0
-        
-        for _, line_item in order_line_items.iterrows():
-            product_info = self.products[self.products['id'] == line_item['product_id']].iloc[0]
-            price = float(line_item['price'])
-            quantity = int(line_item['quantity'])
-            value = price * quantity
-            total_value += value
-            
-            items.append({
-                'item_id': str(product_info['id']),
-                'item_name': product_info['title'],
-                'item_category': product_info['product_type'],
-                'item_variant': line_item['name'],
-                'item_brand': 'Belle & Glow',
-                'price': price,
-                'currency': 'GBP',
-                'quantity': quantity
-            })
-        
-        event_params = [
-            {'key': 'currency', 'value': {'string_value': 'GBP'}},
-            {'key': 'value', 'value': {'double_value': total_value}},
-            {'key': 'coupon', 'value': {'string_value': ''}}
-        ]
-        
-        return self.create_event(
-            event_name='begin_checkout',
-            event_timestamp=event_timestamp,
-            user_id=user_id,
-            user_pseudo_id=user_pseudo_id,
-            device_info=device_info,
-            geo_info=geo_info,
-            traffic_source=traffic_source,
-            privacy_info=privacy_info,
-            user_properties=user_properties,
-            user_ltv=user_ltv,
-            event_params=event_params,
-            items=items,
-            event_value=total_value
-        )
-        
-    def create_add_shipping_info_event(self, timestamp: datetime, user_id: str, user_pseudo_id: str,
-                                      device_info: Dict, geo_info: Dict, traffic_source: Dict,
-                                      privacy_info: Dict, user_properties: Dict, user_ltv: Dict,
-                                      order_row: pd.Series, order_line_items: pd.DataFrame) -> Dict:
-        """Create an add_shipping_info event"""
-        event_timestamp = self.generate_event_timestamp(timestamp)
-        
-        items = []
-        total_value = 0
-        
-        for _, line_item in order_line_items.iterrows():
-            product_info = self.products[self.products['id'] == line_item['product_id']].iloc[0]
-            price = float(line_item['price'])
-            quantity = int(line_item['quantity'])
-            value = price * quantity
-            total_value += value
-            
-            items.append({
-                'item_id': str(product_info['id']),
-                'item_name': product_info['title'],
-                'item_category': product_info['product_type'],
-                'item_variant': line_item['name'],
-                'item_brand': 'Belle & Glow',
-                'price': price,
-                'currency': 'GBP',
-                'quantity': quantity
-            })
-        
-        shipping_tiers = ['standard', 'express', 'next_day']
-        shipping_tier = random.choice(shipping_tiers)
-        
-        event_params = [
-            {'key': 'currency', 'value': {'string_value': 'GBP'}},
-            {'key': 'value', 'value': {'double_value': total_value}},
-            {'key': 'shipping_tier', 'value': {'string_value': shipping_tier}},
-            {'key': 'coupon', 'value': {'string_value': ''}}
-        ]
-        
-        return self.create_event(
-            event_name='add_shipping_info',
-            event_timestamp=event_timestamp,
-            user_id=user_id,
-            user_pseudo_id=user_pseudo_id,
-            device_info=device_info,
-            geo_info=geo_info,
-            traffic_source=traffic_source,
-            privacy_info=privacy_info,
-            user_properties=user_properties,
-            user_ltv=user_ltv,
-            event_params=event_params,
-            items=items,
-            event_value=total_value
-        )
-        
-    def create_add_payment_info_event(self, timestamp: datetime, user_id: str, user_pseudo_id: str,
-                                     device_info: Dict, geo_info: Dict, traffic_source: Dict,
-                                     privacy_info: Dict, user_properties: Dict, user_ltv: Dict,
-                                     order_row: pd.Series, order_line_items: pd.DataFrame) -> Dict:
-        """Create an add_payment_info event"""
-        event_timestamp = self.generate_event_timestamp(timestamp)
-        
-        items = []
-        total_value = 0
-        
-        for _, line_item in order_line_items.iterrows():
-            product_info = self.products[self.products['id'] == line_item['product_id']].iloc[0]
-            price = float(line_item['price'])
-            quantity = int(line_item['quantity'])
-            value = price * quantity
-            total_value += value
-            
-            items.append({
-                'item_id': str(product_info['id']),
-                'item_name': product_info['title'],
-                'item_category': product_info['product_type'],
-                'item_variant': line_item['name'],
-                'item_brand': 'Belle & Glow',
-                'price': price,
-                'currency': 'GBP',
-                'quantity': quantity
-            })
-        
-        payment_types = ['credit_card', 'debit_card', 'paypal', 'apple_pay']
-        payment_type = random.choice(payment_types)
-        
-        event_params = [
-            {'key': 'currency', 'value': {'string_value': 'GBP'}},
-            {'key': 'value', 'value': {'double_value': total_value}},
-            {'key': 'payment_type', 'value': {'string_value': payment_type}},
-            {'key': 'coupon', 'value': {'string_value': ''}}
-        ]
-        
-        return self.create_event(
-            event_name='add_payment_info',
-            event_timestamp=event_timestamp,
-            user_id=user_id,
-            user_pseudo_id=user_pseudo_id,
-            device_info=device_info,
-            geo_info=geo_info,
-            traffic_source=traffic_source,
-            privacy_info=privacy_info,
-            user_properties=user_properties,
-            user_ltv=user_ltv,
-            event_params=event_params,
-            items=items,
-            event_value=total_value
-        )
-        
-    def create_purchase_event(self, timestamp: datetime, user_id: str, user_pseudo_id: str,
-                             device_info: Dict, geo_info: Dict, traffic_source: Dict,
-                             privacy_info: Dict, user_properties: Dict, user_ltv: Dict,
-                             order_row: pd.Series, order_line_items: pd.DataFrame) -> Dict:
-        """Create a purchase event"""
-        event_timestamp = self.generate_event_timestamp(timestamp)
-        
-        items = []
-        
-        for _, line_item in order_line_items.iterrows():
-            product_info = self.products[self.products['id'] == line_item['product_id']].iloc[0]
-            price = float(line_item['price'])
-            quantity = int(line_item['quantity'])
-            
-            items.append({
-                'item_id': str(product_info['id']),
-                'item_name': product_info['title'],
-                'item_category': product_info['product_type'],
-                'item_variant': line_item['name'],
-                'item_brand': 'Belle & Glow',
-                'price': price,
-                'currency': 'GBP',
-                'quantity': quantity
-            })
-        
-        total_value = float(order_row['total_price'])
-        
-        event_params = [
-            {'key': 'currency', 'value': {'string_value': 'GBP'}},
-            {'key': 'value', 'value': {'double_value': total_value}},
-            {'key': 'transaction_id', 'value': {'string_value': str(order_row['id'])}},
-            {'key': 'tax', 'value': {'double_value': float(order_row['total_tax'])}},
-            {'key': 'shipping', 'value': {'double_value': 0.0}},
-            {'key': 'coupon', 'value': {'string_value': ''}}
+        })
+        return json.dumps(item)
+
+    def funnel_events(self, n_views: np.ndarray, viewed: np.ndarray, line_first: np.ndarray,
+                      n_lines: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Lay out the events of a batch of converting sessions.
+
+        Every converting session follows the same shape: session_start, home
+        page_view, n_views x (product page_view, view_item), n_lines x
+        add_to_cart, then begin_checkout/add_shipping_info/add_payment_info/purchase.
+        """
+        n_sessions = len(n_views)
+        counts = 6 + 2 * n_views + n_lines
+        total = int(counts.sum())
+
+        # Position of each event within its session
+        sess = np.repeat(np.arange(n_sessions), counts)
+        pos = np.arange(total) - (np.cumsum(counts) - counts)[sess]
+        cart_start = 2 + 2 * n_views[sess]
+        tail_start = cart_start + n_lines[sess]
+
+        code = np.empty(total, dtype=np.int8)
+        code[pos == 0] = SESSION_START
+        code[pos == 1] = PAGE_VIEW
+        browsing = (pos >= 2) & (pos < cart_start)
+        code[browsing] = np.where((pos[browsing] - 2) % 2 == 0, PAGE_VIEW, VIEW_ITEM)
+        carting = (pos >= cart_start) & (pos < tail_start)
+        code[carting] = ADD_TO_CART
+        tail = pos >= tail_start
+        code[tail] = BEGIN_CHECKOUT + (pos[tail] - tail_start[tail])
+
+        # Catalog position of the viewed product and the cart line of each event
+        view_first = np.cumsum(n_views) - n_views
+        product_ref = np.full(total, -1, dtype=np.int64)
+        product_ref[browsing] = viewed[view_first[sess[browsing]] + (pos[browsing] - 2) // 2]
+        line_ref = np.full(total, -1, dtype=np.int64)
+        line_ref[carting] = line_first[sess[carting]] + (pos[carting] - cart_start[carting])
+
+        # Dwell time range (seconds) before each event
+        lo = np.zeros(total, dtype=np.int64)
+        hi = np.zeros(total, dtype=np.int64)
+        home = pos == 1
+        lo[home], hi[home] = 1, 3
+        product_page = browsing & (code == PAGE_VIEW)
+        lo[product_page], hi[product_page] = 10, 60
+        view_item = code == VIEW_ITEM
+        lo[view_item], hi[view_item] = 2, 10
+        first_cart = carting & (pos == cart_start)
+        lo[first_cart], hi[first_cart] = 5, 30
+        later_cart = carting & (pos > cart_start)
+        lo[later_cart], hi[later_cart] = 1, 5
+        lo[code == BEGIN_CHECKOUT], hi[code == BEGIN_CHECKOUT] = 10, 120
+        lo[code == ADD_SHIPPING_INFO], hi[code == ADD_SHIPPING_INFO] = 30, 180
+        lo[code == ADD_PAYMENT_INFO], hi[code == ADD_PAYMENT_INFO] = 30, 120
+
+        return {'sess': sess, 'code': code, 'product_ref': product_ref, 'line_ref': line_ref,
+                'dwell_min': lo, 'dwell_max': hi}
+
+    @profiled('assemble_events')
+    def assemble_events(self, attrs: Dict[str, Any], start_us: np.ndarray, engaged: np.ndarray,
+                        events: Dict[str, np.ndarray], lines: Dict[str, np.ndarray],
+                        purchase: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """
+        Materialize the laid-out events of a batch of sessions.
+
+        events holds per-event arrays grouped by session, starting with each
+        session's session_start: 'sess', 'code', 'product_ref' (catalog
+        position), 'line_ref' (index into lines) and the 'dwell_min' /
+        'dwell_max' seconds before the event.
+        """
+        random = self.random
+        n_sessions = len(start_us)
+        sess = events['sess']
+        code = events['code']
+        product_ref = events['product_ref']
+        line_ref = events['line_ref']
+        total = len(code)
+        counts = np.bincount(sess, minlength=n_sessions)
+        first = np.cumsum(counts) - counts
+        pos = np.arange(total) - first[sess]
+        # Per-event draws are keyed by the session key and the event's position in it
+        event_keys = attrs['key'][sess]
+        view_item = code == VIEW_ITEM
+        carting = code == ADD_TO_CART
+        tail = code >= BEGIN_CHECKOUT
+
+        # Dwell time (seconds) before each event, then a per-session running sum
+        dwell = random.integers('dwell', event_keys, events['dwell_min'], events['dwell_max'] + 1, counter=pos)
+        # The last item added to the cart lingers before checkout starts
+        after_cart = np.zeros(total, dtype=bool)
+        after_cart[1:] = (code[:-1] == ADD_TO_CART) & (code[1:] == BEGIN_CHECKOUT)
+        dwell[after_cart] += random.integers('checkout_delay', event_keys[after_cart], 1, 6)
+
+        elapsed = np.cumsum(dwell)
+        elapsed -= np.repeat(elapsed[first] - dwell[first], counts)
+        event_ts = start_us[sess] + elapsed * US_PER_SECOND
+        is_purchase = code == PURCHASE
+        event_ts[is_purchase] = purchase['created_us'][sess[is_purchase]]
+
+        # Event values
+        line_value = lines['price'] * lines['quantity']
+        fallback_price = random.uniform('fallback_price', event_keys, 10, 50, counter=pos)
+        value = np.zeros(total)
+        value[view_item] = self.catalog.prices[product_ref[view_item]]
+        missing_price = view_item & np.isnan(value)
+        value[missing_price] = fallback_price[missing_price]
+        value[carting] = line_value[line_ref[carting]]
+        funnel = tail & ~is_purchase
+        value[funnel] = purchase['order_value'][sess[funnel]]
+        value[is_purchase] = purchase['total_price'][sess[is_purchase]]
+
+        # Per-event random params
+        ga_session_ids = random.integers('ga_session_id', event_keys, 1000000000, 10000000000, counter=pos).tolist()
+        ga_session_numbers = random.integers('ga_session_number', event_keys, 1, 11, counter=pos).tolist()
+        shipping_tier = random.integers('shipping_tier', event_keys, 0, len(self.shipping_tiers), counter=pos).tolist()
+        payment_type = random.integers('payment_type', event_keys, 0, len(self.payment_types), counter=pos).tolist()
+
+        event_params = [None] * total
+        items = ['[]'] * total
+        sess_list = sess.tolist()
+        code_list = code.tolist()
+        product_list = product_ref.tolist()
+        line_list = line_ref.tolist()
+        value_list = value.tolist()
+        session_ids = attrs['session_id'].tolist()
+        engaged_list = engaged.tolist()
+        is_google = attrs['is_google'].tolist()
+        line_item_json = lines['item_json']
+        order_items = purchase['items']
+        order_ids = purchase['order_id'].tolist()
+        total_tax = purchase['total_tax'].tolist()
+
+        # Numbers are spliced into the templates as str(x), which matches json.dumps
+        for e in range(total):
+            s = sess_list[e]
+            c = code_list[e]
+            if c == SESSION_START:
+                params = self.session_start_templates[engaged_list[s]].render(f'"{session_ids[s]}"')
+            elif c == PAGE_VIEW:
+                template = self.page_view_template(is_google[s], product_list[e])
+                params = template.render(ga_session_ids[e], ga_session_numbers[e])
+            elif c == VIEW_ITEM:
+                p = product_list[e]
+                price = value_list[e]
+                items[e] = self.view_item_items_template(p).render(price)
+                params = self.view_item_template(p).render(price)
+            elif c == ADD_TO_CART:
+                items[e] = '[' + line_item_json[line_list[e]] + ']'
+                params = self.add_to_cart_template.render(value_list[e])
+            else:
+                items[e] = order_items[s]
+                if c == BEGIN_CHECKOUT:
+                    params = self.begin_checkout_template.render(value_list[e])
+                elif c == ADD_SHIPPING_INFO:
+                    params = self.add_shipping_info_templates[shipping_tier[e]].render(value_list[e])
+                elif c == ADD_PAYMENT_INFO:
+                    params = self.add_payment_info_templates[payment_type[e]].render(value_list[e])
+                else:
+                    params = self.purchase_template.render(value_list[e], f'"{order_ids[s]}"', total_tax[s])
+            event_params[e] = params
+
+        self.profiler.count('sessions', n_sessions)
+        for name, n in zip(EVENT_NAMES, np.bincount(code, minlength=len(EVENT_NAMES)).tolist()):
+            self.profiler.count(f'events.{name}', n)
+
+        def per_event(column: List[Any]) -> List[Any]:
+            return [column[s] for s in sess_list]
+
+        constant = np.zeros(total, dtype=np.int8)
+
+        return pd.DataFrame({
+            'event_date': self.event_dates(event_ts),
+            'event_timestamp': event_ts,
+            'event_name': self.categorical('event_name', code),
+            'event_previous_timestamp': event_ts - random.integers('previous_offset', event_keys, 1000000, 10000001, counter=pos),
+            'event_value_in_usd': [str(x) if x else None for x in value_list],
+            'event_bundle_sequence_id': random.integers('bundle_sequence_id', event_keys, 1, 1001, counter=pos),
+            'event_server_timestamp_offset': random.integers('server_offset', event_keys, -1000000, 1000001, counter=pos),
+            'user_id': per_event(attrs['user_id']),
+            'user_pseudo_id': per_event(attrs['user_pseudo_id']),
+            'privacy_info': self.categorical('privacy_info', constant),
+            'user_properties': per_event(attrs['user_properties']),
+            'user_first_touch_timestamp': event_ts - random.integers(  # 1 day to 1 year ago
+                'first_touch_offset', event_keys, 86400000000, 31536000000001, counter=pos),
+            'user_ltv': self.categorical('user_ltv', attrs['user_ltv'][sess]),
+            'device': per_event(attrs['device']),
+            'geo': self.categorical('geo', attrs['geo'][sess]),
+            'app_info': self.categorical('app_info', constant),
+            'traffic_source': self.categorical('traffic_source', attrs['traffic_source'][sess]),
+            'stream_id': self.categorical('stream_id', constant),
+            'platform': self.categorical('platform', constant),
+            'event_params': event_params,
+            'items': items,
+            'ecommerce': self.categorical('ecommerce', constant),
+        }, columns=EVENT_COLUMNS)
+
+    @profiled('converting_sessions')
+    def generate_converting_batch(self, orders: pd.DataFrame) -> pd.DataFrame:
+        """Generate complete GA4 sessions that lead to a purchase, one per order row (keyed by order id and occurrence)"""
+        random = self.random
+        n = len(orders)
+        order_ids = orders['id'].to_numpy()
+        keys = converting_key(order_ids, orders['occurrence'].to_numpy())
+        created_us = orders['created_at'].to_numpy(dtype='datetime64[us]').astype(np.int64)
+        start_us = created_us - random.integers('session_lead', keys, 5, 46) * 60 * US_PER_SECOND
+
+        # Get customer info
+        user_ids = [e if isinstance(e, str) else None for e in orders['email'].tolist()]
+        customer_ids = [None if pd.isna(c) else int(c) for c in orders['customer_id'].tolist()]
+        attrs = self.draw_session_attributes(keys, user_ids, customer_ids)
+
+        # Line items for each order, looked up in the order-lines index (synthesized
+        # orders share the line items of the order they were copied from)
+        line_order_ids = orders.get('source_order_id', orders['id']).to_numpy()
+        line_first = np.searchsorted(self.order_line_index['order_id'], line_order_ids, side='left')
+        n_lines = np.searchsorted(self.order_line_index['order_id'], line_order_ids, side='right') - line_first
+        lines = self.order_line_index
+
+        # The items payload is shared by all four funnel events of an order
+        line_item_json = lines['item_json']
+        order_items = [
+            '[' + ', '.join(line_item_json[lf:lf + nl]) + ']'
+            for lf, nl in zip(line_first.tolist(), n_lines.tolist())
         ]
-        
-        return self.create_event(
-            event_name='purchase',
-            event_timestamp=event_timestamp,
-            user_id=user_id,
-            user_pseudo_id=user_pseudo_id,
-            device_info=device_info,
-            geo_info=geo_info,
-            traffic_source=traffic_source,
-            privacy_info=privacy_info,
-            user_properties=user_properties,
-            user_ltv=user_ltv,
-            event_params=event_params,
-            items=items,
-            event_value=total_value
+
+        # Browse products, including the ones that will be purchased: the distinct ordered
+        # products plus 1-3 others, in a keyed random order, cut to 2-5 views
+        n_extra = random.integers('n_extra_views', keys, 1, 4)
+        n_to_view = random.integers('n_views', keys, 2, 6)
+        line_sess = np.repeat(np.arange(n), n_lines)
+        line_index = np.repeat(line_first - (np.cumsum(n_lines) - n_lines), n_lines) + np.arange(len(line_sess))
+        line_pos = lines['product_pos'][line_index]
+        order_value = np.bincount(line_sess, weights=(lines['price'] * lines['quantity'])[line_index], minlength=n)
+        by_session = np.lexsort((line_pos, line_sess))
+        line_sess, line_pos = line_sess[by_session], line_pos[by_session]
+        distinct = np.ones(len(line_sess), dtype=bool)
+        distinct[1:] = (line_sess[1:] != line_sess[:-1]) | (line_pos[1:] != line_pos[:-1])
+        in_order, in_order_sess = line_pos[distinct], line_sess[distinct]
+        n_in_order = np.bincount(in_order_sess, minlength=n)
+        extras, n_extras = self.catalog.sample_excluding(random, 'extra_products', keys, n_extra, in_order, n_in_order)
+
+        to_view = np.concatenate([in_order, extras])
+        to_view_sess = np.concatenate([in_order_sess, np.repeat(np.arange(n), n_extras)])
+        view_rank = random.random('view_order', keys[to_view_sess], counter=to_view)
+        view_order = np.lexsort((view_rank, to_view_sess))
+        to_view, to_view_sess = to_view[view_order], to_view_sess[view_order]
+        n_candidates = np.bincount(to_view_sess, minlength=n)
+        rank_in_session = np.arange(len(to_view)) - np.repeat(np.cumsum(n_candidates) - n_candidates, n_candidates)
+        shown = rank_in_session < n_to_view[to_view_sess]
+        viewed = to_view[shown]
+        n_views = np.bincount(to_view_sess[shown], minlength=n)
+
+        return self.assemble_events(
+            attrs, start_us,
+            engaged=np.ones(n, dtype=np.int64),
+            events=self.funnel_events(n_views, viewed, line_first, n_lines),
+            lines=lines,
+            purchase={
+                'created_us': created_us,
+                'order_id': order_ids,
+                'order_value': order_value,
+                'total_price': orders['total_price'].to_numpy(dtype=float),
+                'total_tax': orders['total_tax'].to_numpy(dtype=float),
+                'items': order_items,
+            }
         )
-        
-    def generate_non_converting_session(self, base_date: datetime, journey_type: str) -> List[Dict]:
-        """Generate non-converting sessions (browsers, cart abandoners, bouncers)"""
-        session_events = []
-        
+
+    @profiled('non_converting_sessions')
+    def generate_non_converting_batch(self, base_us: np.ndarray, keys: np.ndarray) -> pd.DataFrame:
+        """Generate non-converting sessions (browsers, cart abandoners, bouncers), one per key"""
+        random = self.random
+        n = len(base_us)
+
         # Random session start time around the base date
-        session_start_time = base_date + timedelta(
-            hours=random.randint(-12, 12),
-            minutes=random.randint(0, 59)
-        )
-        
-        # Generate user identifiers (mostly anonymous)
-        user_pseudo_id = self.generate_user_pseudo_id()
-        user_id = None  # Most non-converting users are anonymous
-        
-        # Occasionally assign a known customer for returning visitors
-        if random.random() < 0.1:  # 10% chance
-            customer = self.customers.sample(1).iloc[0]
-            user_id = customer['email']
-        
-        # Generate session characteristics
-        device_category = np.random.choice(
-            list(self.device_categories.keys()),
-            p=list(self.device_categories.values())
-        )
-        traffic_source_type = np.random.choice(
-            list(self.traffic_sources.keys()),
-            p=list(self.traffic_sources.values())
+        start_us = base_us + (random.integers('start_hour', keys, -12, 13) * 3600
+                              + random.integers('start_minute', keys, 0, 60) * 60) * US_PER_SECOND
+
+        # Most non-converting users are anonymous; 10% are returning customers
+        returning = random.random('returning', keys) < 0.1
+        customer_pick = random.integers('customer', keys, 0, len(self.customer_emails))
+        user_ids = [self.customer_emails[c] if r else None for r, c in zip(returning.tolist(), customer_pick.tolist())]
+        attrs = self.draw_session_attributes(keys, user_ids, [None] * n)
+
+        # Walk each session's journey through the page-state chain
+        events = self.journeys.simulate(random, keys, len(self.catalog))
+        code = events['code']
+        counts = np.bincount(events['sess'], minlength=n)
+
+        # Each add_to_cart is a mock line item for the product being viewed
+        carting = np.flatnonzero(code == ADD_TO_CART)
+        cart_sess = events['sess'][carting]
+        n_lines = np.bincount(cart_sess, minlength=n)
+        line_first = np.cumsum(n_lines) - n_lines
+        events['line_ref'] = np.full(len(code), -1, dtype=np.int64)
+        events['line_ref'][carting] = np.arange(len(carting))
+        mock_products = events['product_ref'][carting]
+        mock_prices = random.uniform('mock_price', keys[cart_sess], 10, 50,
+                                     counter=np.arange(len(carting)) - line_first[cart_sess])
+        lines = {
+            'product_pos': mock_products,
+            'price': mock_prices,
+            'quantity': np.ones(len(carting), dtype=np.int64),
+            'item_json': [self.item_json(p, price, 1, 'Default')
+                          for p, price in zip(mock_products.tolist(), mock_prices.tolist())],
+        }
+
+        # Sessions that leave after the landing page are not engaged
+        return self.assemble_events(
+            attrs, start_us,
+            engaged=(counts > 2).astype(np.int64),
+            events=events,
+            lines=lines,
+            purchase={
+                'created_us': np.zeros(n, dtype=np.int64),
+                'order_id': np.zeros(n, dtype=np.int64),
+                'order_value': np.zeros(n),
+                'total_price': np.zeros(n),
+                'total_tax': np.zeros(n),
+                'items': [None] * n,
+            }
         )
-        
-        device_info = self.generate_device_info(device_category)
-        traffic_source = self.generate_traffic_source(traffic_source_type)
-        geo_info = random.choice(self.uk_locations)
-        privacy_info = self.generate_privacy_info()
-        user_properties = self.generate_user_properties(user_id)
-        user_ltv = self.generate_user_ltv()
-        
-        # Session start event
-        session_start_timestamp = self.generate_event_timestamp(session_start_time)
-        session_events.append(self.create_event(
-            event_name='session_start',
-            event_timestamp=session_start_timestamp,
-            user_id=user_id,
-            user_pseudo_id=user_pseudo_id,
-            device_info=device_info,
-            geo_info=geo_info,
-            traffic_source=traffic_source,
-            privacy_info=privacy_info,
-            user_properties=user_properties,
-            user_ltv=user_ltv,
-            event_params=[
-                {'key': 'session_id', 'value': {'string_value': str(random.randint(1000000000, 9999999999))}},
-                {'key': 'engaged_session_event', 'value': {'int_value': 1 if journey_type != 'bouncers' else 0}}
-            ]
-        ))
-        
-        current_time = session_start_time
-        
-        if journey_type == 'bouncers':
-            # Just home page view and exit
-            current_time += timedelta(seconds=random.randint(1, 3))
-            session_events.append(self.create_page_view_event(
-                current_time, user_id, user_pseudo_id, device_info, geo_info,
-                traffic_source, privacy_info, user_properties, user_ltv,
-                page_title="Belle & Glow - Premium Cosmetics",
-                page_location="https://belleandglow.co.uk/"
-            ))
-            
-        elif journey_type == 'browsers':
-            # Home page + some product views (simplified for speed)
-            current_time += timedelta(seconds=random.randint(1, 3))
-            session_events.append(self.create_page_view_event(
-                current_time, user_id, user_pseudo_id, device_info, geo_info,
-                traffic_source, privacy_info, user_properties, user_ltv,
-                page_title="Belle & Glow - Premium Cosmetics",
-                page_location="https://belleandglow.co.uk/"
-            ))
-            
-            # View 1-2 products only (reduced for speed)
-            num_products = random.randint(1, 2)
-            for i in range(num_products):
-                product_info = self.products.sample(1).iloc[0]
-                current_time += timedelta(seconds=random.randint(10, 60))
-                
-                # Product page view
-                session_events.append(self.create_page_view_event(
-                    current_time, user_id, user_pseudo_id, device_info, geo_info,
-                    traffic_source, privacy_info, user_properties, user_ltv,
-                    page_title=f"{product_info['title']} - Belle & Glow",
-                    page_location=f"https://belleandglow.co.uk/products/{product_info['handle']}"
-                ))
-                
-                # View item event
-                current_time += timedelta(seconds=random.randint(2, 15))
-                session_events.append(self.create_view_item_event(
-                    current_time, user_id, user_pseudo_id, device_info, geo_info,
-                    traffic_source, privacy_info, user_properties, user_ltv,
-                    product_info
-                ))
-                
-        elif journey_type == 'cart_abandoners':
-            # Simplified cart abandonment flow
-            current_time += timedelta(seconds=random.randint(1, 3))
-            session_events.append(self.create_page_view_event(
-                current_time, user_id, user_pseudo_id, device_info, geo_info,
-                traffic_source, privacy_info, user_properties, user_ltv,
-                page_title="Belle & Glow - Premium Cosmetics",
-                page_location="https://belleandglow.co.uk/"
-            ))
-            
-            # Add only 1 product to cart (simplified)
-            product_info = self.products.sample(1).iloc[0]
-            current_time += timedelta(seconds=random.randint(10, 60))
-            
-            # Product page view
-            session_events.append(self.create_page_view_event(
-                current_time, user_id, user_pseudo_id, device_info, geo_info,
-                traffic_source, privacy_info, user_properties, user_ltv,
-                page_title=f"{product_info['title']} - Belle & Glow",
-                page_location=f"https://belleandglow.co.uk/products/{product_info['handle']}"
-            ))
-            
-            # View item event
-            current_time += timedelta(seconds=random.randint(2, 15))
-            session_events.append(self.create_view_item_event(
-                current_time, user_id, user_pseudo_id, device_info, geo_info,
-                traffic_source, privacy_info, user_properties, user_ltv,
-                product_info
-            ))
-            
-            # Add to cart event
-            current_time += timedelta(seconds=random.randint(5, 30))
-            
-            # Create simple mock line item
-            mock_line_item = pd.Series({
-                'product_id': product_info['id'],
-                'name': 'Default',
-                'price': random.uniform(10, 50),
-                'quantity': 1
-            })
-            
-            session_events.append(self.create_add_to_cart_event(
-                current_time, user_id, user_pseudo_id, device_info, geo_info,
-                traffic_source, privacy_info, user_properties, user_ltv,
-                mock_line_item, product_info
-            ))
-        
-        return session_events
-        
-    def generate_dataset(self) -> pd.DataFrame:
-        """Generate the complete GA4 events dataset"""
+
+    def plan_shards(self) -> List[Dict[str, Any]]:
+        """
+        Split orders and the non-converting session budget into monthly shards.
+
+        Shards depend only on the order data, never on the worker count, and
+        every session draws from its own keyed streams, so the merged output is
+        identical however many processes generate them.
+
+        With a start/end window, only sessions that can have events in the
+        window are kept: a session's events fall within a day either side of
+        its order or base day (iter_shard_windows then drops the events dated
+        outside it). Days are still numbered from the first order, so those
+        sessions are identical to the same sessions in a full run.
+        """
+        created = self.orders['created_at']
+        self.min_date = created.min()
+        self.min_us = np.datetime64(self.min_date.to_datetime64(), 'us').astype(np.int64)
+        n_days = (created.max() - self.min_date).days + 1
+        self.n_days = n_days
+
+        # Non-converting sessions (2x the orders), spread evenly over the date range
+        self.n_non_converting = len(self.orders) * 2
+        day_offsets = np.arange(n_days)
+        day_counts = spread_evenly(self.n_non_converting, n_days)
+
+        order_months = created.to_numpy(dtype='datetime64[us]').astype('datetime64[M]')
+        day_months = (self.min_us + day_offsets * DAY_US).astype('datetime64[us]').astype('datetime64[M]')
+
+        base_days, base_keys = non_converting_sessions(day_offsets, day_counts)
+        base_months = day_months[base_days]
+
+        first_date = self.min_date.normalize()
+        first_day = (self.start - first_date).days - 1 if self.start is not None else 0
+        last_day = (self.end - first_date).days + 1 if self.end is not None else n_days - 1
+        order_days = (created.dt.normalize() - first_date).dt.days.to_numpy()
+        order_kept = (order_days >= first_day) & (order_days <= last_day)
+        base_kept = (base_days >= first_day) & (base_days <= last_day)
+
+        shards = []
+        for index, month in enumerate(np.union1d(order_months, day_months)):
+            in_month = (base_months == month) & base_kept
+            shard = {
+                'index': index,
+                'month': str(month),
+                'order_positions': np.flatnonzero((order_months == month) & order_kept),
+                'base_days': base_days[in_month],
+                'base_keys': base_keys[in_month],
+            }
+            if len(shard['order_positions']) or len(shard['base_days']):
+                shards.append(shard)
+        return shards
+
+    def iter_shard_windows(self, shard: Dict[str, Any]) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """
+        Yield (last_day, events) for consecutive windows of a shard, in day order.
+
+        A window covers whole calendar days and holds about batch_size sessions.
+        With a start/end window, events dated outside it are dropped, so every
+        day written is complete and identical to the same day in a full run.
+        """
+        orders = self.orders.iloc[shard['order_positions']]
+        base_us = self.min_us + shard['base_days'] * DAY_US
+        windows = self.iter_session_windows(orders, base_us, shard['base_keys'], f"Shard {shard['month']}")
+        if self.window_us is None:
+            yield from windows
+            return
+        for last_day, events in windows:
+            timestamps = events['event_timestamp'].to_numpy()
+            in_window = (timestamps >= self.window_us[0]) & (timestamps < self.window_us[1])
+            yield last_day, events[in_window].reset_index(drop=True)
+
+    def iter_session_windows(self, orders: pd.DataFrame, base_us: np.ndarray, base_keys: np.ndarray,
+                             label: str) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """
+        Yield (last_day, events) for the given orders and non-converting sessions
+        (base times and keys), in windows of whole days.
+        """
+        order_days = orders['created_at'].to_numpy(dtype='datetime64[us]').astype(np.int64) // DAY_US
+        base_days = base_us // DAY_US
+
+        # Group consecutive days into windows of roughly batch_size sessions
+        days = np.union1d(order_days, base_days)
+        sessions_per_day = (np.searchsorted(np.sort(order_days), days, side='right')
+                            - np.searchsorted(np.sort(order_days), days, side='left')
+                            + np.searchsorted(base_days, days, side='right')
+                            - np.searchsorted(base_days, days, side='left'))
+        window_ids = (np.cumsum(sessions_per_day) - sessions_per_day) // self.batch_size
+
+        n_orders = n_sessions = n_events = 0
+        for window_id in np.unique(window_ids).tolist():
+            window_days = days[window_ids == window_id]
+            first_day, last_day = int(window_days[0]), int(window_days[-1])
+            batches = []
+
+            # Converting sessions (one per order)
+            window_orders = orders.iloc[np.flatnonzero((order_days >= first_day) & (order_days <= last_day))]
+            for start in range(0, len(window_orders), self.batch_size):
+                batches.append(self.generate_converting_batch(window_orders.iloc[start:start + self.batch_size]))
+
+            # Non-converting sessions
+            in_window = (base_days >= first_day) & (base_days <= last_day)
+            window_base_us = base_us[in_window]
+            window_keys = base_keys[in_window]
+            for start in range(0, len(window_base_us), self.batch_size):
+                end = start + self.batch_size
+                batches.append(self.generate_non_converting_batch(window_base_us[start:end], window_keys[start:end]))
+
+            events = pd.concat(batches, ignore_index=True)
+            n_orders += len(window_orders)
+            n_sessions += len(window_base_us)
+            n_events += len(events)
+            yield last_day, events
+
+        print(f"  {label}: {n_orders} orders, {n_sessions} non-converting sessions, {n_events} events")
+
+    def write_shard_run(self, shard: Dict[str, Any], run_path: str) -> int:
+        """Generate one shard into a timestamp-sorted run file; returns the row count"""
+        buffer = TimestampReorderBuffer()
+        with SortedRunWriter(run_path) as run:
+            for last_day, events in self.iter_shard_windows(shard):
+                buffer.add(events)
+                with self.profiler.stage('sort'):
+                    ready = buffer.release((last_day + 1) * DAY_US - SESSION_LOOKBACK_US)
+                with self.profiler.stage('write_runs'):
+                    run.write(ready)
+            with self.profiler.stage('sort'):
+                ready = buffer.release_all()
+            with self.profiler.stage('write_runs'):
+                run.write(ready)
+        return run.rows
+
+    def select_shards(self, shards: List[Dict[str, Any]], days: List[str]) -> List[Dict[str, Any]]:
+        """
+        Keep the shards that can produce events dated on any of days (YYYYMMDD).
+
+        A session's events fall within a day either side of its order or base
+        day, so the months of the neighbouring days are included too.
+        """
+        dates = pd.to_datetime(days, format='%Y%m%d')
+        months = {str(d.to_period('M')) for date in dates for d in (date - pd.Timedelta(days=1), date, date + pd.Timedelta(days=1))}
+        return [shard for shard in shards if shard['month'] in months]
+
+    def iter_events(self, workers: int = 1, run_dir: str = None, days: List[str] = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream the dataset as timestamp-ordered chunks.
+
+        With one worker, sessions are generated one window of whole days at a
+        time. No session from a later day can start before midnight of that day
+        minus SESSION_LOOKBACK_US, so after each window every buffered event
+        below that watermark is final.
+
+        With several workers, each shard is written to a sorted run file under
+        run_dir (default: the system temp directory) and the runs are k-way
+        merged, so the parent never holds more than one chunk per shard.
+
+        With days set, only the shards that can produce events on those days
+        are generated. Shard seeds don't change, so the events for those days
+        are identical to a full run.
+        """
         print("Starting GA4 events generation...")
-        
-        # Generate converting sessions (one per order)
-        print(f"Generating converting sessions for {len(self.orders)} orders...")
-        for idx, (_, order_row) in enumerate(self.orders.iterrows()):
-            if idx % 1000 == 0:
-                print(f"  Processed {idx} orders...")
-            
-            session_events = self.generate_session_for_order(order_row)
-            self.events.extend(session_events)
-        
-        print(f"Generated {len(self.events)} events from converting sessions")
-        
-        # Generate non-converting sessions (2x the volume for faster processing)
-        target_non_converting = len(self.orders) * 2
-        print(f"Generating {target_non_converting} non-converting sessions...")
-        
-        # Get date range from orders
-        min_date = self.orders['created_at'].min()
-        max_date = self.orders['created_at'].max()
-        
-        # Pre-generate random dates and journey types for efficiency
-        date_range_days = (max_date - min_date).days
-        random_days = np.random.randint(0, date_range_days + 1, target_non_converting)
-        journey_types = np.random.choice(
-            ['browsers', 'cart_abandoners', 'bouncers'],
-            size=target_non_converting,
-            p=[0.50, 0.29, 0.21]
-        )
-        
-        for i in range(target_non_converting):
-            if i % 500 == 0:
-                print(f"  Generated {i} non-converting sessions...")
-            
-            # Use pre-generated random values
-            random_date = min_date + timedelta(days=int(random_days[i]))
-            journey_type = journey_types[i]
-            
-            session_events = self.generate_non_converting_session(random_date, journey_type)
-            self.events.extend(session_events)
-        
-        print(f"Total events generated: {len(self.events)}")
-        
-        # Convert to DataFrame
-        events_df = pd.DataFrame(self.events)
-        
-        # Sort by timestamp
-        events_df['event_timestamp'] = events_df['event_timestamp'].astype(int)
-        events_df = events_df.sort_values('event_timestamp')
-        
-        # Reset index
-        events_df = events_df.reset_index(drop=True)
-        
+        shards = self.plan_shards()
+        if days:
+            shards = self.select_shards(shards, days)
+        n_orders = sum(len(s['order_positions']) for s in shards)
+        n_non_converting = sum(len(s['base_days']) for s in shards)
+        print(f"Generating converting sessions for {n_orders} orders "
+              f"and {n_non_converting} non-converting sessions in {len(shards)} shards...")
+
+        if workers > 1:
+            print(f"Using {workers} worker processes")
+            with tempfile.TemporaryDirectory(prefix='ga4_runs_', dir=run_dir) as tmp:
+                run_paths = [os.path.join(tmp, f"shard_{shard['index']:05d}.pkl") for shard in shards]
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(self.worker_options(),)) as pool:
+                    for report in pool.map(_write_shard_run, shards, run_paths):
+                        self.profiler.merge(report)
+                yield from self.profiler.iter_stage('merge_runs', merge_sorted_runs(run_paths))
+            return
+
+        buffer = TimestampReorderBuffer()
+        for shard in shards:
+            for last_day, events in self.iter_shard_windows(shard):
+                buffer.add(events)
+                with self.profiler.stage('sort'):
+                    ready = buffer.release((last_day + 1) * DAY_US - SESSION_LOOKBACK_US)
+                if len(ready):
+                    yield ready
+        with self.profiler.stage('sort'):
+            rest = buffer.release_all()
+        if len(rest):
+            yield rest
+
+    def generate_session(self, order_id: int = None, session_date: str = None,
+                         session_index: int = None, occurrence: int = 0) -> pd.DataFrame:
+        """
+        Reproduce the events of one session exactly as a full run generates them.
+
+        Pass an order_id for its converting session (occurrence picks among
+        order rows reusing that id, in file order), or a session_date
+        (YYYY-MM-DD, the session's base day) and session_index for the
+        session_index-th non-converting session based on that day. Draws are
+        keyed by session, so nothing else has to be generated first.
+        """
+        if order_id is not None:
+            order = self.orders[(self.orders['id'] == order_id) & (self.orders['occurrence'] == occurrence)]
+            if order.empty:
+                found = int((self.orders['id'] == order_id).sum())
+                raise ValueError(f"Order {order_id} not found" if not found else
+                                 f"Order {order_id} has {found} rows; occurrence must be below {found}")
+            events = self.generate_converting_batch(order)
+        else:
+            # The non-converting plan only needs the order timestamps, not the orders
+            created = self.orders['created_at'] if self.order_ids is None else pd.to_datetime(
+                pd.read_csv(os.path.join(self.shopify_dir, 'order.csv'), usecols=['created_at'])['created_at']
+            )
+            min_date = created.min()
+            n_days = (created.max() - min_date).days + 1
+            day = (pd.Timestamp(session_date) - min_date.normalize()).days
+            day_count = int(spread_evenly(len(created) * 2, n_days)[day]) if 0 <= day < n_days else 0
+            if not 0 <= day < n_days or not 0 <= session_index < day_count:
+                raise ValueError(f"No non-converting session {session_index} on {session_date} "
+                                 f"({day_count} sessions that day)")
+            min_us = np.datetime64(min_date.to_datetime64(), 'us').astype(np.int64)
+            events = self.generate_non_converting_batch(
+                np.array([min_us + day * DAY_US]), non_converting_key(np.array([day]), np.array([session_index]))
+            )
+        return events.sort_values('event_timestamp', kind='stable', ignore_index=True)
+
+    def build_manifest(self, rows: int, output_format: str = 'csv', compression: str = None) -> Dict[str, Any]:
+        """
+        Watermark for incremental runs after a full generation.
+
+        No RNG state is needed: increments key converting sessions by order id
+        and occurrence, and number each day's non-converting sessions after the
+        ones earlier runs based on that day (base_days and base_non_converting
+        give the full run's, extra_sessions the increments').
+        """
+        self.plan_shards()
+        return {
+            'seed': self.seed,
+            'format': output_format,
+            'compression': compression,
+            'min_order_timestamp_us': int(self.min_us),
+            **order_watermark(self.orders),
+            'base_days': int(self.n_days),
+            'base_non_converting': int(self.n_non_converting),
+            'extra_sessions': {},
+            'rows': rows,
+            'deltas': [],
+        }
+
+    def iter_increment(self, manifest: Dict[str, Any]) -> Iterator[pd.DataFrame]:
+        """
+        Stream timestamp-ordered events for order rows past the manifest watermark.
+
+        Rows are matched to earlier runs by (order id, occurrence), so a new
+        order reusing an old id is picked up whatever its created_at.
+        Non-converting sessions (2x the new orders) are spread evenly over the
+        new orders' days, like plan_shards spreads a full run's; the manifest is
+        updated in place.
+        """
+        new_orders = self.orders[~processed_orders(self.orders, manifest)].sort_values('created_at', kind='stable')
+        print(f"Found {len(new_orders)} orders not in earlier runs")
+        if not len(new_orders):
+            return
+
+        self.min_us = manifest['min_order_timestamp_us']
+
+        created_us = new_orders['created_at'].to_numpy(dtype='datetime64[us]').astype(np.int64)
+        order_days = np.maximum((created_us - self.min_us) // DAY_US, 0)
+        day_offsets = np.arange(order_days.min(), order_days.max() + 1)
+        day_counts = spread_evenly(len(new_orders) * 2, len(day_offsets))
+        base_days, base_keys = non_converting_sessions(day_offsets, day_counts, used_session_indices(manifest, day_offsets))
+        base_us = self.min_us + base_days * DAY_US
+
+        buffer = TimestampReorderBuffer()
+        for window_day, events in self.iter_session_windows(new_orders, base_us, base_keys, "Increment"):
+            buffer.add(events)
+            ready = buffer.release((window_day + 1) * DAY_US - SESSION_LOOKBACK_US)
+            if len(ready):
+                yield ready
+        rest = buffer.release_all()
+        if len(rest):
+            yield rest
+
+        manifest.update(order_watermark(self.orders))
+        extra = manifest['extra_sessions']
+        for day, count in zip(day_offsets.tolist(), day_counts.tolist()):
+            if count:
+                extra[str(day)] = extra.get(str(day), 0) + count
+
+    def write_increment(self, output_path: str, output_format: str = 'csv', chunk_rows: int = 50000,
+                        compression: str = None, background: bool = False) -> Optional[str]:
+        """
+        Append a delta file with events for orders added since the last run;
+        returns its path, or None if there were no new orders.
+
+        Deltas are numbered files in <output>_deltas/ next to the full output;
+        the manifest (<output>.manifest.json) records each one. The delta's
+        format and compression must match the full run's.
+        """
+        manifest_path = manifest_path_for(output_path)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No manifest at {manifest_path}; run a full generation first")
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['seed'] != self.seed:
+            raise ValueError(f"Manifest was written with seed {manifest['seed']}, not {self.seed}")
+        if (manifest['format'], manifest['compression']) != (output_format, compression):
+            raise ValueError(f"Manifest was written for {manifest['format']} output"
+                             f"{' with ' + manifest['compression'] + ' compression' if manifest['compression'] else ''}; "
+                             f"pass the same --format and --compression")
+
+        delta_dir = os.path.splitext(output_path)[0] + '_deltas'
+        os.makedirs(delta_dir, exist_ok=True)
+        suffix = COMPRESSION_SUFFIXES[compression] if compression else ''
+        delta_path = os.path.join(delta_dir, f"events_delta_{len(manifest['deltas']) + 1:04d}.{output_format}{suffix}")
+
+        events = self.iter_increment(manifest)
+        first = next(events, None)
+        if first is None:
+            print("No new orders; nothing to do")
+            return None
+
+        with self.open_writer(delta_path, output_format, chunk_rows, compression, background) as writer:
+            for chunk in chain([first], events):
+                with self.profiler.stage('write'):
+                    writer.write(chunk)
+
+        manifest['rows'] += writer.rows
+        manifest['deltas'].append({
+            'path': os.path.basename(delta_path),
+            'rows': writer.rows,
+            'max_order_id': manifest['max_order_id'],
+            'min_date': writer.min_date,
+            'max_date': writer.max_date,
+        })
+        save_manifest(manifest_path, manifest)
+
+        print(f"Delta saved to: {delta_path}")
+        print(f"Total rows: {writer.rows}")
+        print(f"Date range: {writer.min_date} to {writer.max_date}")
+        print(f"Unique events: {dict(writer.event_counts.most_common())}")
+        return delta_path
+
+    def generate_dataset(self, workers: int = 1, run_dir: str = None) -> pd.DataFrame:
+        """Generate the complete GA4 events dataset in memory"""
+        events_df = pd.concat(list(self.iter_events(workers, run_dir)), ignore_index=True)
+        print(f"Total events generated: {len(events_df)}")
         print("GA4 events dataset generation complete!")
         return events_df
-        
-    def save_dataset(self, events_df: pd.DataFrame, output_path: str):
-        """Save the events dataset to CSV"""
-        # Ensure ga4 directory exists
-        ga4_dir = '/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds/ga4'
-        import os
-        os.makedirs(ga4_dir, exist_ok=True)
-        
-        # Save to CSV
-        events_df.to_csv(output_path, index=False)
+
+    def open_writer(self, output_path: str, output_format: str = 'csv', chunk_rows: int = 50000,
+                    compression: str = None, background: bool = False, partition_by_day: bool = False,
+                    days: List[str] = None):
+        """Event writer for an output file (or daily partition directory)"""
+        if partition_by_day:
+            writer = PartitionedEventWriter(output_path, chunk_rows=chunk_rows, file_format=output_format, days=days,
+                                            compression=compression)
+        else:
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            options = {'compression': compression} if compression else {}
+            writer = WRITERS[output_format](output_path, chunk_rows=chunk_rows, **options)
+        return BackgroundWriter(writer) if background else writer
+
+    def write_dataset(self, output_path: str, workers: int = 1, chunk_rows: int = 50000,
+                      output_format: str = 'csv', run_dir: str = None,
+                      partition_by_day: bool = False, days: List[str] = None,
+                      compression: str = None, background: bool = False):
+        """
+        Stream the events dataset to CSV, Parquet or NDJSON in bounded chunks.
+
+        With partition_by_day, output_path is a directory of daily
+        events_YYYYMMDD files; days limits generation to those dates and
+        rewrites only their files. compression ('gzip' or 'zstd') applies to
+        CSV and NDJSON output. With background, chunks are encoded and written on a
+        writer thread while the next ones are generated.
+        """
+        writer = self.open_writer(output_path, output_format, chunk_rows, compression, background,
+                                  partition_by_day, days)
+        with writer:
+            for events in self.iter_events(workers, run_dir, days if partition_by_day else None):
+                with self.profiler.stage('write'):
+                    writer.write(events)
+
+        # A full run (not a day subset, date window or scaled dataset) becomes the
+        # watermark for incremental runs
+        if not (partition_by_day and days) and self.scale == 1 and self.start is None and self.end is None:
+            save_manifest(manifest_path_for(output_path), self.build_manifest(writer.rows, output_format, compression))
+
+        print("GA4 events dataset generation complete!")
         print(f"Dataset saved to: {output_path}")
-        print(f"Total rows: {len(events_df)}")
-        print(f"Date range: {events_df['event_date'].min()} to {events_df['event_date'].max()}")
-        print(f"Unique events: {events_df['event_name'].value_counts().to_dict()}")
+        if partition_by_day:
+            print(f"Daily partitions written: {len(writer.written_days)}")
+        print(f"Total rows: {writer.rows}")
+        print(f"Date range: {writer.min_date} to {writer.max_date}")
+        print(f"Unique events: {dict(writer.event_counts.most_common())}")
+
+
+def read_csv_rows(path: str, column: str, values: List[int], chunksize: int = 100000) -> pd.DataFrame:
+    """Read only the rows of a CSV whose column is in values, a chunk at a time"""
+    matches = [chunk[chunk[column].isin(values)] for chunk in pd.read_csv(path, chunksize=chunksize)]
+    return pd.concat(matches, ignore_index=True)
+
+
+def order_watermark(orders: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Manifest fields identifying the order rows a run has generated sessions for.
+
+    A row is (id, occurrence). Ids from min_order_id to max_order_id are taken
+    to have one row each; order_id_counts lists the ids with any other count
+    (reused ids, gaps), so the watermark stays small.
+    """
+    counts = orders['id'].value_counts()
+    min_id, max_id = int(counts.index.min()), int(counts.index.max())
+    missing = np.setdiff1d(np.arange(min_id, max_id + 1), counts.index.to_numpy())
+    exceptions = {**{int(i): int(n) for i, n in counts[counts != 1].items()}, **{int(i): 0 for i in missing}}
+    return {
+        'min_order_id': min_id,
+        'max_order_id': max_id,
+        'order_id_counts': {str(i): exceptions[i] for i in sorted(exceptions)},
+        'max_order_timestamp_us': int(orders['created_at'].max().value // 1000),
+    }
+
+
+def processed_orders(orders: pd.DataFrame, manifest: Dict[str, Any]) -> np.ndarray:
+    """Whether each order row (id, occurrence) was covered by the runs the manifest records"""
+    ids = orders['id']
+    in_range = (ids >= manifest.get('min_order_id', 0)) & (ids <= manifest['max_order_id'])
+    counts = {int(i): n for i, n in manifest.get('order_id_counts', {}).items()}
+    seen = ids.map(counts).fillna(in_range.astype(int)).to_numpy()
+    return orders['occurrence'].to_numpy() < seen
+
+
+def spread_evenly(total: int, n_days: int) -> np.ndarray:
+    """Sessions per day when total sessions are spread evenly over n_days consecutive days"""
+    steps = np.arange(n_days)
+    return (steps + 1) * total // n_days - steps * total // n_days
+
+
+def non_converting_sessions(day_offsets: np.ndarray, day_counts: np.ndarray,
+                            first_index=0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Base day and random-stream key of each non-converting session (day_counts[i]
+    on day_offsets[i], numbered from first_index[i] within the day)
+    """
+    base_days = np.repeat(day_offsets, day_counts)
+    index_in_day = np.arange(len(base_days)) - np.repeat(np.cumsum(day_counts) - day_counts, day_counts)
+    index_in_day += np.repeat(np.broadcast_to(first_index, day_counts.shape), day_counts)
+    return base_days, non_converting_key(base_days, index_in_day)
+
+
+def used_session_indices(manifest: Dict[str, Any], day_offsets: np.ndarray) -> np.ndarray:
+    """Number of non-converting sessions the runs in the manifest based on each day"""
+    base_days = manifest['base_days']
+    base = spread_evenly(manifest['base_non_converting'], base_days)
+    used = np.where(day_offsets < base_days, base[np.minimum(day_offsets, base_days - 1)], 0)
+    extra = manifest['extra_sessions']
+    return used + np.array([extra.get(str(day), 0) for day in day_offsets.tolist()], dtype=np.int64)
+
+
+def manifest_path_for(output_path: str) -> str:
+    """
+    Manifest next to an output file or partition directory, named after the
+    whole path so each format has its own (events.csv -> events.csv.manifest.json)
+    """
+    return output_path.rstrip(os.sep) + '.manifest.json'
+
+
+def save_manifest(path: str, manifest: Dict[str, Any]):
+    """Write the manifest atomically so an interrupted run keeps the old watermark"""
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+# Per-process generator used by the worker pool
+_worker_generator = None
+
+
+def print_load_commands(path: str, output_format: str, compression: str = None, partitioned: bool = False):
+    """Print bq load commands for an events file (or a directory of daily files)"""
+    if partitioned:
+        suffix = COMPRESSION_SUFFIXES[compression] if compression else ''
+        path = os.path.join(path, f"events_*.{output_format}{suffix}")
+    if compression == 'zstd':
+        print(f"  zstd -d {path}  # bq load reads gzip but not zstd")
+        path = path[:-len(COMPRESSION_SUFFIXES['zstd'])]
+    if partitioned:
+        print(f"  for f in {path}; do bq load {BQ_LOAD_OPTIONS[output_format]} <dataset>.events \"$f\"; done")
+    else:
+        print(f"  bq load {BQ_LOAD_OPTIONS[output_format]} <dataset>.events {path}")
+
+
+def _init_worker(options: Dict[str, Any]):
+    """Load the Shopify data once per worker process"""
+    global _worker_generator
+    _worker_generator = GA4EventsGenerator(**options)
+    _worker_generator.plan_shards()
+
+
+def _write_shard_run(shard: Dict[str, Any], run_path: str) -> Dict[str, Any]:
+    """Generate one shard into a sorted run file in a worker process; returns its profile"""
+    _worker_generator.profiler = StageProfiler(_worker_generator.profiler.trace_memory)
+    _worker_generator.write_shard_run(shard, run_path)
+    return _worker_generator.profiler.report()
+
+
+def replay_session(args: argparse.Namespace):
+    """Generate one session's events, loading only the catalog and that order"""
+    # Progress output goes to stderr so stdout is just the CSV
+    with redirect_stdout(sys.stderr):
+        generator = GA4EventsGenerator(order_ids=[args.order_id] if args.order_id is not None else [],
+                                       seeds_dir=args.seeds_dir, journeys_path=args.journeys)
+        events = generator.generate_session(args.order_id, args.session_date, args.session_index, args.occurrence)
+    events.to_csv(args.output or sys.stdout, index=False)
+
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Generate the Belle & Glow GA4 events dataset")
+    parser.add_argument('--seeds-dir', default=SEEDS_DIR,
+                        help="dbt seeds directory with shopify/ input (default: this repo's seeds/)")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directory for the events output (default: <seeds-dir>/ga4, or data/ga4 for --partition-by-day)")
+    parser.add_argument('--journeys', default=JOURNEYS_PATH,
+                        help="YAML Markov chain for non-converting journeys (default: ga4_journeys.yaml)")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Scale factor: synthesize this many times the Shopify orders and sessions (default: 1)")
+    parser.add_argument('--start', metavar='YYYY-MM-DD',
+                        help="Only write events dated on or after this date")
+    parser.add_argument('--end', metavar='YYYY-MM-DD',
+                        help="Only write events dated on or before this date")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes generating monthly shards (default: 1)")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv',
+                        help="Output format; parquet and ndjson write GA4 export nested types (default: csv)")
+    parser.add_argument('--compression', choices=sorted(COMPRESSION_SUFFIXES),
+                        help="Compress CSV or NDJSON output (events.csv.gz, events.ndjson.zst, ...)")
+    parser.add_argument('--index', action='store_true',
+                        help="Also write a byte-offset row index (events.csv.idx) for ga4_index.EventIndex")
+    parser.add_argument('--background-writer', action='store_true',
+                        help="Encode and write chunks on a writer thread while generation continues")
+    parser.add_argument('--run-dir', default=None,
+                        help="Directory for the sorted shard runs merged in --workers mode (default: system temp)")
+    parser.add_argument('--partition-by-day', action='store_true',
+                        help="Write one events_YYYYMMDD file per day to <output-dir>/events/, like the GA4 export "
+                             "(default output dir data/ga4, outside the dbt seed paths)")
+    parser.add_argument('--days', nargs='+', metavar='YYYYMMDD',
+                        help="With --partition-by-day, (re)generate only these days' files")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only generate sessions for orders added since the last run, as a delta file")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="Write a JSON report of per-stage timings and event counters to PATH")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="Also record net allocated bytes per stage with tracemalloc (slower)")
+    parser.add_argument('--cprofile', metavar='PATH',
+                        help="Dump cProfile stats for the main process to PATH (read with pstats)")
+    commands = parser.add_subparsers(dest='command')
+    replay = commands.add_parser('generate-session', help="Print the events of a single session as CSV")
+    target = replay.add_mutually_exclusive_group(required=True)
+    target.add_argument('--order-id', type=int, help="Converting session of this order")
+    replay.add_argument('--occurrence', type=int, default=0,
+                        help="With --order-id, which order row reusing that id, in order.csv order (default: 0)")
+    target.add_argument('--session-date', metavar='YYYY-MM-DD',
+                        help="Base day of a non-converting session (use with --session-index)")
+    replay.add_argument('--session-index', type=int, default=0,
+                        help="Index of the non-converting session on --session-date (default: 0)")
+    replay.add_argument('--output', help="Write the CSV here instead of stdout")
+    args = parser.parse_args()
+    if args.days and not args.partition_by_day:
+        parser.error("--days requires --partition-by-day")
+    if args.compression and args.format == 'parquet':
+        parser.error("--compression applies to CSV and NDJSON output (Parquet is always zstd-compressed)")
+    if args.index and (args.format == 'parquet' or args.compression or args.partition_by_day or args.incremental):
+        parser.error("--index needs a single uncompressed CSV or NDJSON output")
+    if args.scale <= 0:
+        parser.error("--scale must be positive")
+    if args.start and args.end and pd.Timestamp(args.start) > pd.Timestamp(args.end):
+        parser.error("--start must not be after --end")
+    if args.incremental and (args.scale != 1 or args.start or args.end):
+        parser.error("--incremental can't be combined with --scale, --start or --end")
+
+    if args.command == 'generate-session':
+        replay_session(args)
+        return
+
     print("Belle & Glow GA4 Events Dataset Generator")
     print("=" * 50)
-    
-    generator = GA4EventsGenerator()
-    events_df = generator.generate_dataset()
-    
-    output_path = '/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds/ga4/events.csv'
-    generator.save_dataset(events_df, output_path)
-    
+
+    if args.cprofile:
+        profile = cProfile.Profile()
+        profile.enable()
+
+    generator = GA4EventsGenerator(trace_memory=args.profile_memory, seeds_dir=args.seeds_dir,
+                                   scale=args.scale, start=args.start, end=args.end, journeys_path=args.journeys)
+    if args.partition_by_day:
+        # Daily files stay out of seeds/: dbt seed would load each one as a separate seed
+        output_path = os.path.join(args.output_dir or os.path.join(DATA_DIR, 'ga4'), 'events')
+    else:
+        output_path = os.path.join(args.output_dir or os.path.join(args.seeds_dir, 'ga4'), f'events.{args.format}')
+        if args.compression:
+            output_path += COMPRESSION_SUFFIXES[args.compression]
+    delta_path = None
+    if args.incremental:
+        delta_path = generator.write_increment(output_path, output_format=args.format, compression=args.compression,
+                                               background=args.background_writer)
+    else:
+        generator.write_dataset(output_path, workers=args.workers, output_format=args.format, run_dir=args.run_dir,
+                                partition_by_day=args.partition_by_day, days=args.days,
+                                compression=args.compression, background=args.background_writer)
+        if args.index:
+            print(f"Row index saved to: {build_index(output_path)}")
+
+    if args.cprofile:
+        profile.disable()
+        profile.dump_stats(args.cprofile)
+        print(f"cProfile stats saved to: {args.cprofile}")
+    if args.profile:
+        generator.profiler.print_summary()
+        generator.profiler.write_report(args.profile)
+        print(f"Profile report saved to: {args.profile}")
+
+    if args.incremental:
+        if delta_path is None:
+            print("\nEvents are up to date; no delta written")
+            return
+        print("\nIncremental generation completed successfully!")
+        print("dbt seed --select ga4.events doesn't include deltas; append this one to the loaded events table, e.g.:")
+        print_load_commands(delta_path, args.format, args.compression)
+        return
+
     print("\nDataset generation completed successfully!")
-    print(f"You can now use this as dbt seed data: dbt seed --select ga4.events")
+    seed_path = os.path.join(args.seeds_dir, 'ga4', 'events.csv')
+    if os.path.abspath(output_path) == os.path.abspath(seed_path):
+        print(f"You can now use this as dbt seed data: dbt seed --select ga4.events")
+    else:
+        # dbt seed only loads plain CSV from the seed paths
+        print("dbt seed doesn't load this output; load it into the events table instead, e.g.:")
+        print_load_commands(output_path, args.format, args.compression, args.partition_by_day)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -16,6 +16,8 @@ import os
 # Set random seed for reproducible results
 random.seed(42)
 
+SEEDS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'seeds'))
+
 def load_orders(file_path):
     """Load orders data from CSV."""
     orders = []
@@ -225,15 +227,8 @@ def write_order_lines_csv(line_items, output_path):
         writer.writeheader()
         writer.writerows(line_items)
 
-def main():
-    """Main function to generate order line items."""
-    # File paths
-    base_dir = '/Users/markrittman/new/ra_warehouse_ecommerce_v2/ra_dw_ecommerce/seeds'
-    orders_path = os.path.join(base_dir, 'orders.csv')
-    variants_path = os.path.join(base_dir, 'product_variant.csv')
-    products_path = os.path.join(base_dir, 'product.csv')
-    output_path = os.path.join(base_dir, 'order_line.csv')
-    
+def generate_order_lines(orders_path, variants_path, products_path, output_path):
+    """Generate order_line.csv for the given orders; returns (orders, line_items)."""
     print("Loading data...")
     orders = load_orders(orders_path)
     variants = load_product_variants(variants_path)
@@ -275,6 +270,18 @@ def main():
     write_order_lines_csv(all_line_items, output_path)
     
     print("Order line generation completed successfully!")
+    return orders, all_line_items
+
+def main():
+    """Main function to generate order line items."""
+    # File paths
+    base_dir = os.path.join(SEEDS_DIR, 'shopify')
+    orders_path = os.path.join(base_dir, 'order.csv')
+    variants_path = os.path.join(base_dir, 'product_variant.csv')
+    products_path = os.path.join(base_dir, 'product.csv')
+    output_path = os.path.join(base_dir, 'order_line.csv')
+    
+    orders, all_line_items = generate_order_lines(orders_path, variants_path, products_path, output_path)
     
     # Validation - check totals match exactly
     print("\nValidating totals...")
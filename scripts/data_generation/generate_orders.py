@@ -163,8 +163,9 @@ def get_location_id():
     else:
         return random.randint(1, 3)  # Physical stores
 
-def generate_orders():
-    """Generate the complete orders dataset"""
+def generate_orders(scale=1.0):
+    """Generate the complete orders dataset (scale multiplies the daily order volume)"""
+    max_orders = int(10000 * scale)
     orders = []
     order_id = 1
     
@@ -180,7 +181,7 @@ def generate_orders():
         
         # Apply seasonal multiplier
         seasonal_mult = get_seasonal_multiplier(current_date)
-        daily_orders = int((base_monthly_orders * seasonal_mult) / 30)
+        daily_orders = int((base_monthly_orders * seasonal_mult * scale) / 30)
         
         # Add some randomness to daily orders
         daily_orders = max(1, daily_orders + random.randint(-2, 3))
@@ -231,10 +232,10 @@ def generate_orders():
             order_id += 1
             
             # Stop if we've reached our target of ~10,000 orders
-            if len(orders) >= 10000:
+            if len(orders) >= max_orders:
                 break
         
-        if len(orders) >= 10000:
+        if len(orders) >= max_orders:
             break
             
         # Move to next day
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Replay generated GA4 events in real time, for load-testing collection and
+streaming ingestion.
+
+send reads an events file written by generate_ga4_events.py (CSV or NDJSON,
+optionally .gz/.zst, or a directory of daily partitions) in timestamp order
+and emits it as Measurement Protocol requests: one JSON body per client
+(user_pseudo_id) holding up to 25 events. Requests are either POSTed to an
+HTTP endpoint over a pool of keep-alive connections, or appended as NDJSON
+lines to a file another process tails.
+
+Pacing:
+- --speedup compresses event time (8760 replays a year in an hour)
+- --rate caps the send rate in events/sec (alone, it sends at that rate)
+- with neither, events go out as fast as the in-flight limit allows
+Events due within the same --tick are batched and sent together. At most
+--connections requests are in flight; when all are busy the replay waits,
+and the lag behind schedule shows up in the stats.
+
+collect runs a stand-in Measurement Protocol collector on localhost that
+validates and counts requests, optionally appends them to an NDJSON file,
+and can add artificial latency.
+
+Usage:
+    python replay_ga4_events.py collect --port 8787 &
+    python replay_ga4_events.py send seeds/ga4/events.csv --url http://127.0.0.1:8787/mp/collect --speedup 8760
+    python replay_ga4_events.py send seeds/ga4/events.csv --output /tmp/stream.ndjson --rate 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+from ga4_writers import partition_files
+
+# Measurement Protocol accepts at most 25 events per request
+MAX_BATCH_EVENTS = 25
+DEFAULT_PORT = 8787
+COLLECT_PATH = '/mp/collect'
+
+
+def input_files(path: str) -> List[str]:
+    """Event files to replay: the file itself, or a partition directory's daily files in date order"""
+    if os.path.isdir(path):
+        files = partition_files(path, formats=['csv', 'ndjson'])
+        if not files:
+            raise FileNotFoundError(f"No events_YYYYMMDD files in {path}")
+        return files
+    return [path]
+
+
+def read_events(path: str, chunk_rows: int = 5000) -> Iterator[pd.DataFrame]:
+    """Events from generate_ga4_events.py output in chunks, in file order"""
+    for file in input_files(path):
+        stem = file[:-len(os.path.splitext(file)[1])] if file.endswith(('.gz', '.zst')) else file
+        if stem.endswith('.ndjson'):
+            reader = pd.read_json(file, lines=True, chunksize=chunk_rows, dtype=False)
+        elif stem.endswith('.csv'):
+            reader = pd.read_csv(file, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+        else:
+            raise ValueError(f"Unsupported events file {file} (expected CSV or NDJSON)")
+        with reader:
+            yield from reader
+
+
+def decoded(value) -> Any:
+    """Nested column value as Python objects (CSV holds JSON strings, NDJSON real records)"""
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def param_value(value: Dict[str, Any]) -> Any:
+    """Measurement Protocol value of a GA4 export {'string_value': ..., 'int_value': ...} record"""
+    for field in ('string_value', 'int_value', 'double_value', 'float_value'):
+        if value.get(field) is not None:
+            return value[field]
+    return None
+
+
+def user_properties(value) -> Dict[str, Any]:
+    """Measurement Protocol user_properties from either {'name': {'value': v}} or key/value records"""
+    properties = decoded(value) or {}
+    if isinstance(properties, list):
+        return {p['key']: {'value': param_value(p['value'])} for p in properties}
+    return properties
+
+
+def measurement_protocol_batches(chunk: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Group events by client, in order, into request bodies of at most MAX_BATCH_EVENTS events"""
+    batches = []
+    open_batches: Dict[str, Dict[str, Any]] = {}
+    for row in chunk.itertuples(index=False):
+        params = {p['key']: param_value(p['value']) for p in decoded(row.event_params) or []}
+        items = decoded(row.items)
+        if items:
+            params['items'] = items
+        event = {'name': row.event_name, 'timestamp_micros': int(row.event_timestamp), 'params': params}
+
+        batch = open_batches.get(row.user_pseudo_id)
+        if batch is None or len(batch['events']) == MAX_BATCH_EVENTS:
+            batch = {'client_id': row.user_pseudo_id, 'timestamp_micros': int(row.event_timestamp),
+                     'user_properties': user_properties(row.user_properties), 'events': []}
+            if row.user_id and row.user_id == row.user_id:
+                batch['user_id'] = str(row.user_id)
+            open_batches[row.user_pseudo_id] = batch
+            batches.append(batch)
+        batch['events'].append(event)
+    return batches
+
+
+class ReplayStats:
+    """Throughput, latency and schedule lag of a replay"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.events = 0
+        self.requests = 0
+        self.bytes = 0
+        self.errors: Dict[str, int] = {}
+        self.latencies: List[float] = []
+        self.max_lag = 0.0
+        self.last_report = (self.started, 0, 0)
+
+    def record(self, events: int, size: int, latency: Optional[float] = None, error: Optional[str] = None):
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+            return
+        self.events += events
+        self.requests += 1
+        self.bytes += size
+        if latency is not None:
+            self.latencies.append(latency)
+
+    def interval_line(self) -> str:
+        """One progress line with rates since the previous call"""
+        now = time.perf_counter()
+        since, events, requests = self.last_report
+        elapsed = max(now - since, 1e-9)
+        self.last_report = (now, self.events, self.requests)
+        return (f"  {now - self.started:7.1f}s  {self.events:,} events  "
+                f"{(self.events - events) / elapsed:,.0f} events/s  {(self.requests - requests) / elapsed:,.0f} req/s  "
+                f"lag {self.max_lag:.2f}s  errors {sum(self.errors.values())}")
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        summary = {
+            'elapsed_s': round(elapsed, 3),
+            'events': self.events,
+            'requests': self.requests,
+            'bytes': self.bytes,
+            'events_per_s': round(self.events / elapsed, 1) if elapsed else None,
+            'requests_per_s': round(self.requests / elapsed, 1) if elapsed else None,
+            'max_lag_s': round(self.max_lag, 3),
+            'errors': self.errors,
+        }
+        if self.latencies:
+            p50, p95, p99 = np.percentile(self.latencies, [50, 95, 99]) * 1000
+            summary['latency_ms'] = {'p50': round(p50, 2), 'p95': round(p95, 2), 'p99': round(p99, 2),
+                                     'max': round(max(self.latencies) * 1000, 2)}
+        return summary
+
+
+class HttpConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections to one endpoint, also bounding requests in flight.
+
+    acquire() hands out one of `size` connection slots and waits while all
+    are busy; a slot's connection is opened on first use and reopened after
+    an error or a 'Connection: close' response.
+    """
+
+    def __init__(self, url: str, size: int = 8, timeout: float = 10.0):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL {url!r} (expected http:// or https://)")
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = parts.scheme == 'https'
+        self.target = parts.path or '/'
+        if parts.query:
+            self.target += '?' + parts.query
+        self.timeout = timeout
+        self.slots: asyncio.Queue = asyncio.Queue()
+        for _ in range(size):
+            self.slots.put_nowait(None)
+
+    async def acquire(self):
+        return await self.slots.get()
+
+    def release(self, connection):
+        self.slots.put_nowait(connection)
+
+    async def post(self, connection, body: bytes):
+        """POST body on a slot's connection; returns (connection to release, status)"""
+        if connection is None:
+            connection = await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+        try:
+            return await self.exchange(connection, body)
+        except BaseException:
+            connection[1].close()
+            raise
+
+    async def exchange(self, connection, body: bytes):
+        reader, writer = connection
+        writer.write((f"POST {self.target} HTTP/1.1\r\nHost: {self.host}\r\n"
+                      f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+
+        if headers.get('connection', '').lower() == 'close':
+            writer.close()
+            connection = None
+        return connection, status
+
+
+class HttpSink:
+    """POST each batch to a Measurement Protocol endpoint, at most pool size requests in flight"""
+
+    def __init__(self, url: str, stats: ReplayStats, connections: int = 8, timeout: float = 10.0):
+        self.pool = HttpConnectionPool(url, connections, timeout)
+        self.stats = stats
+        self.tasks = set()
+
+    async def send(self, batch: Dict[str, Any]):
+        connection = await self.pool.acquire()
+        task = asyncio.create_task(self.post(connection, batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def post(self, connection, batch: Dict[str, Any]):
+        body = json.dumps(batch).encode('utf-8')
+        started = time.perf_counter()
+        # The slot always goes back to the pool; a failed request has already closed its connection
+        reusable = None
+        try:
+            reusable, status = await asyncio.wait_for(self.pool.post(connection, body), self.pool.timeout)
+        except Exception as e:
+            self.stats.record(len(batch['events']), len(body), error=type(e).__name__)
+            return
+        finally:
+            self.pool.release(reusable)
+        if 200 <= status < 300:
+            self.stats.record(len(batch['events']), len(body), latency=time.perf_counter() - started)
+        else:
+            self.stats.record(len(batch['events']), len(body), error=f'HTTP {status}')
+
+    def flush(self):
+        pass
+
+    async def close(self):
+        if self.tasks:
+            await asyncio.gather(*self.tasks)
+        while not self.pool.slots.empty():
+            connection = self.pool.slots.get_nowait()
+            if connection is not None:
+                connection[1].close()
+
+
+class NdjsonFileSink:
+    """Append each batch as one JSON line to a file, flushed every tick so readers can tail it"""
+
+    def __init__(self, path: str, stats: ReplayStats):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.stats = stats
+
+    async def send(self, batch: Dict[str, Any]):
+        line = json.dumps(batch) + '\n'
+        self.file.write(line)
+        self.stats.record(len(batch['events']), len(line))
+
+    def flush(self):
+        self.file.flush()
+
+    async def close(self):
+        self.file.close()
+
+
+async def replay(events: Iterator[pd.DataFrame], sink, stats: ReplayStats, speedup: float = None,
+                 rate: float = None, tick: float = 0.1, max_events: int = None, report_every: float = 5.0):
+    """
+    Send events on schedule: event time / speedup, capped at rate events/sec, in ticks.
+
+    The next chunk is read and parsed on a thread while the current one is sent.
+    """
+    loop = asyncio.get_running_loop()
+    events = iter(events)
+    start_wall = start_event = None
+    sent = 0
+
+    next_chunk = asyncio.create_task(asyncio.to_thread(next, events, None))
+    while True:
+        chunk = await next_chunk
+        if chunk is None:
+            break
+        next_chunk = asyncio.create_task(asyncio.to_thread(next, events, None))
+        if max_events is not None:
+            chunk = chunk.iloc[:max_events - sent]
+        if not len(chunk):
+            break
+        timestamps = chunk['event_timestamp'].to_numpy(dtype='int64')
+        if start_event is None:
+            start_event = int(timestamps[0])
+            start_wall = loop.time()
+            next_report = start_wall + report_every
+        due = np.zeros(len(chunk))
+        if speedup:
+            due = (timestamps - start_event) / 1e6 / speedup
+        if rate:
+            due = np.maximum(due, (sent + np.arange(len(chunk))) / rate)
+        ticks = np.floor(due / tick).astype(np.int64)
+        boundaries = np.flatnonzero(ticks[1:] != ticks[:-1]) + 1
+
+        for first, last in zip(np.r_[0, boundaries], np.r_[boundaries, len(chunk)]):
+            delay = start_wall + ticks[first] * tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif speedup or rate:
+                stats.max_lag = max(stats.max_lag, -delay)
+            for batch in measurement_protocol_batches(chunk.iloc[first:last]):
+                await sink.send(batch)
+            sink.flush()
+            if report_every and loop.time() >= next_report:
+                print(stats.interval_line())
+                next_report = loop.time() + report_every
+        sent += len(chunk)
+    next_chunk.cancel()
+    await sink.close()
+
+
+class CollectorStats:
+    """Requests and events received by the stand-in collector"""
+
+    def __init__(self):
+        self.requests = 0
+        self.events = 0
+        self.rejected = 0
+        self.clients = set()
+        self.event_counts: Dict[str, int] = {}
+
+    def summary(self) -> Dict[str, Any]:
+        return {'requests': self.requests, 'events': self.events, 'rejected': self.rejected,
+                'clients': len(self.clients), 'event_counts': self.event_counts}
+
+
+def validate_payload(payload) -> Optional[str]:
+    """Reason a Measurement Protocol body is invalid, or None"""
+    if not isinstance(payload, dict):
+        return "body is not a JSON object"
+    if not payload.get('client_id'):
+        return "client_id is required"
+    events = payload.get('events')
+    if not isinstance(events, list) or not 1 <= len(events) <= MAX_BATCH_EVENTS:
+        return f"events must be a list of 1 to {MAX_BATCH_EVENTS} events"
+    if any(not isinstance(e, dict) or not e.get('name') for e in events):
+        return "every event needs a name"
+    return None
+
+
+async def start_collector(host: str = '127.0.0.1', port: int = DEFAULT_PORT, sink=None, latency: float = 0.0):
+    """
+    Start the stand-in collector; returns (server, stats).
+
+    POSTs to /mp/collect are validated and answered 204 (400 with a reason if
+    invalid) on keep-alive connections, after an optional artificial latency.
+    With sink (a text file), accepted bodies are appended to it as NDJSON.
+    """
+    stats = CollectorStats()
+
+    async def respond(writer, status: str, body: bytes = b''):
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                if method != 'POST' or urlsplit(target).path != COLLECT_PATH:
+                    await respond(writer, '404 Not Found')
+                    continue
+                if latency:
+                    await asyncio.sleep(latency)
+                try:
+                    payload = json.loads(body)
+                    error = validate_payload(payload)
+                except ValueError:
+                    error = "body is not valid JSON"
+                if error:
+                    stats.rejected += 1
+                    await respond(writer, '400 Bad Request', error.encode())
+                    continue
+
+                stats.requests += 1
+                stats.events += len(payload['events'])
+                stats.clients.add(payload['client_id'])
+                for event in payload['events']:
+                    stats.event_counts[event['name']] = stats.event_counts.get(event['name'], 0) + 1
+                if sink:
+                    sink.write(body.decode('utf-8') + '\n')
+                await respond(writer, '204 No Content')
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    return server, stats
+
+
+async def run_collector(args):
+    sink = open(args.output, 'a', encoding='utf-8') if args.output else None
+    server, stats = await start_collector(args.host, args.port, sink, args.latency_ms / 1000)
+    print(f"Collector listening on http://{args.host}:{args.port}{COLLECT_PATH}")
+    # Stop cleanly on Ctrl-C or kill, printing the totals
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    try:
+        async with server:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), args.report_every)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                print(f"  {stats.requests:,} requests  {stats.events:,} events  "
+                      f"{len(stats.clients):,} clients  {stats.rejected:,} rejected")
+    finally:
+        if sink:
+            sink.close()
+        print(json.dumps(stats.summary(), indent=2))
+
+
+async def run_send(args):
+    stats = ReplayStats()
+    if args.url:
+        sink = HttpSink(args.url, stats, connections=args.connections, timeout=args.timeout)
+    else:
+        sink = NdjsonFileSink(args.output, stats)
+    print(f"Replaying {args.events} to {args.url or args.output}")
+    await replay(read_events(args.events, args.chunk_rows), sink, stats, speedup=args.speedup, rate=args.rate, tick=args.tick,
+                 max_events=args.max_events, report_every=args.report_every)
+    summary = stats.summary()
+    print(json.dumps(summary, indent=2))
+    if args.stats_json:
+        with open(args.stats_json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description="Replay generated GA4 events to a collector in real time")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    send = commands.add_parser('send', help="Replay an events file as Measurement Protocol requests")
+    send.add_argument('events', help="Events CSV/NDJSON file (optionally .gz/.zst) or daily partition directory")
+    target = send.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help=f"Collector endpoint, e.g. http://127.0.0.1:{DEFAULT_PORT}{COLLECT_PATH}")
+    target.add_argument('--output', help="Append requests as NDJSON lines to this file instead")
+    send.add_argument('--speedup', type=float, default=None,
+                      help="Time compression factor (8760 replays a year in an hour)")
+    send.add_argument('--rate', type=float, default=None, help="Maximum events per second")
+    send.add_argument('--tick', type=float, default=0.1, help="Scheduling granularity in seconds (default: 0.1)")
+    send.add_argument('--connections', type=int, default=8,
+                      help="Keep-alive connections, i.e. maximum requests in flight (default: 8)")
+    send.add_argument('--timeout', type=float, default=10.0, help="Request timeout in seconds (default: 10)")
+    send.add_argument('--max-events', type=int, default=None, help="Stop after this many events")
+    send.add_argument('--chunk-rows', type=int, default=5000, help="Events read from the file at a time")
+    send.add_argument('--report-every', type=float, default=5.0, help="Seconds between progress lines")
+    send.add_argument('--stats-json', default=None, help="Also save the final stats to this JSON file")
+
+    collect = commands.add_parser('collect', help="Run a local stand-in Measurement Protocol collector")
+    collect.add_argument('--host', default='127.0.0.1')
+    collect.add_argument('--port', type=int, default=DEFAULT_PORT)
+    collect.add_argument('--output', default=None, help="Append accepted request bodies to this NDJSON file")
+    collect.add_argument('--latency-ms', type=float, default=0.0, help="Artificial processing latency per request")
+    collect.add_argument('--report-every', type=float, default=5.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    if args.command == 'send':
+        for name in ('speedup', 'rate', 'tick'):
+            if getattr(args, name) is not None and getattr(args, name) <= 0:
+                parser.error(f"--{name} must be positive")
+        if args.connections < 1:
+            parser.error("--connections must be at least 1")
+        asyncio.run(run_send(args))
+    else:
+        asyncio.run(run_collector(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pytest
+
+# The data generation scripts are run from their own directory and import each other by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_ga4_events import SEEDS_DIR, GA4EventsGenerator  # noqa: E402
+
+CATALOG_FILES = ['customer.csv', 'product.csv', 'product_variant.csv']
+
+
+@pytest.fixture(scope='session')
+def events_path(tmp_path_factory):
+    """A month of generated events (March 2024) as CSV"""
+    path = str(tmp_path_factory.mktemp('ga4') / 'events.csv')
+    GA4EventsGenerator(start='2024-03-01', end='2024-03-31').write_dataset(path)
+    return path
+
+
+@pytest.fixture(scope='session')
+def shopify_orders():
+    """The shipped orders of February to April 2024, in file order"""
+    orders = pd.read_csv(os.path.join(SEEDS_DIR, 'shopify', 'order.csv'))
+    return orders[orders['created_at'].between('2024-02-01', '2024-05-01')].reset_index(drop=True)
+
+
+@pytest.fixture
+def make_seeds_dir(tmp_path, shopify_orders):
+    """Build a small seeds directory (shopify/ only) from a subset of shopify_orders"""
+    order_lines = pd.read_csv(os.path.join(SEEDS_DIR, 'shopify', 'order_line.csv'))
+
+    def make(orders=None, name='seeds'):
+        orders = shopify_orders if orders is None else orders
+        shopify_dir = tmp_path / name / 'shopify'
+        shopify_dir.mkdir(parents=True, exist_ok=True)
+        for file_name in CATALOG_FILES:
+            shutil.copy(os.path.join(SEEDS_DIR, 'shopify', file_name), shopify_dir / file_name)
+        orders.to_csv(shopify_dir / 'order.csv', index=False)
+        order_lines[order_lines['order_id'].isin(orders['id'])].to_csv(shopify_dir / 'order_line.csv', index=False)
+        return str(tmp_path / name)
+
+    return make
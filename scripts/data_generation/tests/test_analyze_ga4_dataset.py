@@ -0,0 +1,12 @@
+import pandas as pd
+import pytest
+
+from analyze_ga4_dataset import SESSION_TOLERANCE, collect_stats
+
+
+def test_session_estimate_matches_session_starts(events_path):
+    stats = collect_stats(events_path)
+    session_starts = stats.event_names['session_start']
+    events = pd.read_csv(events_path, usecols=['event_name'])
+    assert session_starts == (events['event_name'] == 'session_start').sum()
+    assert stats.sessions.estimate() == pytest.approx(session_starts, rel=SESSION_TOLERANCE)
@@ -0,0 +1,11 @@
+import pandas as pd
+
+from create_ga4_sample import create_ga4_sample
+
+
+def test_empty_sample_writes_header(events_path, tmp_path):
+    output_path = tmp_path / 'events_sample.csv'
+    create_ga4_sample(events_path, str(output_path), target_total=0)
+    sample = pd.read_csv(output_path)
+    assert sample.empty
+    assert list(sample.columns) == list(pd.read_csv(events_path, nrows=0).columns)
@@ -0,0 +1,123 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ga4_writers import BlockCompressor, SortedRunWriter, ga4_export_schema, merge_sorted_runs
+from generate_ga4_events import GA4EventsGenerator
+
+
+def without_nulls(value):
+    """A decoded nested value with null struct fields dropped, for comparison with the source JSON"""
+    if isinstance(value, dict):
+        return {k: without_nulls(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [without_nulls(v) for v in value]
+    return value
+
+
+@pytest.fixture
+def window_outputs(make_seeds_dir, tmp_path):
+    """Write a three-day window in each output format; returns a function of (format, compression)"""
+    seeds_dir = make_seeds_dir()
+
+    def write(output_format='csv', compression=None):
+        path = str(tmp_path / f"events_{compression or 'plain'}.{output_format}")
+        GA4EventsGenerator(seeds_dir=seeds_dir, start='2024-03-01', end='2024-03-03') \
+            .write_dataset(path, output_format=output_format, compression=compression)
+        return path
+
+    return write
+
+
+def test_merge_sorted_runs_equals_stable_sort(tmp_path):
+    rng = np.random.default_rng(7)
+    runs, paths = [], []
+    for run_id in range(5):
+        # Few distinct timestamps, so ties fall both inside and across runs
+        timestamps = np.sort(rng.integers(0, 300, size=int(rng.integers(1, 400))))
+        run = pd.DataFrame({'event_timestamp': timestamps, 'run': run_id, 'row': np.arange(len(timestamps))})
+        path = str(tmp_path / f'run_{run_id}.pkl')
+        with SortedRunWriter(path) as writer:
+            bounds = np.sort(rng.choice(np.arange(1, len(run)), size=min(4, len(run) - 1), replace=False))
+            for chunk in np.split(np.arange(len(run)), bounds):
+                writer.write(run.iloc[chunk])
+        runs.append(run)
+        paths.append(path)
+
+    chunks = list(merge_sorted_runs(paths))
+    merged = pd.concat(chunks, ignore_index=True)
+    expected = pd.concat(runs, ignore_index=True).sort_values('event_timestamp', kind='stable', ignore_index=True)
+    pd.testing.assert_frame_equal(merged, expected)
+    # Chunks come out in order, so each can be written as soon as it is released
+    assert all(a['event_timestamp'].iat[-1] <= b['event_timestamp'].iat[0] for a, b in zip(chunks, chunks[1:]))
+
+
+def test_parquet_has_ga4_export_nested_schema(window_outputs):
+    pq = pytest.importorskip('pyarrow.parquet')
+    csv = pd.read_csv(window_outputs('csv'), dtype=object, keep_default_na=False)
+    parquet = pq.ParquetFile(window_outputs('parquet'))
+
+    schema = parquet.schema_arrow
+    assert schema.equals(ga4_export_schema(), check_metadata=False)
+    assert [f.name for f in schema.field('event_params').type.value_type] == ['key', 'value']
+    column = parquet.metadata.row_group(0).column(schema.get_field_index('event_name'))
+    assert column.compression == 'ZSTD'
+    assert 'RLE_DICTIONARY' in column.encodings
+
+    table = parquet.read()
+    assert table.num_rows == len(csv)
+    assert table.column('event_timestamp').to_pylist() == csv['event_timestamp'].astype(int).tolist()
+    for name in ['event_params', 'items', 'device', 'geo', 'traffic_source']:
+        decoded = [json.loads(v) for v in csv[name]]
+        assert without_nulls(table.column(name).to_pylist()) == without_nulls(decoded), name
+
+
+def test_ndjson_has_nested_records(window_outputs):
+    csv = pd.read_csv(window_outputs('csv'), dtype=object, keep_default_na=False)
+    with open(window_outputs('ndjson'), encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+
+    assert len(records) == len(csv)
+    assert list(records[0]) == list(csv.columns)
+    assert {name for record in records for name in record} <= set(ga4_export_schema().names)
+    assert [r['event_timestamp'] for r in records] == csv['event_timestamp'].astype(int).tolist()
+    for name in ['event_params', 'items', 'device', 'geo', 'traffic_source']:
+        assert [r[name] for r in records] == [json.loads(v) for v in csv[name]], name
+    # user_properties becomes GA4 export key/value records
+    assert all(isinstance(p, dict) and set(p) == {'key', 'value'}
+               for r in records for p in r['user_properties'])
+
+
+def decompress(data, compression):
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    import zstandard
+    with zstandard.ZstdDecompressor().stream_reader(data, read_across_frames=True) as reader:
+        return reader.read()
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'zstd'])
+def test_compressed_ndjson_matches_plain(window_outputs, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    with open(window_outputs('ndjson'), 'rb') as f:
+        plain = f.read()
+    with open(window_outputs('ndjson', compression), 'rb') as f:
+        assert decompress(f.read(), compression) == plain
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'zstd'])
+def test_block_compressor_output_is_one_stream(tmp_path, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    data = b''.join(b'{"row": %d}\n' % i for i in range(20000))
+    path = str(tmp_path / 'blocks')
+    compressor = BlockCompressor(path, compression, threads=3, block_size=4096)
+    for start in range(0, len(data), 1000):
+        compressor.write(data[start:start + 1000])
+    compressor.close()
+    with open(path, 'rb') as f:
+        assert decompress(f.read(), compression) == data
@@ -0,0 +1,56 @@
+import filecmp
+import os
+
+import pandas as pd
+
+from generate_ga4_events import GA4EventsGenerator
+
+TRANSACTION_ID = r'"key": "transaction_id", "value": \{"string_value": "(\d+)"'
+
+
+def purchased_order_ids(path):
+    """Sorted transaction ids of the purchase events in an events CSV"""
+    events = pd.read_csv(path, usecols=['event_name', 'event_params'])
+    purchases = events[events['event_name'] == 'purchase']
+    return sorted(purchases['event_params'].str.extract(TRANSACTION_ID)[0].astype(int).tolist())
+
+
+def test_window_partitions_match_full_run(make_seeds_dir, tmp_path):
+    seeds_dir = make_seeds_dir()
+    full_dir, window_dir = str(tmp_path / 'full'), str(tmp_path / 'window')
+    GA4EventsGenerator(seeds_dir=seeds_dir).write_dataset(full_dir, partition_by_day=True)
+    GA4EventsGenerator(seeds_dir=seeds_dir, start='2024-03-01', end='2024-03-10') \
+        .write_dataset(window_dir, partition_by_day=True)
+
+    names = sorted(os.listdir(window_dir))
+    assert names == [f'events_202403{day:02d}.csv' for day in range(1, 11)]
+    for name in names:
+        assert filecmp.cmp(os.path.join(full_dir, name), os.path.join(window_dir, name), shallow=False), name
+
+
+def test_output_is_identical_for_any_worker_count(make_seeds_dir, tmp_path):
+    seeds_dir = make_seeds_dir()
+    paths = []
+    for workers in (1, 3):
+        path = str(tmp_path / f'events_{workers}.csv')
+        GA4EventsGenerator(seeds_dir=seeds_dir).write_dataset(path, workers=workers)
+        paths.append(path)
+    assert filecmp.cmp(*paths, shallow=False)
+
+
+def test_increment_adds_exactly_the_new_orders(make_seeds_dir, shopify_orders, tmp_path):
+    base_orders = shopify_orders.iloc[:-15]
+    # New rows: the latest orders, plus later rows reusing earlier order ids
+    reused = shopify_orders.iloc[:5].assign(created_at='2024-04-30 12:00:00')
+    new_orders = pd.concat([shopify_orders.iloc[-15:], reused], ignore_index=True)
+    path = str(tmp_path / 'events.csv')
+
+    GA4EventsGenerator(seeds_dir=make_seeds_dir(base_orders)).write_dataset(path)
+    assert purchased_order_ids(path) == sorted(base_orders['id'].tolist())
+
+    seeds_dir = make_seeds_dir(pd.concat([base_orders, new_orders], ignore_index=True))
+    delta_path = GA4EventsGenerator(seeds_dir=seeds_dir).write_increment(path)
+    assert purchased_order_ids(delta_path) == sorted(new_orders['id'].tolist())
+
+    # A rerun finds nothing new
+    assert GA4EventsGenerator(seeds_dir=seeds_dir).write_increment(path) is None
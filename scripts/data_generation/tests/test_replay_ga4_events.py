@@ -0,0 +1,44 @@
+import asyncio
+
+from replay_ga4_events import COLLECT_PATH, HttpSink, ReplayStats, read_events, replay, start_collector
+
+MAX_EVENTS = 2000
+
+
+def test_send_to_collector(events_path):
+    async def run():
+        server, collected = await start_collector(port=0)
+        port = server.sockets[0].getsockname()[1]
+        stats = ReplayStats()
+        sink = HttpSink(f'http://127.0.0.1:{port}{COLLECT_PATH}', stats, connections=2)
+        async with server:
+            await replay(read_events(events_path), sink, stats, max_events=MAX_EVENTS, report_every=0)
+        return stats, collected
+
+    stats, collected = asyncio.run(asyncio.wait_for(run(), 60))
+    assert stats.errors == {}
+    assert stats.events == collected.events == MAX_EVENTS
+    assert stats.requests == collected.requests
+    assert collected.rejected == 0
+
+
+def test_send_survives_malformed_responses(events_path):
+    async def garbage(reader, writer):
+        # Answer every request with a status line that has no status code
+        while await reader.readline():
+            writer.write(b'garbage\r\n')
+            await writer.drain()
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(garbage, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        stats = ReplayStats()
+        sink = HttpSink(f'http://127.0.0.1:{port}{COLLECT_PATH}', stats, connections=1)
+        async with server:
+            await replay(read_events(events_path), sink, stats, max_events=200, report_every=0)
+        return stats
+
+    stats = asyncio.run(asyncio.wait_for(run(), 60))
+    assert stats.requests == 0
+    assert sum(stats.errors.values()) > 1